@@ -0,0 +1,137 @@
+"""
+In-process stand-in of an MQTT broker for benchmarks.
+
+FakeMqttClient has the interface of mqtt_common.AsyncMqttClient, published
+messages are routed by FakeBroker directly into the subscription queues of
+the subscribed clients in the same process. Encoding of MQTT packets and
+socket I/O of paho are not part of the measured paths.
+"""
+
+import asyncio
+import time
+from paho.mqtt import client as mqtt_client
+from mqtt_common import AsyncMqttClient, Subscription
+from mqtt_common.async_client import DROP_OLDEST, _matching_filter
+
+
+def _published_info():
+    message_info = mqtt_client.MQTTMessageInfo(0)
+    message_info._set_as_published()
+    return message_info
+
+
+_PUBLISHED = _published_info()
+
+
+class FakeMessage:
+    """ Received message with the attributes of paho MQTTMessage used by the apps """
+    __slots__ = ("topic", "payload", "qos", "retain", "properties", "timestamp")
+
+    def __init__(self, topic, payload, qos, retain, properties, timestamp):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.properties = properties
+        self.timestamp = timestamp
+
+
+class FakeBroker:
+    """
+    Routes published messages to subscribed FakeMqttClients.
+    Shared subscriptions are handled like normal subscriptions,
+    retained messages are delivered to new subscriptions.
+    """
+    def __init__(self, clock=time.monotonic):
+        """
+        Args:
+            clock (callable): receive timestamp of messages in seconds (like paho)
+        """
+        self._clock = clock
+        self._exact = {}
+        self._wildcards = []
+        # last retained message by topic
+        self._retained = {}
+        # number of messages delivered to subscribers
+        self.delivered = 0
+
+    def subscribe(self, client, topic_filter):
+        """ Deliver messages matching topic filter to client """
+        topic_filter = _matching_filter(topic_filter)
+        if "+" in topic_filter or "#" in topic_filter:
+            self._wildcards.append((topic_filter, client))
+        else:
+            clients = self._exact.setdefault(topic_filter, [])
+            if client not in clients:
+                clients.append(client)
+        for topic, (payload, qos, properties) in list(self._retained.items()):
+            if mqtt_client.topic_matches_sub(topic_filter, topic):
+                client.deliver(FakeMessage(topic, payload, qos, True, properties, self._clock()))
+
+    def route(self, topic, payload, qos=0, retain=False, properties=None):
+        """ Deliver published message to all subscribed clients (once per client) """
+        if retain:
+            self._retained[topic] = (payload, qos, properties)
+        receivers = self._exact.get(topic, ())
+        if self._wildcards:
+            receivers = list(receivers)
+            for topic_filter, client in self._wildcards:
+                if client not in receivers and mqtt_client.topic_matches_sub(topic_filter, topic):
+                    receivers.append(client)
+
+        for client in receivers:
+            client.deliver(FakeMessage(topic, payload, qos, retain, properties, self._clock()))
+            self.delivered += 1
+
+
+class FakeMqttClient(AsyncMqttClient):
+    """
+    AsyncMqttClient connected to a FakeBroker,
+    received messages are dispatched by the client like from paho.
+    """
+    def __init__(self, broker, client_id):
+        """
+        Args:
+            broker (FakeBroker): broker stand-in
+            client_id (str): mqtt client id
+        """
+        super().__init__(client_id, "fake-broker", 0)
+        self.broker = broker
+        self._fake_connected = False
+
+    @property
+    def is_connected(self):
+        return self._fake_connected
+
+    async def connect(self, timeout=10.0):
+        self._loop = asyncio.get_running_loop()
+        self._fake_connected = True
+
+    async def disconnect(self, publish_will=False):
+        self._fake_connected = False
+
+    def deliver(self, message):
+        """ Dispatch message routed by the broker to subscriptions """
+        self._on_message(None, None, message)
+
+    def publish_nowait(self, topic, payload, qos=0, retain=False, properties=None):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self.broker.route(topic, payload, qos, retain, properties)
+        # delivered synchronously, acknowledged before publish returns
+        return _PUBLISHED
+
+    def publish_tracked(self, topic, payload, qos=0, retain=False, properties=None):
+        future = asyncio.get_running_loop().create_future()
+        self.publish_nowait(topic, payload, qos, retain, properties)
+        future.set_result(0)
+        return future
+
+    async def subscribe(self, filters, qos=0, maxsize=1000, overflow=DROP_OLDEST):
+        if isinstance(filters, str):
+            filters = [filters]
+        subscription = Subscription(filters, maxsize, overflow)
+        self.add_subscription(subscription)
+        for topic_filter in filters:
+            self.broker.subscribe(self, topic_filter)
+        return subscription
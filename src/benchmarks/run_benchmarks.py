@@ -0,0 +1,356 @@
+"""
+Throughput and latency benchmarks of message player and message tester.
+
+Runs without MQTT broker and network, messages are routed by the
+in-process FakeBroker (fake_broker.py):
+
+- publish:    TracePublisher.publish_due, pre-encoded payloads and stamps,
+              publish pipeline (messages are acknowledged immediately)
+- publish_signals: publish with a generated signal in every payload
+- ingest:     MessageTestApp.user_callback with stamped messages
+- round_trip: player TracePublisher -> FakeBroker -> tester subscriptions
+              -> user_callback in one event loop at a fixed offered rate
+
+for every combination of topic count and payload size. Results are
+messages per second, CPU time per message and latency percentiles, every
+benchmark runs `--repeat` times and reports the median of each value, so a
+single disturbed repetition doesn't move the result.
+
+Results are compared with the baselines in `baselines.json` (separate for
+quick and full runs), a benchmark with lower throughput or higher CPU time
+per message than its baseline (beyond the tolerance) or without baseline
+fails the run with exit code 1.
+Baselines depend on the machine and aren't part of the repository, record
+them with `--update-baselines` on the machine which runs the comparison.
+
+Usage:
+    python run_benchmarks.py [--quick] [--repeat 5] [--update-baselines] [--tolerance 0.2]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SRC_DIR,
+                os.path.join(SRC_DIR, "message_player"),
+                os.path.join(SRC_DIR, "message_tester")]
+
+# benchmark settings, environment wins over .env files of the apps
+os.environ.setdefault("STAMP_MESSAGES", "true")
+os.environ.setdefault("LATENCY_CLOCK", "monotonic")
+os.environ.setdefault("SUBSCRIPTION_MODE", "topic")
+
+
+def _load_settings():
+    """
+    Player and tester both have a `settings` module, in one process they
+    share the player module extended with the settings only the tester has.
+    """
+    import settings
+    spec = importlib.util.spec_from_file_location(
+        "tester_settings", os.path.join(SRC_DIR, "message_tester", "settings.py"))
+    tester_settings = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tester_settings)
+    for name, value in vars(tester_settings).items():
+        if name.isupper() and not hasattr(settings, name):
+            setattr(settings, name, value)
+    # per-topic INFO logs would be measured as well
+    settings.LOGGER.setLevel(logging.WARNING)
+    return settings
+
+
+settings = _load_settings()
+
+# pylint: disable=wrong-import-position
+from mqtt_common import stamp_clock, stamp_properties
+from payload_table import PayloadTable
+from trace_publisher import TracePublisher, create_publish_pipeline
+from message_tester import MessageTestApp
+from topic_stats import LatencyHistogram
+from fake_broker import FakeBroker, FakeMessage, FakeMqttClient
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+TOPIC_COUNTS = (100, 1000, 10000)
+PAYLOAD_SIZES = (64, 1024)
+# messages per publish and ingest benchmark
+MESSAGES = 200000
+# deadlines of the publish benchmark are reached in this number of scheduler steps
+PUBLISH_STEPS = 1000
+# generators of the signals in publish_signals, assigned round robin
+SIGNAL_GENERATORS = ({"type": "ramp", "period": 2.0}, {"type": "sine", "amplitude": 10.0},
+                     {"type": "square", "period": 0.5}, {"type": "counter"},
+                     {"type": "random_walk", "step": 0.5})
+# offered rate in messages per second and duration of round trip benchmarks
+ROUND_TRIP_RATE = 20000
+ROUND_TRIP_SECONDS = 3.0
+# maximum time in seconds to wait for the tester to receive all round trip messages
+DRAIN_TIMEOUT = 5.0
+
+QUICK_TOPIC_COUNTS = (100, 1000)
+QUICK_PAYLOAD_SIZES = (64,)
+QUICK_MESSAGES = 50000
+QUICK_ROUND_TRIP_SECONDS = 1.0
+
+# repetitions of every benchmark, the median of every value is reported
+REPEAT = 5
+QUICK_REPEAT = 3
+
+
+def topic_name(topic_no):
+    """ Topic name like in the trace files, e.g. mqtt/ECU7/signal_107 """
+    return f"mqtt/ECU{topic_no % 100}/signal_{topic_no}"
+
+
+def topic_result(topic_no, payload_size, generated=False):
+    """ `result` of a topic with an encoded payload of about payload_size bytes,
+    with `generated` its signal declares a generator """
+    result = [{"schema": {"signal": topic_no, "data": ""}}]
+    filler = payload_size - len(json.dumps(result))
+    if generated:
+        result[0]["schema"]["signals"] = {f"signal_{topic_no}": {
+            "raw_value": 0, "generator": SIGNAL_GENERATORS[topic_no % len(SIGNAL_GENERATORS)]}}
+        filler -= len(json.dumps(result[0]["schema"]["signals"]))
+    result[0]["schema"]["data"] = "x" * max(filler, 0)
+    return result
+
+
+def make_payload_table(topics, payload_size, count, generated=False):
+    """ Payload table with `count` messages per topic and trace run """
+    payload_table = PayloadTable()
+    for topic_no in range(topics):
+        payload_table.add_topic(topic_name(topic_no), count,
+                                topic_result(topic_no, payload_size, generated))
+    return payload_table
+
+
+def make_test_app(topics, payload_size, broker=None):
+    """ MessageTestApp with all topics, connected to the broker stand-in """
+    test_app = MessageTestApp(client_id="benchmark_tester", subscribe_status=False)
+    for topic_no in range(topics):
+        test_app.add_topic(topic_name(topic_no), topic_result(topic_no, payload_size))
+    if broker is not None:
+        test_app.mqtt_client = FakeMqttClient(broker, "benchmark_tester")
+    return test_app
+
+
+def merged_latency(test_app):
+    """ Latency histogram of all topics received by the tester """
+    latency = LatencyHistogram()
+    for delivery_stats in test_app._delivery_stats:
+        latency.merge(delivery_stats.latency)
+    return latency
+
+
+def result_row(name, messages, seconds, cpu_seconds, latency=None):
+    """ Benchmark result with throughput, CPU per message and latency percentiles """
+    row = {"name": name,
+           "messages": messages,
+           "msgs_per_sec": round(messages / seconds, 1) if seconds > 0 else 0.0,
+           "cpu_us_per_msg": round(cpu_seconds * 1e6 / messages, 3) if messages else 0.0}
+    for column, percent in (("latency_p50_us", 50), ("latency_p99_us", 99),
+                            ("latency_max_us", 100)):
+        value_us = latency.percentile(percent) if latency is not None else None
+        row[column] = None if value_us is None else round(value_us, 1)
+    return row
+
+
+def bench_publish(topics, payload_size, messages, generated=False):
+    """ Publish path of the player, the deadlines of one trace run are
+    reached in PUBLISH_STEPS scheduler steps """
+    broker = FakeBroker()
+    payload_table = make_payload_table(topics, payload_size, max(messages // topics, 1),
+                                       generated)
+    publisher = TracePublisher(payload_table, 1, create_publish_pipeline(
+        FakeMqttClient(broker, "benchmark_player")))
+    publisher.scheduler.start(0.0, 1.0)
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for step in range(1, PUBLISH_STEPS + 1):
+        publisher.publish_due(step / PUBLISH_STEPS)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+    name = "publish_signals" if generated else "publish"
+    return result_row(f"{name}/topics={topics}/payload={payload_size}",
+                      publisher.published, seconds, cpu_seconds)
+
+
+def bench_ingest(topics, payload_size, messages):
+    """ Ingest path of the tester, stamped messages passed to user_callback """
+    test_app = make_test_app(topics, payload_size)
+    test_app.reset_test(1.0)
+    clock_ns = stamp_clock(settings.LATENCY_CLOCK)
+    payloads = [json.dumps(topic_result(topic_no, payload_size)).encode("utf-8")
+                for topic_no in range(topics)]
+    received = [FakeMessage(topic_name(message_no % topics), payloads[message_no % topics],
+                            0, False, stamp_properties(message_no // topics + 1, clock_ns()),
+                            0.0)
+                for message_no in range(messages)]
+    user_callback = test_app.user_callback
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for message in received:
+        user_callback(None, None, message)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+    return result_row(f"ingest/topics={topics}/payload={payload_size}",
+                      messages, seconds, cpu_seconds)
+
+
+async def bench_round_trip(topics, payload_size, rate, duration):
+    """ Player to tester through the broker stand-in at a fixed offered rate """
+    broker = FakeBroker()
+    test_app = make_test_app(topics, payload_size, broker)
+    await test_app.mqtt_client.connect()
+    await test_app.subscribe_topics()
+
+    # one message per topic and trace second, speed gives the offered rate
+    payload_table = make_payload_table(topics, payload_size, 1)
+    speed = rate / topics
+    test_app.reset_test(speed)
+    player_client = FakeMqttClient(broker, "benchmark_player")
+    await player_client.connect()
+    publisher = TracePublisher(payload_table, 1, create_publish_pipeline(player_client))
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    publisher.start(time.monotonic(), speed)
+    await asyncio.sleep(duration)
+    publisher.stop()
+    # let the tester drain its subscription queues
+    drain_start = time.perf_counter()
+    while broker.delivered > sum(stats.received for stats in test_app._delivery_stats) \
+            and time.perf_counter() - drain_start < DRAIN_TIMEOUT:
+        await asyncio.sleep(0)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+
+    received = sum(stats.received for stats in test_app._delivery_stats)
+    row = result_row(f"round_trip/topics={topics}/payload={payload_size}",
+                     received, seconds, cpu_seconds, merged_latency(test_app))
+    await test_app.close()
+    return row
+
+
+def median_row(rows):
+    """ Result with the median of every value of repeated runs of a benchmark """
+    row = {"name": rows[0]["name"]}
+    for column in rows[0]:
+        if column == "name":
+            continue
+        values = [other[column] for other in rows if other[column] is not None]
+        row[column] = statistics.median(values) if values else None
+    return row
+
+
+def run_repeated(benchmark, repeat):
+    """ Run benchmark (function without arguments returning a result) `repeat` times """
+    return median_row([benchmark() for _ in range(max(repeat, 1))])
+
+
+def check_baselines(results, baselines, tolerance):
+    """
+    Compare results with baselines.
+
+    Returns:
+        regressions (list): description of every regression or missing baseline
+    """
+    regressions = []
+    for row in results:
+        baseline = baselines.get(row["name"])
+        if baseline is None:
+            regressions.append(f"{row['name']}: no baseline")
+            continue
+        if row["msgs_per_sec"] < baseline["msgs_per_sec"] * (1.0 - tolerance):
+            regressions.append(f"{row['name']}: {row['msgs_per_sec']} msgs/s, "
+                               f"baseline {baseline['msgs_per_sec']}")
+        if row["cpu_us_per_msg"] > baseline["cpu_us_per_msg"] * (1.0 + tolerance):
+            regressions.append(f"{row['name']}: {row['cpu_us_per_msg']} us CPU per message, "
+                               f"baseline {baseline['cpu_us_per_msg']}")
+    return regressions
+
+
+def print_results(results):
+    """ Print results as table """
+    columns = ("name", "msgs_per_sec", "cpu_us_per_msg",
+               "latency_p50_us", "latency_p99_us", "latency_max_us")
+    print(f"{columns[0]:<36}" + "".join(f"{column:>16}" for column in columns[1:]))
+    for row in results:
+        print(f"{row['name']:<36}" + "".join(
+            f"{'' if row[column] is None else row[column]:>16}" for column in columns[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--quick", action="store_true",
+                        help="fewer topic counts, payload sizes and messages")
+    parser.add_argument("--repeat", type=int,
+                        help=f"repetitions of every benchmark (default {REPEAT}, "
+                             f"{QUICK_REPEAT} with --quick), the median is reported")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help=f"store results as new baselines in {BASELINE_FILE}")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative deviation from baselines")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    topic_counts = QUICK_TOPIC_COUNTS if args.quick else TOPIC_COUNTS
+    payload_sizes = QUICK_PAYLOAD_SIZES if args.quick else PAYLOAD_SIZES
+    messages = QUICK_MESSAGES if args.quick else MESSAGES
+    round_trip_seconds = QUICK_ROUND_TRIP_SECONDS if args.quick else ROUND_TRIP_SECONDS
+    repeat = args.repeat or (QUICK_REPEAT if args.quick else REPEAT)
+
+    results = []
+    for topics in topic_counts:
+        for payload_size in payload_sizes:
+            results.append(run_repeated(
+                lambda: bench_publish(topics, payload_size, messages), repeat))
+            results.append(run_repeated(
+                lambda: bench_publish(topics, payload_size, messages, generated=True), repeat))
+            results.append(run_repeated(
+                lambda: bench_ingest(topics, payload_size, messages), repeat))
+            results.append(run_repeated(
+                lambda: asyncio.run(bench_round_trip(topics, payload_size, ROUND_TRIP_RATE,
+                                                     round_trip_seconds)), repeat))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    all_baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r") as baseline_file:
+            all_baselines = json.load(baseline_file)
+    # quick runs measure fewer messages, their results differ from full runs
+    baselines = all_baselines.setdefault("quick" if args.quick else "full", {})
+
+    if args.update_baselines:
+        for row in results:
+            baselines[row["name"]] = {"msgs_per_sec": row["msgs_per_sec"],
+                                      "cpu_us_per_msg": row["cpu_us_per_msg"]}
+        with open(BASELINE_FILE, "w") as baseline_file:
+            json.dump(all_baselines, baseline_file, indent=2, sort_keys=True)
+        print(f"Baselines stored in {BASELINE_FILE}")
+        return 0
+
+    regressions = check_baselines(results, baselines, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not baselines:
+        print("No baselines found, record them on this machine with --update-baselines")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,17 @@ For each MQTT message following parameters are defined:
 
 topic: MQTT topic
 count: number of messages to be sent during one trace run
-result: list of messages to be sent, each message is a JSON object
+result: list of messages to be sent, each message is a JSON object.
+        Every entry is published as a one-element list; with several entries
+        the player rotates through them (see PAYLOAD_ROTATION in settings)
+
+Control commands (start, stop, speed, query) are MQTTv5 requests: a command
+with response topic is answered with {"ack": ..., "status": ...}. The player
+status is published retained on `signalPlayer/status[/<trace name>]` when it
+changes, the broker publishes status `offline` when the player is gone.
+
+With TRACE_DIR the player loads the trace named in the start command from
+the trace library (see trace_library.py) instead of input_file.json.
 
 {
 "topic" : "mqtt/DME/Torque_1_KCAN",
@@ -19,17 +29,37 @@ result: list of messages to be sent, each message is a JSON object
 }
 """
 
+import asyncio
+import heapq
 import time
-import math
 import json
+from array import array
 from statemachine import StateMachine, State
 import settings
-from mqtt_client import MqttClient
+from mqtt_common import TraceDefinitionError, TraceFormatError, TraceReader, \
+                        read_trace_definition
+from mqtt_common.metrics import MetricsRegistry, counter, gauge, histogram, serve_metrics
+from payload_table import PayloadTable
+from trace_library import TraceLibrary
+from trace_publisher import CLIENT_ID, PLAYBACK_MODES, REALTIME, VIRTUAL, PublisherPool, \
+                            TracePublisher, TraceReplayPublisher, calc_publish_times, \
+                            connect_publisher, create_publish_pipeline
 
 
 PLAYER_START = "signalPlayer/start"
 PLAYER_STOP = "signalPlayer/stop"
+PLAYER_SPEED = "signalPlayer/speed"
 PLAYER_STATUS = "signalPlayer/status"
+PLAYER_QUERY = "signalPlayer/query"
+
+# interval in seconds to check the end of trace runs and changes of player status
+STATUS_INTERVAL = 0.1
+
+# default start command parameters
+DEFAULT_SPEED = 1.0
+
+# number of topics with most published messages listed in the log summary
+SUMMARY_TOPICS = 5
 
 
 class SignalPlayerState(StateMachine):
@@ -47,108 +77,664 @@ class SignalPlayerState(StateMachine):
 
 def read_config_file(file_name:str):
     """ 
-    Reads the JSON file and returns the trace data, number of topics, and trace length.
+    Reads the JSON file and returns the table with pre-encoded payloads,
+    number of topics, and trace length.
     Args:
         file_name (str): The name of the JSON file containing the trace data.
 
     Returns:
-        trace_data (dict): The trace data from the JSON file.
+        payload_table (PayloadTable): Topics with their pre-encoded payloads.
         topics_amount (int): The number of topics in the trace.
         trace_length (int): The length of the trace in seconds
     """
 
-    try:
-        with open(file_name, "r") as data_file:
-            trace_data = json.load(data_file)
-            # get number of topics in json file
-            topics_amount = len(trace_data['trace'][0]['topics'])
-            settings.LOGGER.info("Number of topics in JSON: %s", topics_amount)
-            # get length in seconds of the trace
-            trace_length = trace_data['trace'][0]["traceLengthSeconds"]
-            settings.LOGGER.info("Trace length in seconds: %s", trace_length)
-            return trace_data, topics_amount, trace_length
+    # encode all payloads once, publishing only picks ready bytes;
+    # topics are streamed from the file, decoded entries are dropped after encoding
+    payload_table = PayloadTable(rotation=settings.PAYLOAD_ROTATION,
+                                 seed=settings.PAYLOAD_SEED)
+
+    def add_topic(topic_id, topic, entry):
+        try:
+            payload_table.add_topic(topic, entry.get('count', 0), entry.get('result'))
+        except ValueError as err:
+            raise TraceDefinitionError(f"Topic {topic}: {err}") from err
 
+    try:
+        topic_table, trace_fields = read_trace_definition(file_name, add_topic)
     except (FileNotFoundError, IOError):
         settings.LOGGER.info("Wrong JSON file name or file doesn't exist ")
         return None, None, None
+    except TraceDefinitionError as err:
+        settings.LOGGER.info("Invalid JSON trace definition: %s", err)
+        return None, None, None
+
+    # get number of topics in json file
+    topics_amount = len(topic_table)
+    settings.LOGGER.info("Number of topics in JSON: %s", topics_amount)
+    # get length in seconds of the trace, the schedule and the trace runs
+    # are calculated from it
+    trace_length = trace_fields.get("traceLengthSeconds")
+    if isinstance(trace_length, bool) or not isinstance(trace_length, (int, float)) \
+        or not trace_length > 0:
+        settings.LOGGER.info("Invalid JSON trace definition: traceLengthSeconds must be "
+                             "a positive number of seconds, got %r", trace_length)
+        return None, None, None
+    settings.LOGGER.info("Trace length in seconds: %s", trace_length)
+    return payload_table, topics_amount, trace_length
 
 
-if __name__ == '__main__':
+def read_trace_name(payload):
+    """
+    Return trace name of a control command, e.g. {"trace_name": "trace-01"}, or None.
+    """
+    try:
+        command = json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+    return command.get("trace_name") if isinstance(command, dict) else None
 
-    player_state = SignalPlayerState()
-    trace_data, topics_amount, trace_length = read_config_file("input_file.json")
-    if topics_amount is not None and trace_length is not None:
-        # holds publish time intervals for each topic
-        topics_publish_times = []
 
-        for topic in range(topics_amount):
-            # calculate time interval in seconds
-            # how frequently each topic should be published during trace run
-            topic_freq = round(
-                float(trace_length / trace_data['trace'][0]['topics'][topic]["count"]),
-                            1)
+def player_trace_name():
+    """
+    Return the trace this player is restricted to (PLAYER_TRACE_NAME) or None
+    if it plays every trace, as always with the trace library (TRACE_DIR).
+    """
+    if settings.TRACE_DIR or not settings.PLAYER_TRACE_NAME:
+        return None
+    return settings.PLAYER_TRACE_NAME
 
-            topics_publish_times.append(topic_freq)
-        settings.LOGGER.info("Topics publish times: %s", topics_publish_times)
-        time.sleep(1)
 
-        while True:
-            try:
-                settings.LOGGER.info("Connecting to MQTT broker...")
-                mqtt_publisher = MqttClient("IoT_signal_player",
-                                            settings.MQTT_HOST,
-                                            settings.MQTT_PORT,)
-            except Exception as err:
-                settings.LOGGER.info("Connection to MQTT broker failed: %s", err)
-            else:
-                break
-
-        mqtt_publisher.subscribe(PLAYER_START)
-        mqtt_publisher.subscribe(PLAYER_STOP)
-        mqtt_publisher.start()
-        count_100ms = 0
+def addressed(trace_name):
+    """ False if a command is for the player of another trace (batch runs) """
+    own_trace_name = player_trace_name()
+    return own_trace_name is None or trace_name is None or trace_name == own_trace_name
+
+
+def read_start_command(payload):
+    """
+    Read parameters of the start command sent by the tester,
+    e.g. {"trace_name": "trace-01", "speed": 10.0, "fanout": 100, "mode": "realtime"}
+
+    Args:
+        payload (bytes): payload of start message
+
+    Returns:
+        trace_name (str): requested trace or None
+        speed (float): time compression factor of the trace
+        fanout (int): number of copies of every topic (load mode)
+        mode (str): playback mode, realtime or virtual
+    """
+    trace_name = None
+    speed = DEFAULT_SPEED
+    fanout = settings.LOAD_FANOUT
+    mode = settings.PLAYBACK_MODE
+    try:
+        command = json.loads(payload)
+        if isinstance(command, dict):
+            trace_name = command.get("trace_name")
+            speed = float(command.get("speed", speed))
+            fanout = int(command.get("fanout", fanout))
+            mode = str(command.get("mode", mode)).lower()
+    except (TypeError, ValueError) as err:
+        settings.LOGGER.info("Start command without parameters: %s", err)
+
+    if speed <= 0.0:
+        settings.LOGGER.info("Invalid speed %s, using %s", speed, DEFAULT_SPEED)
+        speed = DEFAULT_SPEED
+    if mode not in PLAYBACK_MODES:
+        settings.LOGGER.info("Unknown playback mode %s, using %s", mode, REALTIME)
+        mode = REALTIME
+    return trace_name, speed, max(fanout, 1), mode
+
+
+class SignalPlayer:
+    """
+    Signal trace player, handles start/stop commands and publishes player status.
+    Topics are published by a TracePublisher (TraceReplayPublisher for
+    recorded traces) in this process or by a PublisherPool of worker processes.
+    """
+    def __init__(self, trace_table, trace_length, publisher_pool=None, trace_reader=None,
+                 trace_library=None, trace_name=None):
+        """
+        Args:
+            trace_table (PayloadTable): topics with pre-encoded payloads
+            trace_length (int): The length of the trace in seconds
+            publisher_pool (PublisherPool): worker processes or None
+            trace_reader (TraceReader): recorded trace replayed instead of trace_table
+            trace_library (TraceLibrary): traces loaded by name of the start command or None
+            trace_name (str): name of trace_table in the trace library
+        """
+        self.player_state = SignalPlayerState()
+        self.trace_table = trace_table
+        self.trace_length = trace_length
+        self.publisher_pool = publisher_pool
+        self.trace_reader = trace_reader
+        self.trace_library = trace_library
+        self.trace_name = trace_name
+        self.mqtt_publisher = None
+        self.publish_pipeline = None
+        self.publisher = publisher_pool
+        self.fanout = 1
+
+        # common timebase of the running trace
+        self.trace_start_time = 0.0
+        self.trace_speed = DEFAULT_SPEED
+        # trace time on the virtual clock instead of wall time
+        self.virtual = False
+        # trace time in seconds reported in player status
+        self.time_elapsed = 0.0
+        # number of completed trace runs since start
+        self.trace_runs = 0
+        # number of start commands, identifies the status of a started trace
+        self.run_no = 0
+        # players of a batch trace publish their own retained status
+        self.status_topic = f"{PLAYER_STATUS}/{player_trace_name()}" \
+                            if player_trace_name() else PLAYER_STATUS
+        # status fields whose change is published
+        self._status_key = None
+        # published messages (total and per topic) at the last log summary
+        self._summary_time = 0.0
+        self._summary_published = 0
+        self._summary_topic_published = None
+
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self.collect_metrics)
+
+    @property
+    def playing(self):
+        """ True if the trace is playing """
+        return str(self.player_state.current_state) == "playing"
+
+    async def run(self):
+        """
+        Connect to the broker and handle control messages until cancelled.
+        """
+        offline = json.dumps({"status": "offline", "trace_name": player_trace_name()})
+        self.mqtt_publisher = await connect_publisher(CLIENT_ID, (self.status_topic, offline))
+        if self.publisher_pool is None:
+            self.publish_pipeline = create_publish_pipeline(self.mqtt_publisher)
+        if self.publisher_pool is None and self.trace_reader is not None:
+            self.publisher = TraceReplayPublisher(self.trace_reader, self.publish_pipeline)
+        elif self.publisher_pool is None:
+            self.publisher = TracePublisher(self.trace_table, self.trace_length,
+                                            self.publish_pipeline)
+
+        control = await self.mqtt_publisher.subscribe([PLAYER_START, PLAYER_STOP,
+                                                       PLAYER_SPEED, PLAYER_QUERY])
+        self.publish_status()
+        tasks = [asyncio.create_task(self.update_status())]
+        if settings.METRICS_PORT or settings.METRICS_TOPIC:
+            tasks.append(asyncio.create_task(serve_metrics(
+                self.metrics, settings.METRICS_PORT, self.mqtt_publisher,
+                settings.METRICS_TOPIC, settings.METRICS_INTERVAL)))
+        try:
+            async for message in control:
+                if message.topic == PLAYER_START:
+                    accepted = await self.start(message.payload)
+                elif message.topic == PLAYER_STOP:
+                    accepted = self.stop(message.payload)
+                elif message.topic == PLAYER_SPEED:
+                    accepted = self.set_speed(message.payload)
+                else:
+                    accepted = True if addressed(read_trace_name(message.payload)) else None
+                # commands for other players are not answered
+                if accepted is not None:
+                    self.respond(message, accepted)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # the broker replaces the retained status by the offline will
+            await self.mqtt_publisher.disconnect(publish_will=True)
+
+    async def start(self, payload):
+        """
+        Start the trace from the beginning (also if already playing),
+        with a trace library the requested trace is loaded first.
+
+        Args:
+            payload (bytes): payload of start message
 
+        Returns:
+            accepted (bool): None if the command is for another trace,
+                             False if the trace isn't in the trace library
+        """
+        trace_name, speed, start_fanout, mode = read_start_command(payload)
+        if not addressed(trace_name):
+            # batch runs of the tester start one player per trace
+            settings.LOGGER.info("Start command of trace %s ignored", trace_name)
+            return None
+        if self.trace_library is not None and trace_name is not None \
+            and trace_name != self.trace_name and not await self.load_trace(trace_name):
+            return False
+        self.virtual = mode == VIRTUAL
+        # trace time on the virtual clock isn't scaled by speed
+        self.trace_speed = DEFAULT_SPEED if self.virtual else speed
+        if self.trace_reader is not None and start_fanout != 1:
+            settings.LOGGER.info("Topic fan-out isn't supported for recorded traces")
+            start_fanout = 1
+        if not self.playing:
+            self.player_state.play()
+
+        now = time.monotonic()
+        if self.publisher_pool is not None:
+            self.trace_start_time = self.publisher_pool.start(now, self.trace_speed,
+                                                              start_fanout, self.virtual)
+        else:
+            if start_fanout != self.fanout:
+                # load mode, clone topic list under generated topic names
+                self.publisher.stop()
+                self.publisher = TracePublisher(self.trace_table.fan_out(start_fanout),
+                                                self.trace_length, self.publish_pipeline)
+            self.trace_start_time = now
+            self.publisher.start(self.trace_start_time, self.trace_speed, self.virtual)
+        self.fanout = start_fanout
+        self.time_elapsed = 0.0
+        self.trace_runs = 0
+        self.run_no += 1
+        self._summary_time = now
+        self._summary_published = 0
+        self._summary_topic_published = None
+        settings.LOGGER.info("Trace %s started (%s) with speed %s, topic fan-out %s, QoS %s",
+                             self.trace_name or "", mode, self.trace_speed, self.fanout,
+                             settings.MQTT_QOS)
+        return True
+
+    async def load_trace(self, trace_name):
+        """
+        Replace the trace by a trace of the trace library. A trace which isn't
+        cached is read in a thread, the event loop keeps handling the connection.
+
+        Args:
+            trace_name (str): trace name, e.g. trace-01
+
+        Returns:
+            loaded (bool): False if the library has no valid trace of this name
+        """
+        load_time = time.monotonic()
+        trace = await asyncio.get_running_loop().run_in_executor(
+            None, self.trace_library.get, trace_name)
+        if trace is None:
+            settings.LOGGER.info("Trace %s not found in trace library %s",
+                                 trace_name, self.trace_library.trace_dir)
+            return False
+
+        self.stop()
+        self.trace_table = trace.payload_table
+        self.trace_length = trace.trace_length
+        self.trace_name = trace_name
+        if self.publisher_pool is not None:
+            # workers only switch to a trace the coordinator found valid
+            self.publisher_pool.load(trace_name)
+        else:
+            self.publisher = TracePublisher(self.trace_table, self.trace_length,
+                                            self.publish_pipeline)
+            self.fanout = 1
+        settings.LOGGER.info("Trace %s with %s topics ready in %s ms (%s of %s traces cached)",
+                             trace_name, trace.topics_amount,
+                             round((time.monotonic() - load_time) * 1000, 1),
+                             self.trace_library.cached, len(self.trace_library))
+        return True
+
+    def set_speed(self, payload):
+        """
+        Change speed of the playing trace at its current position,
+        e.g. {"speed": 20.0} sent by the tester in adaptive speed mode.
+
+        Args:
+            payload (bytes): payload of speed message
+
+        Returns:
+            accepted (bool): False if the speed can't be changed
+        """
+        try:
+            speed = float(json.loads(payload)["speed"])
+        except (TypeError, ValueError, KeyError) as err:
+            settings.LOGGER.info("Invalid speed command: %s", err)
+            return False
+        if not self.playing or speed <= 0.0:
+            return False
+        if speed == self.trace_speed:
+            return True
+        if self.virtual:
+            settings.LOGGER.info("Speed change to %s ignored on the virtual clock", speed)
+            return False
+
+        now = time.monotonic()
+        if self.publisher_pool is not None:
+            self.publisher_pool.set_speed(speed, now)
+        else:
+            self.publisher.set_speed(speed, now)
+        # common timebase continues at the current trace time
+        self.trace_start_time = now - (now - self.trace_start_time) * self.trace_speed / speed
+        self.trace_speed = speed
+        settings.LOGGER.info("Trace speed changed to %s", speed)
+        return True
+
+    def stop(self, payload=b""):
+        """
+        Stop the trace.
+
+        Args:
+            payload (bytes): payload of stop message, empty or with trace name
+
+        Returns:
+            accepted (bool): None if the command is for another trace
+        """
+        if not addressed(read_trace_name(payload)):
+            return None
+        if self.playing:
+            self.player_state.stop()
+            self.publisher.stop()
+            settings.LOGGER.info("Trace stopped")
+        return True
+
+    def respond(self, request, accepted):
+        """
+        Answer a control command sent as request with response topic,
+        the response carries the current player status.
+
+        Args:
+            request (MQTTMessage): received control command
+            accepted (bool): command accepted
+        """
+        status = self.publish_status()
+        self.mqtt_publisher.respond(request, json.dumps({"ack": accepted, "status": status}),
+                                    qos=settings.MQTT_QOS)
+
+    def collect_metrics(self):
+        """
+        Return metrics of the player, read when metrics are scraped or published.
+        Per-topic metrics are available only without publisher workers.
+        """
+        publisher = self.publisher
+        families = [counter("player_published", "Messages published since trace start",
+                            publisher.published),
+                    gauge("player_schedule_max_lag_seconds",
+                          "Biggest delay of a publish behind its deadline since trace start",
+                          publisher.max_lag),
+                    gauge("player_trace_runs", "Completed trace runs since trace start",
+                          self.trace_runs)]
+
+        if self.publisher_pool is None:
+            topic_published = counter("player_topic_published",
+                                      "Messages published per topic since trace start")
+            for topic, published in zip(publisher.topics, publisher.topic_published):
+                topic_published.add_sample(published, {"topic": topic})
+            lag = publisher.current_lag(time.monotonic()) if self.playing else 0.0
+            pipeline = self.publish_pipeline
+            families += [topic_published,
+                         histogram("player_publish_duration_seconds",
+                                   "Duration of sampled publish calls",
+                                   publisher.publish_duration),
+                         gauge("player_schedule_lag_seconds",
+                               "Delay of the next publish behind its deadline", lag),
+                         counter("player_acknowledged",
+                                 "Messages acknowledged by the broker since trace start",
+                                 pipeline.acknowledged),
+                         counter("player_dropped",
+                                 "Messages dropped by the publish pipeline overflow policy",
+                                 pipeline.dropped),
+                         counter("player_publish_failed",
+                                 "Messages rejected by the MQTT client or lost on disconnect",
+                                 pipeline.failed),
+                         gauge("player_pipeline_queued_messages",
+                               "Messages waiting for the in-flight window",
+                               pipeline.queued),
+                         gauge("player_pipeline_inflight_messages",
+                               "Messages waiting for acknowledge",
+                               pipeline.inflight),
+                         histogram("player_ack_latency_seconds",
+                                   "Time from publish until acknowledge "
+                                   "(written to the socket for QoS 0)",
+                                   pipeline.ack_latency),
+                         counter("player_offline_buffered",
+                                 "Messages put into the offline buffer since trace start",
+                                 pipeline.buffered),
+                         counter("player_offline_buffer_dropped",
+                                 "Messages dropped from the full offline buffer",
+                                 pipeline.buffer_dropped),
+                         counter("player_offline_replayed",
+                                 "Messages replayed from the offline buffer after reconnect",
+                                 pipeline.replayed),
+                         gauge("player_offline_buffer_messages",
+                               "Messages waiting in the offline buffer",
+                               pipeline.buffered_messages)]
+
+        if self.mqtt_publisher is not None:
+            families += [gauge("player_mqtt_queued_messages",
+                               "Packets in the outgoing queue of the MQTT client",
+                               self.mqtt_publisher.queued_messages),
+                         gauge("player_mqtt_inflight_messages",
+                               "QoS 1/2 messages waiting for acknowledge",
+                               self.mqtt_publisher.inflight_messages)]
+        if self.trace_library is not None:
+            families += [counter("player_trace_loads", "Traces read from the trace library",
+                                 self.trace_library.loads),
+                         counter("player_trace_cache_hits",
+                                 "Traces started from the trace library cache",
+                                 self.trace_library.hits),
+                         gauge("player_traces_cached", "Loaded traces kept in memory",
+                               self.trace_library.cached)]
+        families += [counter("player_mqtt_reconnects", "Reconnects to the broker since start",
+                             self.reconnects),
+                     counter("player_mqtt_outage_seconds",
+                             "Time disconnected from the broker since start",
+                             self.outage_seconds)]
+        return families
+
+    @property
+    def acknowledged(self):
+        """ Number of messages acknowledged by the broker since trace start """
+        if self.publisher_pool is not None:
+            return self.publisher_pool.acknowledged
+        return self.publish_pipeline.acknowledged
+
+    @property
+    def reconnects(self):
+        """ Number of reconnects to the broker since start """
+        if self.publisher_pool is not None:
+            return self.publisher_pool.reconnects
+        return self.mqtt_publisher.reconnects if self.mqtt_publisher is not None else 0
+
+    @property
+    def outage_seconds(self):
+        """ Time in seconds disconnected from the broker since start """
+        if self.publisher_pool is not None:
+            return self.publisher_pool.outage_seconds
+        return self.mqtt_publisher.outage_seconds if self.mqtt_publisher is not None else 0.0
+
+    def pipeline_report(self):
+        """
+        Return sustained throughput of acknowledged messages since trace start,
+        ack latency percentiles and connection outages as text for the log.
+        """
+        acknowledged = self.acknowledged
+        if self.publisher_pool is not None:
+            dropped = self.publisher_pool.dropped
+            latency = ""
+            replay = ""
+        else:
+            pipeline = self.publish_pipeline
+            dropped = pipeline.dropped
+            ack_latency = pipeline.ack_latency
+            latency = ", ack latency p50 <= {} ms, p99 <= {} ms".format(
+                *(round(ack_latency.percentile(percent) * 1000, 3)
+                  if ack_latency.total else None
+                  for percent in (50, 99)))
+            replay = ""
+            if pipeline.buffered:
+                replay = f", offline buffered {pipeline.buffered} (dropped " \
+                         f"{pipeline.buffer_dropped}), replayed {pipeline.replayed}"
+                if pipeline.replay_seconds > 0.0:
+                    replay_rate = pipeline.last_replayed / pipeline.replay_seconds
+                    replay += f" (last replay {round(replay_rate, 1)} msg/s)"
+        outages = ""
+        if self.reconnects:
+            outages = f", {self.reconnects} reconnects after " \
+                      f"{round(self.outage_seconds, 2)} s disconnected{replay}"
+        seconds = max(time.monotonic() - self.trace_start_time, 1e-9)
+        return f"acknowledged {acknowledged} messages ({round(acknowledged / seconds, 1)} " \
+               f"msg/s), dropped {dropped}{latency}{outages}"
+
+    def log_publish_summary(self, now):
+        """
+        Log messages published since the last summary and the topics with
+        most published messages (without publisher workers).
+
+        Args:
+            now (float): current monotonic time
+        """
+        published = self.publisher.published
+        seconds = max(now - self._summary_time, 1e-9)
+        messages = published - self._summary_published
+        busiest = ""
+        if self.publisher_pool is None:
+            topic_published = self.publisher.topic_published
+            last_published = self._summary_topic_published
+            if last_published is None or len(last_published) != len(topic_published):
+                last_published = array("Q", bytes(8 * len(topic_published)))
+            topics = self.publisher.topics
+            busiest = ", busiest topics: {}".format([
+                (topics[topic_id], count) for count, topic_id in heapq.nlargest(
+                    SUMMARY_TOPICS,
+                    ((count - last, topic_id) for topic_id, (count, last)
+                     in enumerate(zip(topic_published, last_published))))
+                if count > 0])
+            self._summary_topic_published = array("Q", topic_published)
+        settings.LOGGER.info("Published %s messages in %s s (%s msg/s)%s", messages,
+                             round(seconds, 1), round(messages / seconds, 1), busiest)
+        self._summary_time = now
+        self._summary_published = published
+
+    def status_payload(self):
+        """ Return current player status """
+        return {"status": str(self.player_state.current_state),
+                "trace_name": player_trace_name(),
+                "trace": self.trace_name,
+                "run": self.run_no,
+                "time_elapsed": round(self.time_elapsed, 1),
+                "trace_length": self.trace_length,
+                "trace_runs": self.trace_runs,
+                "speed": self.trace_speed,
+                "mode": VIRTUAL if self.virtual else REALTIME,
+                "max_lag": round(self.publisher.max_lag, 4),
+                "published": self.publisher.published,
+                "acknowledged": self.acknowledged,
+                "reconnects": self.reconnects,
+                "outage_seconds": round(self.outage_seconds, 3)}
+
+    def publish_status(self):
+        """
+        Publish player status retained if state, run, trace runs, speed or
+        connection changed since the last published status.
+
+        Returns:
+            status (dict): current player status
+        """
+        status = self.status_payload()
+        # after a reconnect the offline will of the broker is replaced
+        status_key = (status["status"], status["run"], status["trace_runs"], status["speed"],
+                      status["mode"], status["reconnects"], self.mqtt_publisher.reconnects)
+        if status_key != self._status_key:
+            self._status_key = status_key
+            self.mqtt_publisher.publish_nowait(self.status_topic, json.dumps(status),
+                                               qos=1, retain=True)
+        return status
+
+    async def update_status(self):
+        """
+        Check the end of trace runs every STATUS_INTERVAL seconds and
+        publish changes of the player status.
+        """
+        next_status_time = time.monotonic()
         while True:
-            time.sleep(0.1)
-            settings.LOGGER.info("Waiting for messages...")
-            # received message to start the player
-            if mqtt_publisher.read_topic == PLAYER_START:
-                mqtt_publisher.read_topic = ''
-                if str(player_state.current_state) == "stopped":
-                    player_state.play()
-                # reset counter of 100ms ticks if stopped or playing
-                count_100ms = 0
-
-            # received message to stop the player
-            elif mqtt_publisher.read_topic == PLAYER_STOP:
-                mqtt_publisher.read_topic = ''
-                if str(player_state.current_state) == "playing":
-                    player_state.stop()
-
-            # publish player status
-            payload = {"status": str(player_state.current_state),
-                       "time_elapsed": round(count_100ms * 0.1, 1),
-                       "trace_length": trace_length}
-            mqtt_publisher.publish_message(PLAYER_STATUS, json.dumps(payload))
-
-            if str(player_state.current_state) == "playing":
-                # check if count 100ms tick value
-                # of respective topic is included in topics_publish_times
-                for topic_number in range(topics_amount):
-                    if count_100ms > 0 and \
-                        math.isclose(
-                                    count_100ms*10
-                                     %
-                                     int(topics_publish_times[topic_number]*10),
-                                     0.0):
-                        topic = trace_data['trace'][0]['topics'][topic_number]['topic']
-                        payload = trace_data['trace'][0]['topics'][topic_number]['result']
-                        mqtt_publisher.publish_message(topic, json.dumps(payload))
-                        settings.LOGGER.info("Published message to topic: %s \
-                                               with payload: %s", topic, payload)
-                count_100ms += 1
-
-                # trace completed
-                if count_100ms * 0.1 > trace_length :
-                    count_100ms = 0
-                    settings.LOGGER.info("Trace completed")
+            if self.publisher_pool is not None:
+                # published counts of workers are updated on request
+                self.publisher_pool.request_status()
+            if self.playing:
+                if self.virtual:
+                    # trace time reached by the publishers (the slowest worker)
+                    elapsed = self.publisher.trace_time
+                else:
+                    elapsed = max(time.monotonic() - self.trace_start_time, 0.0) \
+                              * self.trace_speed
+                self.time_elapsed = elapsed % self.trace_length
+
+                # trace completed, schedule keeps running for the next trace run
+                if int(elapsed // self.trace_length) > self.trace_runs:
+                    self.trace_runs = int(elapsed // self.trace_length)
+                    settings.LOGGER.info("Trace completed, max. publish lag: %s ms, %s",
+                                         round(self.publisher.max_lag * 1000, 2),
+                                         self.pipeline_report())
+
+                now = time.monotonic()
+                if settings.LOG_SUMMARY_INTERVAL > 0 \
+                    and now - self._summary_time >= settings.LOG_SUMMARY_INTERVAL:
+                    self.log_publish_summary(now)
+
+            self.publish_status()
+
+            next_status_time += STATUS_INTERVAL
+            # don't try to catch up missed status cycles
+            if next_status_time < time.monotonic():
+                next_status_time = time.monotonic() + STATUS_INTERVAL
+            await asyncio.sleep(next_status_time - time.monotonic())
+
+
+if __name__ == '__main__':
+
+    trace_reader = None
+    trace_library = None
+    initial_trace = None
+    if settings.TRACE_FILE:
+        # replay of recorded traffic, messages are read from the mapped file
+        try:
+            trace_reader = TraceReader(settings.TRACE_FILE)
+        except (OSError, TraceFormatError) as err:
+            settings.LOGGER.info("Trace file can't be opened: %s", err)
+            trace_table, topics_amount, trace_length = None, None, None
+        else:
+            trace_table = None
+            topics_amount = len(trace_reader.topics)
+            trace_length = trace_reader.trace_length
+            settings.LOGGER.info("Recorded trace %s: %s topics, %s messages, %s seconds",
+                                 settings.TRACE_FILE, topics_amount,
+                                 len(trace_reader), trace_length)
+    elif settings.TRACE_DIR:
+        # traces are loaded by name of the start command, the first one
+        # of the library is loaded before connecting
+        trace_library = TraceLibrary(settings.TRACE_DIR, settings.TRACE_CACHE_SIZE,
+                                     read_config_file)
+        trace_table, topics_amount, trace_length = None, None, None
+        initial_trace = next(iter(trace_library.names), None)
+        trace = trace_library.get(initial_trace) if initial_trace is not None else None
+        if trace is not None:
+            trace_table = trace.payload_table
+            topics_amount = trace.topics_amount
+            trace_length = trace.trace_length
+        else:
+            settings.LOGGER.info("No valid trace %s in trace library", initial_trace or "")
+    else:
+        trace_table, topics_amount, trace_length = read_config_file("input_file.json")
+
+    if topics_amount is not None and trace_length is not None:
+        if trace_table is not None:
+            # holds publish time intervals for each topic
+            topics_publish_times = calc_publish_times(trace_table, trace_length)
+            settings.LOGGER.info("Topics publish times: %s", topics_publish_times)
+
+        # with several workers topics are published from worker processes,
+        # this process only coordinates them (start/stop/status)
+        publisher_pool = None
+        if settings.PLAYER_WORKERS > 1:
+            publisher_pool = PublisherPool(settings.PLAYER_WORKERS,
+                                           trace_table, trace_length,
+                                           settings.TRACE_FILE or None, trace_library)
+
+        signal_player = SignalPlayer(trace_table, trace_length, publisher_pool, trace_reader,
+                                     trace_library, initial_trace)
+        try:
+            asyncio.run(signal_player.run())
+        finally:
+            if publisher_pool is not None:
+                publisher_pool.close()
@@ -0,0 +1,308 @@
+"""
+Compact per-topic table of pre-encoded MQTT payloads for the signal trace player.
+
+All payloads of a trace are serialized to bytes once when the trace is loaded,
+so publishing a message needs neither JSON encoding nor dict lookups.
+Every entry in `result` of a topic is a payload variant. Variants are published
+as one-element JSON list (same format as a single-entry `result`) and rotated
+in a cycle or picked at random on each publish.
+Variants with generated signals are encoded once into a PayloadTemplate:
+the bytes around the generated `raw_value`s, into which the values computed
+by the SignalBank of the table are spliced when the topic is published.
+"""
+
+import json
+import random
+import re
+from array import array
+from mqtt_common import GENERATOR_KEY
+from signal_generators import SignalBank
+
+
+ROTATION_CYCLE = "cycle"
+ROTATION_RANDOM = "random"
+
+# placeholder of a generated value in an encoded template (json escapes \x00)
+_SLOT_MARKER = "\x00{}\x00"
+_SLOT_PATTERN = re.compile(rb'"\\u0000(\d+)\\u0000"')
+
+
+def load_topic_name(topic, copy_no):
+    """
+    Return name of a topic copy generated in load mode.
+    Copy 0 is the original topic, other copies get suffix `/load<copy_no>`,
+    so they stay below the same topic levels (and wildcard filters) as the original.
+    Message tester generates the same names (topic_index.load_topic_name).
+    """
+    if copy_no == 0:
+        return topic
+    return f"{topic}/load{copy_no}"
+
+
+class PayloadTemplate:
+    """
+    Encoded payload variant with slots for generated signal values.
+    """
+    __slots__ = ("parts", "slots")
+
+    def __init__(self, parts, slots):
+        """
+        Args:
+            parts (tuple): encoded bytes before, between and after the values
+            slots (tuple): row of the signal of every value, relative to the
+                           first signal row of the topic
+        """
+        self.parts = parts
+        self.slots = slots
+
+    def render(self, values):
+        """ Return payload with the encoded values spliced in """
+        parts = self.parts
+        if len(values) == 1:
+            return parts[0] + values[0] + parts[1]
+        payload = [parts[0]]
+        for value, part in zip(values, parts[1:]):
+            payload.append(value)
+            payload.append(part)
+        return b"".join(payload)
+
+
+def _template_variant(variant, signals):
+    """
+    Replace `raw_value` of signals with generator by slot placeholders.
+
+    Args:
+        variant: decoded payload variant
+        signals (list): generator declarations and fixed values of the
+                        topic signals, appended in slot order
+
+    Returns:
+        variant: copy with placeholders, the variant itself if nothing is generated
+    """
+    if isinstance(variant, list):
+        entries = [_template_variant(entry, signals) for entry in variant]
+        changed = any(entry is not original for entry, original in zip(entries, variant))
+        return entries if changed else variant
+    if not isinstance(variant, dict):
+        return variant
+
+    members = {}
+    for key, member in variant.items():
+        if key == "signals" and isinstance(member, dict):
+            signal_members = {}
+            for name, signal in member.items():
+                if isinstance(signal, dict) and GENERATOR_KEY in signal:
+                    signals.append((signal[GENERATOR_KEY], signal.get("raw_value", 0)))
+                    signal = {signal_key: signal_value
+                              for signal_key, signal_value in signal.items()
+                              if signal_key != GENERATOR_KEY}
+                    signal["raw_value"] = _SLOT_MARKER.format(len(signals) - 1)
+                else:
+                    signal = _template_variant(signal, signals)
+                signal_members[name] = signal
+            member = signal_members
+        else:
+            member = _template_variant(member, signals)
+        members[key] = member
+    changed = any(members[key] is not variant[key] for key in variant)
+    return members if changed else variant
+
+
+def _encode_template(variant):
+    """ Return encoded variant or PayloadTemplate if it contains slots """
+    encoded = json.dumps(variant).encode("utf-8")
+    pieces = _SLOT_PATTERN.split(encoded)
+    if len(pieces) == 1:
+        return encoded
+    return PayloadTemplate(tuple(pieces[0::2]), tuple(int(slot) for slot in pieces[1::2]))
+
+
+class PayloadTable:
+    """
+    Topic names, message counts and pre-encoded payload variants indexed by topic id.
+    """
+    __slots__ = ("topics", "counts", "payloads", "rotation", "signals",
+                 "_cursors", "_random", "_seed", "_signal_offsets", "_signal_counts")
+
+    def __init__(self, rotation=ROTATION_CYCLE, seed=None):
+        """
+        Args:
+            rotation (str): `cycle` or `random` order of payload variants
+            seed (int): seed for random rotation, None for non-reproducible order
+        """
+        if rotation not in (ROTATION_CYCLE, ROTATION_RANDOM):
+            raise ValueError(f"Unknown payload rotation: {rotation}")
+
+        self.topics = []
+        self.counts = array("I")
+        self.payloads = []
+        self.rotation = rotation
+        # generated signals of all topics, None without generators
+        self.signals = None
+        self._cursors = array("I")
+        self._random = random.Random(seed)
+        self._seed = seed
+        # first row and number of rows of the generated signals by topic id
+        self._signal_offsets = array("I")
+        self._signal_counts = array("I")
+
+    def __len__(self):
+        return len(self.topics)
+
+    def add_topic(self, topic, count, result):
+        """
+        Encode all payload variants of a topic and append it to the table.
+
+        Args:
+            topic (str): MQTT topic
+            count (int): number of messages to be sent during one trace run
+            result (list): payload variants of the topic
+
+        Returns:
+            topic_id (int): index of the topic in the table
+
+        Raises:
+            ValueError: invalid generator declaration of a signal
+        """
+        if isinstance(result, list) and len(result) > 0:
+            variants = [[variant] for variant in result]
+        else:
+            variants = [result]
+
+        # generators of all variants, slots of a variant refer to this list
+        signals = []
+        variants = tuple(_encode_template(_template_variant(variant, signals))
+                         for variant in variants)
+        signal_offset = 0
+        if signals:
+            if self.signals is None:
+                self.signals = SignalBank(self._seed)
+            signal_offset = len(self.signals)
+            for generator, raw_value in signals:
+                self.signals.add(generator, raw_value)
+
+        self.topics.append(topic)
+        self.counts.append(count)
+        self.payloads.append(variants)
+        self._cursors.append(0)
+        self._signal_offsets.append(signal_offset)
+        self._signal_counts.append(len(signals))
+        return len(self.topics) - 1
+
+    def fan_out(self, multiplier):
+        """
+        Return table with all topics cloned `multiplier` times under generated
+        topic names (see load_topic_name). Encoded payloads are shared, not copied.
+
+        Args:
+            multiplier (int): number of copies of every topic, 1 returns this table
+        """
+        if multiplier <= 1:
+            return self
+
+        table = PayloadTable(rotation=self.rotation, seed=self._seed)
+        signal_rows = len(self.signals) if self.signals is not None else 0
+        for copy_no in range(multiplier):
+            table.topics.extend(load_topic_name(topic, copy_no) for topic in self.topics)
+            table.counts.extend(self.counts)
+            table.payloads.extend(self.payloads)
+            # every copy gets its own signals
+            table._signal_offsets.extend(offset + copy_no * signal_rows
+                                         for offset in self._signal_offsets)
+            table._signal_counts.extend(self._signal_counts)
+        table._cursors = array("I", bytes(4 * len(table.topics)))
+        if self.signals is not None:
+            table.signals = self.signals.tile(multiplier)
+        return table
+
+    def shard(self, shard_no, shards):
+        """
+        Return table with every `shards`-th topic starting with topic id `shard_no`.
+        Encoded payloads are shared, not copied.
+
+        Args:
+            shard_no (int): index of the shard, 0 <= shard_no < shards
+            shards (int): number of shards, 1 returns this table
+        """
+        if shards <= 1:
+            return self
+
+        table = PayloadTable(rotation=self.rotation, seed=self._seed)
+        table.topics = self.topics[shard_no::shards]
+        table.counts = self.counts[shard_no::shards]
+        table.payloads = self.payloads[shard_no::shards]
+        table._cursors = array("I", bytes(4 * len(table.topics)))
+        table._signal_counts = self._signal_counts[shard_no::shards]
+        if self.signals is None:
+            table._signal_offsets = array("I", bytes(4 * len(table.topics)))
+            return table
+
+        # signals of the shard topics, renumbered in topic order
+        signal_rows = []
+        for offset, signal_count in zip(self._signal_offsets[shard_no::shards],
+                                        table._signal_counts):
+            table._signal_offsets.append(len(signal_rows))
+            signal_rows.extend(range(offset, offset + signal_count))
+        table.signals = self.signals.take(signal_rows)
+        return table
+
+    def reset(self):
+        """ Start rotation of all topics again with the first variant,
+        restart counters and random walks of generated signals """
+        for topic_id in range(len(self._cursors)):
+            self._cursors[topic_id] = 0
+        if self.signals is not None:
+            self.signals.reset()
+
+    def next_payloads(self, topic_ids, trace_time):
+        """
+        Return next payloads of topics published at the same scheduler step,
+        generated signal values of all of them are computed in one batch.
+
+        Args:
+            topic_ids (list): indexes of the topics in the table
+            trace_time (float): trace time in seconds of the step
+
+        Returns:
+            payloads (list): encoded payload by position in `topic_ids`
+        """
+        payloads = [self.next_payload(topic_id) for topic_id in topic_ids]
+        if self.signals is None:
+            return payloads
+
+        templates = [position for position, payload in enumerate(payloads)
+                     if type(payload) is PayloadTemplate]
+        if not templates:
+            return payloads
+        signal_offsets = self._signal_offsets
+        rows = []
+        for position in templates:
+            offset = signal_offsets[topic_ids[position]]
+            rows.extend(offset + slot for slot in payloads[position].slots)
+        values = self.signals.evaluate(rows, trace_time)
+
+        value_no = 0
+        for position in templates:
+            template = payloads[position]
+            slots = len(template.slots)
+            payloads[position] = template.render(values[value_no:value_no + slots])
+            value_no += slots
+        return payloads
+
+    def next_payload(self, topic_id):
+        """
+        Return next pre-encoded payload variant of the topic,
+        a PayloadTemplate for variants with generated signals (see `next_payloads`).
+
+        Args:
+            topic_id (int): index of the topic in the table
+        """
+        variants = self.payloads[topic_id]
+        if len(variants) == 1:
+            return variants[0]
+        if self.rotation == ROTATION_RANDOM:
+            return variants[self._random.randrange(len(variants))]
+
+        cursor = self._cursors[topic_id]
+        self._cursors[topic_id] = (cursor + 1) % len(variants)
+        return variants[cursor]
@@ -0,0 +1,152 @@
+"""
+Deadline based publish scheduler for the signal trace player.
+
+Each topic has its own publish period. The next due deadline of every topic
+is kept in a priority queue (heap), so that one publish costs O(log n)
+independently of the number of topics in the trace.
+Deadlines are calculated from a monotonic clock and the trace start time
+(start + n * period / speed), so the schedule doesn't drift with the time
+spent on publishing and any period (also below 10 ms) can be used.
+Periods are given in trace time, `speed` compresses the trace time
+(speed 10.0 publishes ten times faster than defined in the trace).
+"""
+
+import heapq
+import math
+import time
+
+
+class PublishScheduler:
+    """
+    Priority queue of next-due publish deadlines for all topics of a trace.
+    """
+    def __init__(self, publish_periods, clock=time.monotonic):
+        """
+        Args:
+            publish_periods (list): publish period in seconds for each topic id.
+                                    Topics with period <= 0 are never scheduled.
+            clock (callable): monotonic time source returning seconds
+        """
+        self._periods = list(publish_periods)
+        self._clock = clock
+        self._heap = []
+        self._start_time = None
+        self._speed = 1.0
+
+        # biggest delay of a publish behind its deadline in seconds
+        self.max_lag = 0.0
+
+    @property
+    def running(self):
+        """ Return True if the scheduler was started and not stopped """
+        return self._start_time is not None
+
+    @property
+    def start_time(self):
+        """ Monotonic time of the trace start or None if not running """
+        return self._start_time
+
+    @property
+    def speed(self):
+        """ Time compression factor of the running trace """
+        return self._speed
+
+    def start(self, start_time=None, speed=1.0):
+        """
+        Schedule first publish of every topic one period after start time.
+
+        Args:
+            start_time (float): monotonic start time, current time if None
+            speed (float): time compression factor, must be > 0
+        """
+        if speed <= 0.0:
+            raise ValueError(f"Speed must be positive: {speed}")
+        self._speed = speed
+        self._start_time = self._clock() if start_time is None else start_time
+        self._heap = [(self._start_time + period / speed, topic_id, 1)
+                      for topic_id, period in enumerate(self._periods)
+                      if period > 0]
+        heapq.heapify(self._heap)
+        self.max_lag = 0.0
+
+    def set_speed(self, speed, now=None):
+        """
+        Change speed of the running trace at its current position,
+        pending deadlines are rescaled and the maximum lag is reset.
+
+        Args:
+            speed (float): new time compression factor, must be > 0
+            now (float): monotonic time of the change, current time if None
+        """
+        if speed <= 0.0:
+            raise ValueError(f"Speed must be positive: {speed}")
+        if self._start_time is None:
+            self._speed = speed
+            return
+        if now is None:
+            now = self._clock()
+        # keep trace time at `now`: (now - start) * speed stays the same
+        self._start_time = now - (now - self._start_time) * self._speed / speed
+        self._speed = speed
+        start_time = self._start_time
+        periods = self._periods
+        self._heap = [(start_time + publish_no * periods[topic_id] / speed,
+                       topic_id, publish_no)
+                      for _, topic_id, publish_no in self._heap]
+        heapq.heapify(self._heap)
+        self.max_lag = 0.0
+
+    def stop(self):
+        """ Drop all pending deadlines """
+        self._heap = []
+        self._start_time = None
+
+    def elapsed(self, now=None):
+        """
+        Return trace time in seconds since the scheduler start (0.0 if not running).
+        """
+        if self._start_time is None:
+            return 0.0
+        if now is None:
+            now = self._clock()
+        return (now - self._start_time) * self._speed
+
+    def next_deadline(self):
+        """
+        Return monotonic time of the earliest pending publish or None.
+        """
+        if self._heap:
+            return self._heap[0][0]
+        return None
+
+    def pop_due(self, now=None, limit=None):
+        """
+        Yield ids of all topics whose deadline is reached
+        and schedule their next publish.
+
+        Args:
+            now (float): current monotonic time, read from the clock if None
+            limit (int): maximum number of yielded topics, None for all,
+                         further topics stay due
+        """
+        if now is None:
+            now = self._clock()
+        heap = self._heap
+        start_time = self._start_time
+        periods = self._periods
+        speed = self._speed
+        if limit is None:
+            limit = math.inf
+
+        while heap and heap[0][0] <= now and limit > 0:
+            limit -= 1
+            deadline, topic_id, publish_no = heap[0]
+            lag = now - deadline
+            if lag > self.max_lag:
+                self.max_lag = lag
+            publish_no += 1
+            heapq.heapreplace(heap,
+                              (start_time + publish_no * periods[topic_id] / speed,
+                               topic_id,
+                               publish_no))
+            yield topic_id
@@ -0,0 +1,104 @@
+"""
+Sweep of publish pipeline settings against the MQTT broker.
+
+For every in-flight window size messages are published as fast as the
+publish pipeline allows (`block` policy), the sweep reports sustained
+throughput (acknowledged messages per second) versus ack latency
+percentiles. Use it to choose MQTT_QOS and MAX_INFLIGHT_MESSAGES for a broker.
+
+Usage:
+    python publish_sweep.py [--qos 1] [--windows 1,10,100,1000] [--messages 20000]
+                            [--payload-size 256]
+"""
+
+import argparse
+import asyncio
+import time
+import settings
+from mqtt_common import PublishPipeline
+from mqtt_common.publish_pipeline import BLOCK
+from trace_publisher import CLIENT_ID, connect_publisher
+
+
+SWEEP_TOPIC = "signalPlayer/sweep"
+
+# maximum time in seconds to wait for outstanding acknowledges of one window size
+FLUSH_TIMEOUT = 30.0
+
+
+async def sweep_window(mqtt_publisher, qos, window, messages, payload):
+    """
+    Publish messages with one in-flight window size.
+
+    Returns:
+        row (dict): window, throughput and ack latency percentiles in ms
+    """
+    pipeline = PublishPipeline(mqtt_publisher, qos=qos, max_inflight=window,
+                               max_queued=window, overflow=BLOCK)
+    start = time.monotonic()
+    for _ in range(messages):
+        if pipeline.blocked:
+            await pipeline.wait_space()
+        pipeline.publish_nowait(SWEEP_TOPIC, payload)
+    if not await pipeline.flush(FLUSH_TIMEOUT):
+        settings.LOGGER.info("Window %s: %s messages not acknowledged after %s s",
+                             window, pipeline.queued + pipeline.inflight, FLUSH_TIMEOUT)
+    seconds = time.monotonic() - start
+
+    row = {"window": window,
+           "msgs_per_sec": round(pipeline.acknowledged / seconds, 1),
+           "failed": pipeline.failed}
+    for column, percent in (("ack_p50_ms", 50), ("ack_p99_ms", 99), ("ack_max_ms", 100)):
+        value = pipeline.ack_latency.percentile(percent)
+        row[column] = None if value is None else round(value * 1000, 3)
+    return row
+
+
+async def run_sweep(qos, windows, messages, payload_size):
+    """
+    Connect to the broker and sweep all window sizes.
+
+    Returns:
+        rows (list): result of every window size
+    """
+    mqtt_publisher = await connect_publisher(f"{CLIENT_ID}_sweep")
+    payload = b"x" * payload_size
+    rows = []
+    try:
+        for window in windows:
+            rows.append(await sweep_window(mqtt_publisher, qos, window, messages, payload))
+            settings.LOGGER.info("Window %s done", window)
+    finally:
+        await mqtt_publisher.disconnect()
+    return rows
+
+
+def print_rows(qos, rows):
+    """ Print sweep results as table """
+    columns = ("window", "msgs_per_sec", "ack_p50_ms", "ack_p99_ms", "ack_max_ms", "failed")
+    print(f"QoS {qos}")
+    print("".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("".join(f"{'' if row[column] is None else row[column]:>14}"
+                      for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--qos", type=int, default=settings.MQTT_QOS,
+                        help="QoS of published messages")
+    parser.add_argument("--windows", default="1,10,100,1000",
+                        help="comma separated in-flight window sizes")
+    parser.add_argument("--messages", type=int, default=20000,
+                        help="messages published per window size")
+    parser.add_argument("--payload-size", type=int, default=256,
+                        help="payload size in bytes")
+    args = parser.parse_args()
+
+    windows = [int(window) for window in args.windows.split(",") if window.strip()]
+    rows = asyncio.run(run_sweep(args.qos, windows, args.messages, args.payload_size))
+    print_rows(args.qos, rows)
+
+
+if __name__ == "__main__":
+    main()
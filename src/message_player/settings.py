@@ -1,5 +1,6 @@
 import logging
 import os
+import sys
 from dotenv import load_dotenv
 
 
@@ -8,14 +9,113 @@ LOG_FORMAT = "%(levelname)s %(asctime)s \
     Line: %(lineno)d \
     Message: %(message)s"
 
-logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
-LOGGER = logging.getLogger(__name__)
+# shared package mqtt_common is next to the app directory in the source tree,
+# in the docker image it is copied into the app directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
 
 # Load environment variables from the .env file
 load_dotenv()
 
+from mqtt_common.logs import configure_logging
+
+# log records are written by a background thread
+configure_logging(LOG_FORMAT)
+LOGGER = logging.getLogger(__name__)
+
 MQTT_HOST = os.getenv("MQTT_HOST", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_BROKER_USER = os.getenv("MQTT_USERNAME")
 MQTT_BROKER_PASSWORD = os.getenv("MQTT_PASSWORD")
-TEST_TRACE = os.getenv("TEST_TRACE")
\ No newline at end of file
+MQTT_QOS = int(os.getenv("MQTT_QOS", 1))
+TEST_TRACE = os.getenv("TEST_TRACE")
+
+# seconds the broker keeps the MQTTv5 session (subscriptions, queued QoS 1/2
+# messages) after a lost connection, 0 starts a clean session on every connect
+MQTT_SESSION_EXPIRY = max(int(os.getenv("MQTT_SESSION_EXPIRY", 300)), 0)
+# delay in seconds before the first reconnect attempt, doubled after every
+# failed attempt up to RECONNECT_MAX_DELAY
+RECONNECT_DELAY = float(os.getenv("RECONNECT_DELAY", 0.5))
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", 30.0))
+
+# name of the played trace, reported in the player status; start commands
+# of other traces are ignored (one player per trace in parallel tester batch
+# runs), empty plays the trace for every start command. Not TRACE_NAME, which
+# names the trace tested by the message tester. Ignored with TRACE_DIR, the
+# trace library plays every trace.
+PLAYER_TRACE_NAME = os.getenv("PLAYER_TRACE_NAME", "")
+
+# order of payload variants in `result` of a topic: cycle or random
+PAYLOAD_ROTATION = os.getenv("PAYLOAD_ROTATION", "cycle")
+# seed for random payload rotation, unset for non-reproducible order
+PAYLOAD_SEED = int(os.getenv("PAYLOAD_SEED")) if os.getenv("PAYLOAD_SEED") else None
+
+# clock for latency stamps of messages: monotonic (player and tester
+# on the same host) or wall (hosts synchronized with NTP/PTP)
+LATENCY_CLOCK = os.getenv("LATENCY_CLOCK", "monotonic")
+
+# stamp published messages with sequence number and send timestamp
+# (MQTTv5 user properties), used by tester for latency and loss statistics
+STAMP_MESSAGES = os.getenv("STAMP_MESSAGES", "true").lower() in ("true", "1", "yes")
+
+# publish pipeline: maximum number of unacknowledged messages (in-flight window)
+# and of messages waiting for the window; when the queue is full the overflow
+# policy block delays the publish schedule, drop_oldest/drop_newest drop messages
+MAX_INFLIGHT_MESSAGES = max(int(os.getenv("MAX_INFLIGHT_MESSAGES", 100)), 1)
+MAX_QUEUED_MESSAGES = max(int(os.getenv("MAX_QUEUED_MESSAGES", 10000)), 0)
+PUBLISH_OVERFLOW = os.getenv("PUBLISH_OVERFLOW", "block")
+
+# offline buffer for messages published while disconnected from the broker,
+# at most OFFLINE_BUFFER_MESSAGES messages and OFFLINE_BUFFER_BYTES payload
+# bytes (0 unlimited), the oldest messages are dropped when full;
+# 0 messages disables the buffer
+OFFLINE_BUFFER_MESSAGES = max(int(os.getenv("OFFLINE_BUFFER_MESSAGES", 100000)), 0)
+OFFLINE_BUFFER_BYTES = max(int(os.getenv("OFFLINE_BUFFER_BYTES", 64 * 1024 * 1024)), 0)
+# messages per second replayed from the offline buffer after reconnect,
+# 0 as fast as the in-flight window allows
+REPLAY_RATE = max(float(os.getenv("REPLAY_RATE", 0)), 0.0)
+
+# playback mode: realtime (trace time follows wall time scaled by speed) or
+# virtual (messages in trace order, stamped with their trace time, published
+# as fast as the in-flight window allows), can be overridden by `mode`
+# in the start command
+PLAYBACK_MODE = os.getenv("PLAYBACK_MODE", "realtime").lower()
+
+# load mode: default number of copies of every topic under generated
+# topic names, can be overridden by `fanout` in the start command
+LOAD_FANOUT = int(os.getenv("LOAD_FANOUT", 1))
+
+# number of worker processes publishing the topics, each with its own
+# MQTT connection; 1 publishes from the main process
+PLAYER_WORKERS = max(int(os.getenv("PLAYER_WORKERS", 1)), 1)
+
+# recorded binary trace file (trace_recorder.py) to replay instead of
+# input_file.json, messages keep their original timing scaled by speed
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# directory of trace definitions `input_file_<trace>.json` played by
+# `trace_name` of the start command instead of input_file.json; at most
+# TRACE_CACHE_SIZE loaded traces are kept in memory (least recently used
+# traces are dropped)
+TRACE_DIR = os.getenv("TRACE_DIR", "")
+TRACE_CACHE_SIZE = max(int(os.getenv("TRACE_CACHE_SIZE", 4)), 1)
+
+# trace recorder: output file, comma separated topic filters to record
+# and recording time in seconds (0 records until interrupted)
+RECORD_FILE = os.getenv("RECORD_FILE", "recorded_trace.mqtrace")
+RECORD_TOPICS = [topic_filter.strip() for topic_filter
+                 in os.getenv("RECORD_TOPICS", "#").split(",") if topic_filter.strip()]
+RECORD_SECONDS = float(os.getenv("RECORD_SECONDS", 0))
+
+# metrics in OpenMetrics format: HTTP endpoint http://<host>:<METRICS_PORT>/metrics
+# (0 disables it) and MQTT topic published every METRICS_INTERVAL seconds
+# (empty disables it)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_TOPIC = os.getenv("METRICS_TOPIC", "")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 5.0))
+
+# logging of published messages: summary of published messages and busiest
+# topics every LOG_SUMMARY_INTERVAL seconds (0 disables it), with LOG_PAYLOADS
+# every LOG_SAMPLE_EVERY-th published message is logged with its payload
+LOG_SUMMARY_INTERVAL = float(os.getenv("LOG_SUMMARY_INTERVAL", 10.0))
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() in ("true", "1", "yes")
+LOG_SAMPLE_EVERY = max(int(os.getenv("LOG_SAMPLE_EVERY", 1000)), 1)
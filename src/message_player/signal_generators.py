@@ -0,0 +1,195 @@
+"""
+Vectorized signal generators of the signal trace player.
+
+Signals of a payload may declare a generator (see trace_definition.py):
+
+- `ramp`: rises from `min` to `max` within `period` seconds, then restarts
+- `sine`: `offset` + `amplitude` * sin(2 pi (t / `period` + `phase`))
+- `square`: `max` for the first `duty` fraction of every `period`, then `min`
+- `counter`: starts at `start` (`raw_value`), adds `step` on every publish,
+  restarts after `max` (if given)
+- `random_walk`: starts at `start` (`raw_value`), adds a uniform random step
+  of at most `step` on every publish, limited to `min` .. `max`
+
+Periodic generators are functions of the trace time, counter and random walk
+keep their state per signal. `decimals` (default 3, counter 0) rounds the values.
+All generated signals of a trace are rows of one SignalBank. The values of all
+signals published at one scheduler step are computed in one vectorized batch
+and formatted with a single format operation.
+"""
+
+import math
+import numpy as np
+
+
+RAMP = 0
+SINE = 1
+SQUARE = 2
+COUNTER = 3
+RANDOM_WALK = 4
+
+GENERATOR_TYPES = {"ramp": RAMP, "sine": SINE, "square": SQUARE,
+                   "counter": COUNTER, "random_walk": RANDOM_WALK}
+
+DEFAULT_PERIOD = 10.0
+DEFAULT_DECIMALS = 3
+
+# columns of the parameter table
+_LOW, _HIGH, _PERIOD, _PHASE, _DUTY, _STEP, _START, _SCALE = range(8)
+_COLUMNS = 8
+
+
+def _parameters(kind, generator, raw_value):
+    """ Return parameter row of a generator declaration """
+    period = float(generator.get("period", DEFAULT_PERIOD))
+    if period <= 0.0:
+        raise ValueError(f"Period of signal generator must be positive: {period}")
+    start = float(generator.get("start", raw_value))
+    low = float(generator.get("min", -math.inf))
+    high = float(generator.get("max", math.inf))
+    if kind == RAMP or kind == SQUARE:
+        low = float(generator.get("min", 0.0))
+        high = float(generator.get("max", 100.0 if kind == RAMP else 1.0))
+    elif kind == SINE:
+        amplitude = float(generator.get("amplitude", 1.0))
+        offset = float(generator.get("offset", raw_value))
+        low, high = offset - amplitude, offset + amplitude
+    elif kind == COUNTER:
+        # restarts at start, without max never
+        low = start
+    decimals = int(generator.get("decimals", 0 if kind == COUNTER else DEFAULT_DECIMALS))
+    return (low, high, period, float(generator.get("phase", 0.0)),
+            float(generator.get("duty", 0.5)), float(generator.get("step", 1.0)),
+            start, 10.0 ** decimals)
+
+
+class SignalBank:
+    """
+    Parameters and state of all generated signals of a trace, indexed by row.
+    """
+    def __init__(self, seed=None):
+        """
+        Args:
+            seed (int): seed of random walks, None for non-reproducible values
+        """
+        self._seed = seed
+        self._random = np.random.default_rng(seed)
+        self._kinds = np.empty(0, dtype=np.int8)
+        self._parameters = np.empty((0, _COLUMNS))
+        self._state = np.empty(0)
+        # rows added since the last vectorized operation
+        self._pending = []
+
+    def __len__(self):
+        return len(self._kinds) + len(self._pending)
+
+    def add(self, generator, raw_value=0.0):
+        """
+        Add signal with a generator declaration.
+
+        Args:
+            generator (dict): generator declaration, `type` and its parameters
+            raw_value (float): fixed value of the signal in the trace definition
+
+        Returns:
+            row (int): row of the signal in the bank
+
+        Raises:
+            ValueError: unknown generator type or invalid parameter
+        """
+        try:
+            kind = GENERATOR_TYPES[generator.get("type")]
+        except (KeyError, AttributeError, TypeError):
+            raise ValueError(f"Unknown signal generator: {generator!r:.100}") from None
+        if not isinstance(raw_value, (int, float)) or isinstance(raw_value, bool):
+            raw_value = 0.0
+        try:
+            parameters = _parameters(kind, generator, raw_value)
+        except (TypeError, ValueError) as err:
+            raise ValueError(f"Invalid signal generator {generator!r:.100}: {err}") from None
+        self._pending.append((kind, parameters))
+        return len(self) - 1
+
+    def _commit(self):
+        """ Append pending rows to the arrays """
+        if self._pending:
+            kinds = np.array([kind for kind, _ in self._pending], dtype=np.int8)
+            parameters = np.array([row for _, row in self._pending])
+            self._kinds = np.concatenate((self._kinds, kinds))
+            self._parameters = np.concatenate((self._parameters, parameters))
+            self._state = np.concatenate((self._state, parameters[:, _START]))
+            self._pending = []
+
+    def _copy(self, rows):
+        """ Return bank with the given rows, in initial state """
+        self._commit()
+        bank = SignalBank(self._seed)
+        bank._kinds = self._kinds[rows]
+        bank._parameters = self._parameters[rows]
+        bank._state = bank._parameters[:, _START].copy()
+        return bank
+
+    def tile(self, multiplier):
+        """ Return bank with all rows repeated `multiplier` times (topic fan-out) """
+        return self._copy(np.tile(np.arange(len(self)), multiplier))
+
+    def take(self, rows):
+        """ Return bank with the given rows (topic shard) """
+        return self._copy(np.asarray(rows, dtype=np.intp))
+
+    def reset(self):
+        """ Restart counters and random walks """
+        self._commit()
+        self._state = self._parameters[:, _START].copy()
+        self._random = np.random.default_rng(self._seed)
+
+    def evaluate(self, rows, trace_time):
+        """
+        Compute next values of signals in one batch.
+
+        Args:
+            rows (list): rows of the signals, a row listed twice gets the same value
+            trace_time (float): trace time in seconds of the periodic generators
+
+        Returns:
+            values (list): JSON encoded values (bytes) in order of `rows`
+        """
+        self._commit()
+        rows = np.asarray(rows, dtype=np.intp)
+        kinds = self._kinds[rows]
+        parameters = self._parameters[rows]
+        low = parameters[:, _LOW]
+        high = parameters[:, _HIGH]
+
+        stateful = kinds >= COUNTER
+        if stateful.all():
+            values = self._state[rows]
+        else:
+            phase = np.mod(trace_time / parameters[:, _PERIOD] + parameters[:, _PHASE], 1.0)
+            # unbounded stateful rows give nan here, their values are replaced below
+            with np.errstate(invalid="ignore"):
+                values = np.where(kinds == RAMP, low + (high - low) * phase,
+                         np.where(kinds == SINE,
+                                  (low + high) * 0.5 + (high - low) * 0.5
+                                  * np.sin(2.0 * math.pi * phase),
+                                  np.where(phase < parameters[:, _DUTY], high, low)))
+            if stateful.any():
+                values[stateful] = self._state[rows[stateful]]
+
+        if stateful.any():
+            state_rows = rows[stateful]
+            steps = parameters[stateful, _STEP]
+            walks = kinds[stateful] == RANDOM_WALK
+            if walks.any():
+                steps = np.where(walks, steps * self._random.uniform(-1.0, 1.0, len(steps)),
+                                 steps)
+            state = values[stateful] + steps
+            state_low = low[stateful]
+            state_high = high[stateful]
+            self._state[state_rows] = np.where(
+                walks, np.clip(state, state_low, state_high),
+                np.where(state > state_high, state_low, state))
+
+        scale = parameters[:, _SCALE]
+        values = np.rint(values * scale) / scale
+        return (b"%.15g\0" * len(values) % tuple(values.tolist()))[:-1].split(b"\0")
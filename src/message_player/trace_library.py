@@ -0,0 +1,133 @@
+"""
+Library of trace definitions of the signal trace player.
+
+TRACE_DIR holds the trace definitions as `input_file_<trace>.json`, named
+like the input files of the message tester. The directory is indexed at
+start and again when a requested trace isn't indexed, so traces can be
+added while the player runs. A trace is read and pre-encoded when a start
+command requests it for the first time; loaded traces are kept in an LRU
+cache of TRACE_CACHE_SIZE traces, so back-to-back runs of different traces
+start without reading their files. A trace whose file changed is read again.
+"""
+
+import os
+from collections import OrderedDict
+import settings
+
+
+INPUT_PREFIX = "input_file_"
+INPUT_SUFFIX = ".json"
+
+
+class LoadedTrace:
+    """
+    Pre-encoded trace of the library.
+    """
+    __slots__ = ("name", "payload_table", "topics_amount", "trace_length", "modified")
+
+    def __init__(self, name, payload_table, topics_amount, trace_length, modified):
+        """
+        Args:
+            name (str): trace name, e.g. trace-01
+            payload_table (PayloadTable): topics with pre-encoded payloads
+            topics_amount (int): number of topics in the trace
+            trace_length (int): length of the trace in seconds
+            modified (float): modification time of the file when it was read
+        """
+        self.name = name
+        self.payload_table = payload_table
+        self.topics_amount = topics_amount
+        self.trace_length = trace_length
+        self.modified = modified
+
+
+class TraceLibrary:
+    """
+    Trace files of a directory, loaded on demand into an LRU cache.
+    """
+    def __init__(self, trace_dir, cache_size, load):
+        """
+        Args:
+            trace_dir (str): directory of the trace files
+            cache_size (int): maximum number of loaded traces kept in memory
+            load (callable): function(file_name) returning payload table,
+                             number of topics and trace length (None if invalid)
+        """
+        self.trace_dir = trace_dir
+        self.cache_size = max(cache_size, 1)
+        self._load = load
+        # file name by trace name
+        self._files = {}
+        # loaded traces by trace name, least recently used first
+        self._cache = OrderedDict()
+        # number of traces read from file and of starts served from the cache
+        self.loads = 0
+        self.hits = 0
+        self.index()
+
+    def __len__(self):
+        return len(self._files)
+
+    @property
+    def names(self):
+        """ Names of the indexed traces, sorted """
+        return sorted(self._files)
+
+    @property
+    def cached(self):
+        """ Number of loaded traces in the cache """
+        return len(self._cache)
+
+    def index(self):
+        """ Index trace files of the directory """
+        try:
+            file_names = os.listdir(self.trace_dir)
+        except OSError as err:
+            settings.LOGGER.info("Trace directory %s can't be read: %s", self.trace_dir, err)
+            file_names = []
+        self._files = {file_name[len(INPUT_PREFIX):-len(INPUT_SUFFIX)]:
+                       os.path.join(self.trace_dir, file_name)
+                       for file_name in file_names
+                       if file_name.startswith(INPUT_PREFIX) and file_name.endswith(INPUT_SUFFIX)}
+        settings.LOGGER.info("Trace library %s: %s traces %s", self.trace_dir,
+                             len(self._files), self.names)
+
+    def get(self, trace_name):
+        """
+        Return loaded trace, read from its file if it isn't cached or its file changed.
+
+        Args:
+            trace_name (str): trace name, e.g. trace-01
+
+        Returns:
+            trace (LoadedTrace): None if the trace doesn't exist or is invalid
+        """
+        if trace_name not in self._files:
+            # trace files can be added while the player runs
+            self.index()
+        file_name = self._files.get(trace_name)
+        if file_name is None:
+            return None
+        try:
+            modified = os.stat(file_name).st_mtime
+        except OSError as err:
+            settings.LOGGER.info("Trace file %s can't be read: %s", file_name, err)
+            return None
+
+        trace = self._cache.get(trace_name)
+        if trace is not None and trace.modified == modified:
+            self._cache.move_to_end(trace_name)
+            self.hits += 1
+            return trace
+
+        settings.LOGGER.info("Loading trace %s from %s", trace_name, file_name)
+        payload_table, topics_amount, trace_length = self._load(file_name)
+        if topics_amount is None or trace_length is None:
+            return None
+        trace = LoadedTrace(trace_name, payload_table, topics_amount, trace_length, modified)
+        self._cache[trace_name] = trace
+        self._cache.move_to_end(trace_name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        self.loads += 1
+        return trace
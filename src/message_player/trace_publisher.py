@@ -0,0 +1,651 @@
+"""
+Publishing of trace topics for the signal trace player.
+
+TracePublisher publishes the topics of one payload table according to
+its publish scheduler over one MQTT connection.
+TraceReplayPublisher replays a recorded binary trace file with the
+original timing of the messages.
+PublisherPool splits the topics across worker processes, each worker has
+its own MQTT connection (client id with worker number) and TracePublisher.
+All workers start their schedulers with the same monotonic start time,
+(monotonic clock is system-wide), so the trace stays coherent across workers.
+Messages are published through a PublishPipeline with the configured QoS,
+in-flight window and overflow policy; with `block` policy a full pipeline
+holds back the publish schedule until messages are acknowledged.
+In virtual-clock playback the schedule isn't tied to wall time: messages
+are published in trace order, stamped with their trace time, as fast as
+the in-flight window allows (whatever the overflow policy).
+While the connection is lost, messages go to the offline buffer of the
+pipeline (if configured), the virtual clock waits until it is drained.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from array import array
+import settings
+from mqtt_common import AsyncMqttClient, PublishPipeline, TraceReader, stamp_clock, \
+                        stamp_properties
+from mqtt_common.metrics import SAMPLE_MASK, Histogram
+from publish_scheduler import PublishScheduler
+
+
+CLIENT_ID = "IoT_signal_player"
+
+# delay in seconds between start command and trace start in worker processes,
+# all workers should receive the command before the first deadline
+WORKER_START_DELAY = 0.05
+
+# replay of a burst yields to the event loop after this number of messages
+REPLAY_YIELD_EVERY = 1000
+
+# playback modes: trace time follows wall time scaled by speed (realtime)
+# or advances as fast as messages are published (virtual)
+REALTIME = "realtime"
+VIRTUAL = "virtual"
+PLAYBACK_MODES = (REALTIME, VIRTUAL)
+
+
+def calc_publish_times(payload_table, trace_length):
+    """
+    Calculate time interval in seconds how frequently each topic
+    should be published during trace run.
+
+    Args:
+        payload_table (PayloadTable): topics of the trace
+        trace_length (int): The length of the trace in seconds
+
+    Returns:
+        topics_publish_times (list): publish interval by topic id, 0.0 never published
+    """
+    topics_publish_times = []
+    for topic_count in payload_table.counts:
+        if topic_count > 0:
+            topics_publish_times.append(float(trace_length / topic_count))
+        else:
+            topics_publish_times.append(0.0)
+    return topics_publish_times
+
+
+async def connect_publisher(client_id, will=None):
+    """
+    Connect to MQTT broker, retry until connection is established.
+    The session is kept by the broker for MQTT_SESSION_EXPIRY seconds,
+    lost connections are re-established in the background.
+    The will (topic, payload) is published retained if the connection is lost.
+    """
+    mqtt_publisher = AsyncMqttClient(client_id,
+                                     settings.MQTT_HOST,
+                                     settings.MQTT_PORT,
+                                     settings.MQTT_BROKER_USER,
+                                     settings.MQTT_BROKER_PASSWORD,
+                                     session_expiry=settings.MQTT_SESSION_EXPIRY,
+                                     reconnect_delay=settings.RECONNECT_DELAY,
+                                     max_reconnect_delay=settings.RECONNECT_MAX_DELAY)
+    if will is not None:
+        mqtt_publisher.client.will_set(*will, qos=1, retain=True)
+    await mqtt_publisher.connect_retry()
+    return mqtt_publisher
+
+
+def create_publish_pipeline(mqtt_publisher):
+    """
+    Return publish pipeline of trace messages with QoS, in-flight window,
+    overflow policy and offline buffer from settings.
+    """
+    return PublishPipeline(mqtt_publisher,
+                           qos=settings.MQTT_QOS,
+                           max_inflight=settings.MAX_INFLIGHT_MESSAGES,
+                           max_queued=settings.MAX_QUEUED_MESSAGES,
+                           overflow=settings.PUBLISH_OVERFLOW,
+                           buffer_messages=settings.OFFLINE_BUFFER_MESSAGES,
+                           buffer_bytes=settings.OFFLINE_BUFFER_BYTES,
+                           replay_rate=settings.REPLAY_RATE)
+
+
+class TracePublisher:
+    """
+    Publishes topics of a payload table when their deadline is reached.
+    Publishing runs as asyncio task which sleeps until the next deadline.
+    """
+    def __init__(self, payload_table, trace_length, publish_pipeline):
+        """
+        Args:
+            payload_table (PayloadTable): topics with pre-encoded payloads
+            trace_length (int): The length of the trace in seconds
+            publish_pipeline (PublishPipeline): pipeline of a connected MQTT client
+        """
+        self.payload_table = payload_table
+        self.scheduler = PublishScheduler(calc_publish_times(payload_table,
+                                                             trace_length))
+        self.publish_pipeline = publish_pipeline
+        # number of published messages since start
+        self.published = 0
+        # published messages (last sequence number) of each topic since start
+        self.topic_published = array("Q", bytes(8 * len(payload_table)))
+        # duration of sampled publish calls in seconds
+        self.publish_duration = Histogram()
+        self._stamp_clock_ns = stamp_clock(settings.LATENCY_CLOCK)
+        self._publish_task = None
+        # virtual clock: scheduler deadlines are trace times in seconds
+        self.virtual = False
+        self._trace_time = 0.0
+
+    @property
+    def topics(self):
+        """ Topic names by topic id """
+        return self.payload_table.topics
+
+    @property
+    def max_lag(self):
+        """ Biggest delay of a publish behind its deadline in seconds """
+        return self.scheduler.max_lag
+
+    @property
+    def trace_time(self):
+        """ Trace time in seconds played since start (over all trace runs) """
+        if self.virtual:
+            return self._trace_time
+        return self.scheduler.elapsed()
+
+    def current_lag(self, now):
+        """ Delay of the next pending publish behind its deadline in seconds """
+        if self.virtual:
+            return 0.0
+        next_deadline = self.scheduler.next_deadline()
+        if next_deadline is None:
+            return 0.0
+        return max(now - next_deadline, 0.0)
+
+    def start(self, start_time, speed, virtual=False):
+        """
+        Start publishing the trace from the beginning.
+
+        Args:
+            start_time (float): monotonic start time of the trace
+            speed (float): time compression factor
+            virtual (bool): publish on the virtual clock, start time and
+                            speed are ignored
+        """
+        self.stop()
+        self.virtual = virtual
+        self._trace_time = 0.0
+        if virtual:
+            # deadlines in trace time, start 0.0 at speed 1.0
+            self.scheduler.start(0.0, 1.0)
+        else:
+            self.scheduler.start(start_time, speed)
+        self.payload_table.reset()
+        self.topic_published = array("Q", bytes(8 * len(self.payload_table)))
+        self.published = 0
+        self.publish_pipeline.reset_stats()
+        if virtual:
+            self._publish_task = asyncio.create_task(self._virtual_loop())
+        else:
+            self._publish_task = asyncio.create_task(self._publish_loop())
+
+    def stop(self):
+        """ Stop publishing """
+        if self._publish_task is not None:
+            self._publish_task.cancel()
+            self._publish_task = None
+        self.scheduler.stop()
+
+    def set_speed(self, speed, now):
+        """
+        Change speed of the running trace without restarting it.
+
+        Args:
+            speed (float): new time compression factor
+            now (float): monotonic time of the change
+        """
+        if self._publish_task is None:
+            return
+        if self.virtual:
+            settings.LOGGER.info("Speed change to %s ignored on the virtual clock", speed)
+            return
+        self.scheduler.set_speed(speed, now)
+        # publish loop may sleep until a deadline of the old speed
+        self._publish_task.cancel()
+        self._publish_task = asyncio.create_task(self._publish_loop())
+
+    def next_deadline(self):
+        """ Return monotonic time of the next publish or None """
+        return self.scheduler.next_deadline()
+
+    async def _publish_loop(self):
+        """
+        Sleep until the next deadline and publish all due topics,
+        wait while the publish pipeline is full (backpressure).
+        """
+        publish_pipeline = self.publish_pipeline
+        while True:
+            if publish_pipeline.blocked:
+                # deadlines are missed meanwhile, due topics are published
+                # when the pipeline has space again (lag grows)
+                await publish_pipeline.wait_space()
+            next_deadline = self.scheduler.next_deadline()
+            if next_deadline is None:
+                return
+            # behind schedule sleep(0) still lets other tasks run
+            # (status, control messages)
+            await asyncio.sleep(max(next_deadline - time.monotonic(), 0.0))
+            self.publish_due(time.monotonic())
+
+    async def _virtual_loop(self):
+        """
+        Advance the virtual clock from deadline to deadline without sleeping,
+        wait only while queue and in-flight window of the pipeline are full
+        or messages wait in its offline buffer.
+        """
+        publish_pipeline = self.publish_pipeline
+        scheduler = self.scheduler
+        yield_published = REPLAY_YIELD_EVERY
+        while True:
+            if publish_pipeline.backlogged:
+                await publish_pipeline.wait_space(backlog=True)
+                yield_published = self.published + REPLAY_YIELD_EVERY
+            elif self.published >= yield_published:
+                # let other tasks run (status, control messages, acks)
+                await asyncio.sleep(0)
+                yield_published = self.published + REPLAY_YIELD_EVERY
+            next_deadline = scheduler.next_deadline()
+            if next_deadline is None:
+                return
+            self._trace_time = next_deadline
+            self.publish_due(next_deadline)
+
+    def publish_due(self, now):
+        """
+        Publish all topics which reached their deadline, not more than the
+        publish pipeline takes before it is blocked (full on the virtual clock),
+        remaining topics stay due. Payloads of the step are created in one batch.
+
+        Args:
+            now (float): current monotonic time, trace time on the virtual clock
+        """
+        payload_table = self.payload_table
+        publish_pipeline = self.publish_pipeline
+        sequences = self.topic_published
+        virtual = self.virtual
+        trace_time_ns = int(now * 1e9) if virtual else None
+        log_payloads = settings.LOG_PAYLOADS
+
+        limit = None
+        if virtual or publish_pipeline.blocking:
+            limit = publish_pipeline.free_slots
+        topic_numbers = list(self.scheduler.pop_due(now, limit))
+        payloads = payload_table.next_payloads(topic_numbers, self.scheduler.elapsed(now))
+
+        for topic_number, payload in zip(topic_numbers, payloads):
+            topic = payload_table.topics[topic_number]
+            sequences[topic_number] += 1
+            properties = None
+            if settings.STAMP_MESSAGES:
+                # stamp for latency and loss measurement in tester
+                properties = stamp_properties(sequences[topic_number],
+                                              self._stamp_clock_ns(), trace_time_ns)
+            if self.published & SAMPLE_MASK:
+                publish_pipeline.publish_nowait(topic, payload, properties)
+            else:
+                call_start = time.perf_counter()
+                publish_pipeline.publish_nowait(topic, payload, properties)
+                self.publish_duration.observe(time.perf_counter() - call_start)
+            if log_payloads and self.published % settings.LOG_SAMPLE_EVERY == 0:
+                settings.LOGGER.info("Published message %s to topic %s with payload: %s",
+                                     self.published, topic, payload)
+            self.published += 1
+
+
+class TraceReplayPublisher:
+    """
+    Replays messages of a recorded trace file with their original timing,
+    scaled by speed. The trace is repeated every `trace_length` seconds
+    of trace time until stopped.
+    """
+    def __init__(self, trace_reader, publish_pipeline, shard_no=0, shards=1):
+        """
+        Args:
+            trace_reader (TraceReader): opened binary trace file
+            publish_pipeline (PublishPipeline): pipeline of a connected MQTT client
+            shard_no (int): replay only topics of this shard
+            shards (int): number of shards (publisher workers)
+        """
+        self.trace_reader = trace_reader
+        self.trace_length = trace_reader.trace_length
+        self.publish_pipeline = publish_pipeline
+        self.shard_no = shard_no
+        self.shards = shards
+        # number of published messages since start
+        self.published = 0
+        # biggest and current delay of a publish behind its deadline in seconds
+        self.max_lag = 0.0
+        self.lag = 0.0
+        # published messages (last sequence number) of each topic since start
+        self.topic_published = array("Q", bytes(8 * len(trace_reader.topics)))
+        # duration of sampled publish calls in seconds
+        self.publish_duration = Histogram()
+        self._stamp_clock_ns = stamp_clock(settings.LATENCY_CLOCK)
+        self._publish_task = None
+        self.virtual = False
+        self._trace_time_ns = 0
+
+    @property
+    def topics(self):
+        """ Topic names by topic id """
+        return self.trace_reader.topics
+
+    @property
+    def trace_time(self):
+        """ Trace time in seconds of the last published message (over all trace runs) """
+        return self._trace_time_ns / 1e9
+
+    def current_lag(self, now):
+        """ Delay of the last published message behind its deadline in seconds """
+        return self.lag
+
+    def start(self, start_time, speed, virtual=False):
+        """
+        Start replay of the trace from the beginning.
+
+        Args:
+            start_time (float): monotonic start time of the trace
+            speed (float): time compression factor
+            virtual (bool): replay on the virtual clock, without waiting
+                            for the recorded times
+        """
+        self.stop()
+        self.topic_published = array("Q", bytes(8 * len(self.trace_reader.topics)))
+        self.published = 0
+        self.max_lag = 0.0
+        self.lag = 0.0
+        self.virtual = virtual
+        self._trace_time_ns = 0
+        self.publish_pipeline.reset_stats()
+        if virtual:
+            self._publish_task = asyncio.create_task(self._virtual_replay_loop())
+        else:
+            self._publish_task = asyncio.create_task(self._replay_loop(start_time, speed))
+
+    def stop(self):
+        """ Stop replay """
+        if self._publish_task is not None:
+            self._publish_task.cancel()
+            self._publish_task = None
+
+    def set_speed(self, speed, now):
+        """ Speed changes of a running replay aren't supported """
+        settings.LOGGER.info("Speed change to %s ignored during replay of a recorded trace",
+                             speed)
+
+    async def _replay_loop(self, start_time, speed):
+        """
+        Publish every message at its recorded time, messages behind their
+        deadline are published immediately.
+        """
+        topics = self.trace_reader.topics
+        publish_pipeline = self.publish_pipeline
+        sequences = self.topic_published
+        time_scale = 1e-9 / speed
+        run_start_time = start_time
+        burst = 0
+
+        while True:
+            for timestamp_ns, topic_id, payload in self.trace_reader.messages_iter(
+                    self.shard_no, self.shards):
+                deadline = run_start_time + timestamp_ns * time_scale
+                lag = time.monotonic() - deadline
+                if lag < 0.0:
+                    await asyncio.sleep(-lag)
+                    self.lag = 0.0
+                    burst = 0
+                else:
+                    self.lag = lag
+                    self.max_lag = max(self.max_lag, lag)
+                    burst += 1
+                    if burst >= REPLAY_YIELD_EVERY:
+                        await asyncio.sleep(0)
+                        burst = 0
+
+                if publish_pipeline.blocked:
+                    await publish_pipeline.wait_space()
+                    burst = 0
+
+                sequences[topic_id] += 1
+                properties = None
+                if settings.STAMP_MESSAGES:
+                    properties = stamp_properties(sequences[topic_id],
+                                                  self._stamp_clock_ns())
+                if self.published & SAMPLE_MASK:
+                    publish_pipeline.publish_nowait(topics[topic_id], payload, properties)
+                else:
+                    call_start = time.perf_counter()
+                    publish_pipeline.publish_nowait(topics[topic_id], payload, properties)
+                    self.publish_duration.observe(time.perf_counter() - call_start)
+                self.published += 1
+
+            run_start_time += self.trace_length / speed
+
+    async def _virtual_replay_loop(self):
+        """
+        Publish the messages in recorded order as fast as the in-flight window
+        of the pipeline allows, stamped with their trace time.
+        """
+        topics = self.trace_reader.topics
+        publish_pipeline = self.publish_pipeline
+        sequences = self.topic_published
+        run_offset_ns = 0
+        trace_length_ns = int(self.trace_length * 1e9)
+        burst = 0
+
+        while True:
+            for timestamp_ns, topic_id, payload in self.trace_reader.messages_iter(
+                    self.shard_no, self.shards):
+                if publish_pipeline.backlogged:
+                    await publish_pipeline.wait_space(backlog=True)
+                    burst = 0
+                elif burst >= REPLAY_YIELD_EVERY:
+                    await asyncio.sleep(0)
+                    burst = 0
+                burst += 1
+
+                trace_time_ns = run_offset_ns + timestamp_ns
+                self._trace_time_ns = trace_time_ns
+                sequences[topic_id] += 1
+                properties = None
+                if settings.STAMP_MESSAGES:
+                    properties = stamp_properties(sequences[topic_id],
+                                                  self._stamp_clock_ns(), trace_time_ns)
+                publish_pipeline.publish_nowait(topics[topic_id], payload, properties)
+                self.published += 1
+
+            run_offset_ns += trace_length_ns
+            self._trace_time_ns = run_offset_ns
+            # an empty shard would spin without awaiting
+            await asyncio.sleep(0)
+
+
+async def _run_publisher_worker(worker_no, workers, trace_table, trace_length, trace_file,
+                                trace_library, command_queue, published_counts, max_lags,
+                                acknowledged_counts, dropped_counts, trace_times,
+                                reconnect_counts, outage_times):
+    """
+    Event loop of a publisher worker process.
+    Waits for commands of the coordinator and publishes its shard of topics.
+    """
+    loop = asyncio.get_running_loop()
+    mqtt_publisher = await connect_publisher(f"{CLIENT_ID}_{worker_no}")
+    publish_pipeline = create_publish_pipeline(mqtt_publisher)
+    publisher = None
+    fanout = None
+    if trace_file is not None:
+        # every worker maps the recorded trace and replays its shard of topics
+        publisher = TraceReplayPublisher(TraceReader(trace_file), publish_pipeline,
+                                         worker_no, workers)
+
+    while True:
+        # commands arrive over multiprocessing queue, wait in a thread
+        command = await loop.run_in_executor(None, command_queue.get)
+
+        if command[0] == "load":
+            # copy of the coordinator's trace library, loaded traces are cached per worker;
+            # read in a thread, the connection is kept alive meanwhile
+            trace = await loop.run_in_executor(None, trace_library.get, command[1])
+            if trace is not None and trace.payload_table is not trace_table:
+                if publisher is not None:
+                    publisher.stop()
+                    publisher = None
+                trace_table = trace.payload_table
+                trace_length = trace.trace_length
+        elif command[0] == "start":
+            _, start_time, speed, start_fanout, virtual = command
+            if trace_file is None and (publisher is None or start_fanout != fanout):
+                if publisher is not None:
+                    publisher.stop()
+                fanout = start_fanout
+                payload_table = trace_table.fan_out(fanout).shard(worker_no, workers)
+                publisher = TracePublisher(payload_table, trace_length, publish_pipeline)
+            publisher.start(start_time, speed, virtual)
+        elif command[0] == "stop" and publisher is not None:
+            publisher.stop()
+        elif command[0] == "speed" and publisher is not None:
+            _, speed, change_time = command
+            publisher.set_speed(speed, change_time)
+        elif command[0] == "status" and publisher is not None:
+            published_counts[worker_no] = publisher.published
+            max_lags[worker_no] = publisher.max_lag
+            acknowledged_counts[worker_no] = publish_pipeline.acknowledged
+            dropped_counts[worker_no] = publish_pipeline.dropped
+            trace_times[worker_no] = publisher.trace_time
+            reconnect_counts[worker_no] = mqtt_publisher.reconnects
+            outage_times[worker_no] = mqtt_publisher.outage_seconds
+        elif command[0] == "exit":
+            break
+
+    if publisher is not None:
+        publisher.stop()
+    await mqtt_publisher.disconnect()
+
+
+def _publisher_worker(*args):
+    """
+    Main function of a publisher worker process.
+    """
+    asyncio.run(_run_publisher_worker(*args))
+
+
+class PublisherPool:
+    """
+    Coordinator of publisher worker processes, every worker publishes
+    every n-th topic of the trace over its own MQTT connection.
+    """
+    def __init__(self, workers, trace_table, trace_length, trace_file=None, trace_library=None):
+        """
+        Args:
+            workers (int): number of worker processes
+            trace_table (PayloadTable): topics with pre-encoded payloads or None
+            trace_length (int): The length of the trace in seconds
+            trace_file (str): recorded binary trace to replay instead of trace_table
+            trace_library (TraceLibrary): traces loaded on `load` or None
+        """
+        self.workers = workers
+        self._published_counts = multiprocessing.Array("Q", workers, lock=False)
+        self._max_lags = multiprocessing.Array("d", workers, lock=False)
+        self._acknowledged_counts = multiprocessing.Array("Q", workers, lock=False)
+        self._dropped_counts = multiprocessing.Array("Q", workers, lock=False)
+        self._trace_times = multiprocessing.Array("d", workers, lock=False)
+        self._reconnect_counts = multiprocessing.Array("Q", workers, lock=False)
+        self._outage_times = multiprocessing.Array("d", workers, lock=False)
+        self._command_queues = []
+        self._processes = []
+
+        for worker_no in range(workers):
+            command_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_publisher_worker,
+                args=(worker_no, workers, trace_table, trace_length, trace_file,
+                      trace_library, command_queue, self._published_counts, self._max_lags,
+                      self._acknowledged_counts, self._dropped_counts,
+                      self._trace_times, self._reconnect_counts, self._outage_times),
+                name=f"publisher-{worker_no}",
+                daemon=True)
+            process.start()
+            self._command_queues.append(command_queue)
+            self._processes.append(process)
+        settings.LOGGER.info("Started %s publisher worker processes", workers)
+
+    @property
+    def published(self):
+        """ Number of messages published by all workers since start,
+        updated on every `request_status` """
+        return sum(self._published_counts)
+
+    @property
+    def max_lag(self):
+        """ Biggest publish delay of all workers in seconds """
+        return max(self._max_lags)
+
+    @property
+    def acknowledged(self):
+        """ Number of messages acknowledged by the broker in all workers since start """
+        return sum(self._acknowledged_counts)
+
+    @property
+    def dropped(self):
+        """ Number of messages dropped by publish pipelines of all workers since start """
+        return sum(self._dropped_counts)
+
+    @property
+    def trace_time(self):
+        """ Trace time in seconds reached by all workers (virtual clock) """
+        return min(self._trace_times)
+
+    @property
+    def reconnects(self):
+        """ Number of reconnects of all workers since start """
+        return sum(self._reconnect_counts)
+
+    @property
+    def outage_seconds(self):
+        """ Biggest total outage time of a worker in seconds since start """
+        return max(self._outage_times)
+
+    def start(self, start_time, speed, fanout, virtual=False):
+        """
+        Start the trace in all workers with the common start time.
+
+        Returns:
+            start_time (float): monotonic start time used by the workers
+        """
+        start_time += WORKER_START_DELAY
+        for worker_no, command_queue in enumerate(self._command_queues):
+            self._trace_times[worker_no] = 0.0
+            command_queue.put(("start", start_time, speed, fanout, virtual))
+        return start_time
+
+    def load(self, trace_name):
+        """ Replace the trace of all workers by a trace of their trace library """
+        for command_queue in self._command_queues:
+            command_queue.put(("load", trace_name))
+
+    def set_speed(self, speed, now):
+        """ Change speed of the running trace in all workers """
+        for command_queue in self._command_queues:
+            command_queue.put(("speed", speed, now))
+
+    def request_status(self):
+        """ Ask all workers to update their published, acknowledged and dropped counts and lag """
+        for command_queue in self._command_queues:
+            command_queue.put(("status",))
+
+    def stop(self):
+        """ Stop publishing in all workers """
+        for command_queue in self._command_queues:
+            command_queue.put(("stop",))
+
+    def close(self):
+        """ Terminate all worker processes """
+        for command_queue in self._command_queues:
+            command_queue.put(("exit",))
+        for process in self._processes:
+            process.join(timeout=5.0)
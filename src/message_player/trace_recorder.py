@@ -0,0 +1,89 @@
+"""
+This script records live MQTT traffic into a binary trace file,
+which can be replayed by the signal player (TRACE_FILE in settings)
+with the original timing of the messages.
+
+Topics matching RECORD_TOPICS are recorded into RECORD_FILE for
+RECORD_SECONDS seconds or until the script is interrupted.
+Control topics of player and tester (`signalPlayer/...`) are not recorded.
+"""
+
+import asyncio
+import time
+import settings
+from mqtt_common import AsyncMqttClient, TraceWriter
+
+
+CLIENT_ID = "IoT_signal_recorder"
+CONTROL_TOPIC_PREFIX = "signalPlayer/"
+
+# interval in seconds to flush the trace file and log the progress
+FLUSH_INTERVAL = 5.0
+
+# maximum number of received messages waiting to be written
+RECORD_QUEUE_SIZE = 100000
+
+
+async def record_trace(file_name, topic_filters, record_seconds):
+    """
+    Subscribe to topic filters and write every received message to the trace file.
+
+    Args:
+        file_name (str): binary trace file to write
+        topic_filters (list): mqtt topic filters to record
+        record_seconds (float): recording time, 0 records until cancelled
+    """
+    mqtt_recorder = AsyncMqttClient(CLIENT_ID,
+                                    settings.MQTT_HOST,
+                                    settings.MQTT_PORT,
+                                    settings.MQTT_BROKER_USER,
+                                    settings.MQTT_BROKER_PASSWORD,
+                                    session_expiry=settings.MQTT_SESSION_EXPIRY,
+                                    reconnect_delay=settings.RECONNECT_DELAY,
+                                    max_reconnect_delay=settings.RECONNECT_MAX_DELAY)
+    await mqtt_recorder.connect_retry()
+
+    subscription = await mqtt_recorder.subscribe(topic_filters, maxsize=RECORD_QUEUE_SIZE)
+    settings.LOGGER.info("Recording topics %s into %s", topic_filters, file_name)
+
+    with TraceWriter(file_name) as trace_writer:
+        start_ns = time.monotonic_ns()
+        next_flush = time.monotonic() + FLUSH_INTERVAL
+        end_time = time.monotonic() + record_seconds if record_seconds > 0 else None
+        try:
+            while end_time is None or time.monotonic() < end_time:
+                timeout = FLUSH_INTERVAL
+                if end_time is not None:
+                    timeout = min(timeout, end_time - time.monotonic())
+                try:
+                    message = await asyncio.wait_for(subscription.get(), max(timeout, 0.0))
+                except asyncio.TimeoutError:
+                    message = None
+
+                if message is not None and not message.topic.startswith(CONTROL_TOPIC_PREFIX):
+                    # paho stamps messages with monotonic receive time,
+                    # waiting in the queue doesn't distort the recorded timing
+                    receive_ns = int(message.timestamp * 1e9)
+                    trace_writer.write_message(max(receive_ns - start_ns, 0),
+                                               message.topic, message.payload)
+
+                if time.monotonic() >= next_flush:
+                    next_flush += FLUSH_INTERVAL
+                    trace_writer.flush()
+                    settings.LOGGER.info("Recorded %s messages of %s topics, %s dropped",
+                                         trace_writer.messages,
+                                         trace_writer.topics_amount,
+                                         subscription.dropped)
+        finally:
+            settings.LOGGER.info("Recording finished: %s messages of %s topics",
+                                 trace_writer.messages, trace_writer.topics_amount)
+            await mqtt_recorder.disconnect()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(record_trace(settings.RECORD_FILE,
+                                 settings.RECORD_TOPICS,
+                                 settings.RECORD_SECONDS))
+    except KeyboardInterrupt:
+        settings.LOGGER.info("Recording interrupted")
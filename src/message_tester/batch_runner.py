@@ -0,0 +1,178 @@
+"""
+Batch mode of the message tester: several traces in one tester process.
+
+The topics of all traces are added to one MessageTestApp, so the tester
+connects and subscribes only once. Traces run back to back; with
+BATCH_PARALLEL traces without common topics are grouped and run at the same
+time (every trace needs its own player with `PLAYER_TRACE_NAME` of the
+trace, the player ignores start commands of other traces). Every trace gets its own
+report `test-result-<trace>.csv`, the batch a summary `test-summary.csv`.
+"""
+
+import csv
+import glob
+import os
+import time
+import settings
+
+
+INPUT_DIR = "./input_json_files"
+INPUT_PREFIX = "input_file_"
+SUMMARY_FILE = "output_csv_files/test-summary.csv"
+
+# period in seconds to check the timeout of a running trace group
+TIMEOUT_CHECK_PERIOD = 1.0
+
+
+class BatchTrace:
+    """
+    Trace of a batch with the ids of its topics in the tester.
+    """
+    __slots__ = ("name", "trace_length", "topic_ids", "expected_rates")
+
+    def __init__(self, name, trace_length):
+        """
+        Args:
+            name (str): trace name, e.g. trace-01
+            trace_length (float): length of the trace in seconds
+        """
+        self.name = name
+        self.trace_length = trace_length
+        self.topic_ids = []
+        # expected messages per second by position in topic_ids
+        self.expected_rates = []
+
+    def add_topic(self, topic_id, expected_rate):
+        """ Add topic of the trace, a topic listed twice is kept once """
+        if topic_id not in self.topic_ids:
+            self.topic_ids.append(topic_id)
+            self.expected_rates.append(expected_rate)
+
+
+def find_batch_traces(patterns):
+    """
+    Find input files of batch traces in INPUT_DIR.
+
+    Args:
+        patterns (list): trace names or glob patterns of trace names, e.g. `trace-*`
+
+    Returns:
+        traces (list): (trace name, input file name) sorted by name per pattern,
+                       every trace listed once
+    """
+    traces = []
+    for pattern in patterns:
+        file_names = sorted(glob.glob(os.path.join(INPUT_DIR, f"{INPUT_PREFIX}{pattern}.json")))
+        if not file_names:
+            settings.LOGGER.info("No input file found for batch trace %s", pattern)
+        for file_name in file_names:
+            trace_name = os.path.basename(file_name)[len(INPUT_PREFIX):-len(".json")]
+            if trace_name not in (name for name, _ in traces):
+                traces.append((trace_name, file_name))
+    return traces
+
+
+def plan_batch_groups(batch_traces, parallel):
+    """
+    Group traces which run at the same time.
+
+    Args:
+        batch_traces (list): BatchTrace of all traces in batch order
+        parallel (bool): group traces without common topics
+
+    Returns:
+        groups (list): lists of BatchTrace, run one group after another
+    """
+    if not parallel:
+        return [[batch_trace] for batch_trace in batch_traces]
+
+    groups = []
+    for batch_trace in batch_traces:
+        topic_ids = set(batch_trace.topic_ids)
+        for group, group_topic_ids in groups:
+            if topic_ids.isdisjoint(group_topic_ids):
+                group.append(batch_trace)
+                group_topic_ids.update(topic_ids)
+                break
+        else:
+            groups.append(([batch_trace], topic_ids))
+    return [group for group, _ in groups]
+
+
+async def run_batch(signal_tester, batch_traces, speed, fanout):
+    """
+    Run all traces of the batch over the connection of the tester and
+    create the reports. The tester must be connected and subscribed.
+
+    Args:
+        signal_tester (MessageTestApp): tester with topics of all traces added
+        batch_traces (list): BatchTrace of all traces in batch order
+        speed (float): speed of the traces requested from the players
+        fanout (int): number of copies of every topic (load mode)
+
+    Returns:
+        summaries (list): summary of every trace in batch order
+    """
+    groups = plan_batch_groups(batch_traces, settings.BATCH_PARALLEL)
+    settings.LOGGER.info("Batch of %s traces in %s runs: %s", len(batch_traces), len(groups),
+                         [[batch_trace.name for batch_trace in group] for group in groups])
+    batch_start = time.monotonic()
+    summaries = {}
+
+    for group in groups:
+        expected_rates = [0.0] * len(signal_tester._mqtt_topics)
+        for batch_trace in group:
+            for topic_id, expected_rate in zip(batch_trace.topic_ids,
+                                               batch_trace.expected_rates):
+                expected_rates[topic_id] = expected_rate
+
+        group_start = time.monotonic()
+        await signal_tester.start_test([batch_trace.name for batch_trace in group],
+                                       speed, fanout, expected_rates,
+                                       [topic_id for batch_trace in group
+                                        for topic_id in batch_trace.topic_ids])
+
+        # traces whose player doesn't report the end are stopped after the timeout
+        timeout = max(batch_trace.trace_length for batch_trace in group) / speed \
+                  + settings.TRACE_TIMEOUT_MARGIN
+        completed = True
+        while not await signal_tester.wait_test_completed(TIMEOUT_CHECK_PERIOD):
+            if time.monotonic() - group_start > timeout:
+                settings.LOGGER.info("No end of trace reported within %s s", round(timeout, 1))
+                completed = False
+                break
+            # early stop at coverage and adaptive speed
+            await signal_tester.supervise_test()
+        await signal_tester.stop_test()
+        duration = round(time.monotonic() - group_start, 1)
+
+        for batch_trace in group:
+            summary = signal_tester.create_test_report(batch_trace.name, batch_trace.topic_ids)
+            summary['completed'] = completed
+            summary['duration_s'] = duration
+            summaries[batch_trace.name] = summary
+
+    settings.LOGGER.info("Batch of %s traces completed in %s s",
+                         len(batch_traces), round(time.monotonic() - batch_start, 1))
+    return [summaries[batch_trace.name] for batch_trace in batch_traces]
+
+
+def write_batch_summary(summaries, file_name=SUMMARY_FILE):
+    """
+    Write one summary line per trace of the batch.
+
+    Args:
+        summaries (list): summaries returned by `run_batch`
+        file_name (str): output CSV file
+    """
+    header = ['trace', 'completed', 'duration_s', 'topics', 'tested', 'coverage_pct',
+              'off_rate', 'nonconforming', 'received', 'lost', 'duplicated', 'out_of_order',
+              'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms', 'latency_max_ms',
+              'reconnects', 'outage_s']
+    with open(file_name, "w", newline='') as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=header, restval='',
+                                extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(summaries)
+    settings.LOGGER.info("Batch summary written to %s", file_name)
+
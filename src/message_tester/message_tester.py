@@ -3,12 +3,28 @@ This script automatically tests availabilty of all mqtt messages in a trace from
 List of mqtt topics & messages is given in input JSON file.
 JSON input files should be located in folder `input_json_files`.
 """
+import asyncio
 import csv
+import math
 import time
 import json
+import zlib
+from array import array
 from enum import Enum
 import settings
-from mqtt_client import MqttClient
+from mqtt_common import AsyncMqttClient, MqttConnectError, TraceDefinitionError, \
+                        TraceFormatError, TraceReader, read_stamp, read_trace_definition, \
+                        read_trace_time, stamp_clock, strip_generators
+from mqtt_common.logs import LogSummary, RateLimitedLog
+from mqtt_common.metrics import SAMPLE_MASK, Histogram, MetricsRegistry, \
+                                counter, gauge, histogram, serve_metrics
+from topic_stats import DeliveryStats, LatencyHistogram, RateStats
+from topic_index import TopicIndex, TopicTrie, load_topic_name
+from payload_validator import compile_validator, schema_validator
+from payload_fingerprint import PayloadFingerprints
+from subscriber_pool import SubscriberPool
+from batch_runner import BatchTrace, find_batch_traces, run_batch, write_batch_summary
+from speed_control import AdaptiveSpeed
 
 # specify in `.env` the trace number to test.
 # This constant defines name for input json file (trace-01.json)
@@ -17,31 +33,42 @@ TRACE_NAME = settings.TRACE_NAME
 
 TOPIC_PLAYER_START = "signalPlayer/start"
 TOPIC_PLAYER_STOP = "signalPlayer/stop"
+TOPIC_PLAYER_STATUS = "signalPlayer/status"
+TOPIC_PLAYER_SPEED = "signalPlayer/speed"
+TOPIC_PLAYER_QUERY = "signalPlayer/query"
+# retained status of all players, players of batch traces add the trace name
+TOPIC_PLAYER_STATUS_FILTER = TOPIC_PLAYER_STATUS + "/#"
+# status published by the broker when a player is gone
+PLAYER_OFFLINE = "offline"
+
+# playback mode of the player with trace time stamped in messages
+PLAYBACK_VIRTUAL = "virtual"
+
+CLIENT_ID = "IoT_signal_tester"
+# group of MQTTv5 shared subscriptions of subscriber workers
+SHARED_SUBSCRIPTION_GROUP = "IoT_signal_tester"
+
+# period in seconds to query and log player status while the test is running
+STATUS_LOG_PERIOD = 1.0
+# without acknowledged start, status messages received shortly after test start
+# can still describe the previous trace run and are not used to detect trace end
+STATUS_SETTLE_TIME = 1.0
+
+# maximum time in seconds to wait for the first player status before a test,
+# for the response of a player to a command and for players to report
+# `stopped` after the stop command
+PLAYER_READY_TIMEOUT = 10.0
+PLAYER_ACK_TIMEOUT = 2.0
+PLAYER_STOP_TIMEOUT = 2.0
+
+# adaptive speed doesn't raise the speed above this share of the subscription
+# queue size filled or with player publish lag above ADAPTIVE_MAX_LAG
+ADAPTIVE_MAX_QUEUE_FILL = 0.1
+
+# maximum number of topics in one SUBSCRIBE packet
+SUBSCRIBE_BATCH_SIZE = 500
 
 
-class SimpleTimer:
-    """
-    implement a simple timer with polling.
-    set timeout in second
-    """
-    def __init__(self, timeout):
-        assert timeout > 0.0
-        self.timeout = timeout
-        self.start_timer = time.time()
-
-    def is_time_elapsed(self):
-        """
-        Return True if timeout is reached, False otherwise.
-        """
-        diff_time = time.time() - self.start_timer
-        return diff_time >= self.timeout
-
-    def is_time_remaining(self):
-        """
-        Return True if timeout is not reached, False otherwise.
-        """
-        return not self.is_time_elapsed()
-
 class SequenceStatus(Enum):
     """ Enum for test sequencer status """
     IDLE = 0
@@ -56,7 +83,13 @@ class MessageTestApp:
     Class for test of all mqtt topics in a trace, 
     where list of topics is given in an input JSON file
     """
-    def __init__(self):
+    def __init__(self, client_id=CLIENT_ID, subscribe_status=True):
+        """
+        Args:
+            client_id (str): mqtt client id
+            subscribe_status (bool): subscribe to player status,
+                                     False in subscriber worker processes
+        """
 
         # allow subscription to mqtt topics
         self.__allow_mqtt_topic = True
@@ -64,27 +97,364 @@ class MessageTestApp:
         # received mqtt message counter
         self.__mqtt_message_counter = 0
 
-        # topic lists read out from input json file
-        self._mqtt_topics = []
+        # index of topics read out from input json file
+        self._mqtt_topics = TopicIndex()
 
-        # list with found mqtt topics
-        self._mqtt_topics_tested = []
+        # tested flag of each topic, indexed by topic id
+        self._topics_tested = bytearray()
+        # number of found mqtt topics
+        self._tested_count = 0
 
         self._subscription_list = []
 
+        # latency, loss and reordering statistics indexed by topic id
+        self._delivery_stats = []
+
+        # compiled payload validator and number of invalid payloads by topic id
+        self._validators = []
+        self._invalid_counts = array("I")
+
+        # expected payload fingerprints (None without conformance check),
+        # conforming and non-conforming payloads and first non-conforming
+        # payload by topic id; expected results of a TRACE_FILE are only samples
+        self._fingerprints = PayloadFingerprints() \
+            if settings.PAYLOAD_CONFORMANCE and not settings.TRACE_FILE else None
+        self._conforming_counts = array("Q")
+        self._nonconforming_counts = array("Q")
+        self._nonconforming_samples = []
+
+        # expected messages per second (at speed 1.0) by topic id
+        self._expected_rates = []
+        # received count, rate and inter-arrival gaps by topic id
+        self._rate_stats = RateStats([])
+
         self._test_started = False
 
-        # init mqtt client
-        while True:
+        # last player status (trace_status, trace_time_remained, trace_time_elapsed)
+        self._player_status = (None, None, None)
+        # set by status callback when end of trace is reported by player
+        # (by the players of all running traces in batch mode)
+        self._test_completed = asyncio.Event()
+        # names of traces started by the running test and of completed ones
+        self._running_traces = set()
+        self._completed_traces = set()
+        # last status and publish lag of the players by trace name (None for
+        # players without trace name), set on every received player status
+        self._player_states = {}
+        self._player_lags = {}
+        # run number of the acknowledged start by trace name of the player,
+        # only status of this run can report the end of the trace
+        self._started_runs = {}
+        # (reconnects, outage seconds) since start of the players by trace name
+        # and of players and tester at the start of the test
+        self._player_outages = {}
+        self._player_outages_start = {}
+        self._tester_outage_start = (0, 0.0)
+        self._status_received = asyncio.Event()
+        # number of topics of the running test and tested topics to stop early
+        self._test_topics_amount = 0
+        self._stop_tested_count = math.inf
+        self._adaptive_speed = None
+        self._speed = 1.0
+        self._dropped_total = 0
+        # tested flags shared with the main process (in subscriber workers)
+        self.shared_tested = None
+        self._test_start_time = 0.0
+
+        # worker processes with own subscriber connections (TESTER_WORKERS > 1)
+        self.subscriber_pool = None
+
+        self._client_id = client_id
+        self._subscribe_status = subscribe_status
+        self._stamp_clock_ns = stamp_clock(settings.LATENCY_CLOCK)
+        # topic rates from trace time stamps instead of receive times
+        self._virtual_clock = settings.PLAYBACK_MODE == PLAYBACK_VIRTUAL
+        # per-message log lines are summarized or rate limited
+        self._unhandled_log = LogSummary(settings.LOGGER, "Unhandled topics received",
+                                         settings.LOG_SUMMARY_INTERVAL)
+        self._tested_log = RateLimitedLog(settings.LOGGER, settings.LOG_RATE_LIMIT,
+                                          settings.LOG_SUMMARY_INTERVAL)
+        # mqtt subscriptions and tasks consuming their queues
+        self._subscriptions = []
+        self._receive_tasks = []
+        self.mqtt_client = None
+
+        # messages passed to user_callback since process start
+        self._received_total = 0
+        # duration of sampled user_callback calls in seconds
+        self._callback_duration = Histogram()
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self.collect_metrics)
+
+
+    async def connect(self):
+        """ Connect to MQTT broker (retry until connected) and
+        subscribe to player status """
+        self.mqtt_client = AsyncMqttClient(self._client_id,
+                                           settings.MQTT_HOST,
+                                           settings.MQTT_PORT,
+                                           settings.MQTT_BROKER_USER,
+                                           settings.MQTT_BROKER_PASSWORD,
+                                           session_expiry=settings.MQTT_SESSION_EXPIRY,
+                                           reconnect_delay=settings.RECONNECT_DELAY,
+                                           max_reconnect_delay=settings.RECONNECT_MAX_DELAY)
+        await self.mqtt_client.connect_retry()
+
+        if self._subscribe_status:
+            subscription = await self.mqtt_client.subscribe(TOPIC_PLAYER_STATUS_FILTER)
+            self._receive_tasks.append(asyncio.create_task(
+                self._receive_messages(subscription, self.status_callback)))
+
+
+    async def close(self):
+        """ Stop receiving messages and disconnect from MQTT broker """
+        for task in self._receive_tasks:
+            task.cancel()
+        self._receive_tasks = []
+        if self.mqtt_client is not None:
+            await self.mqtt_client.disconnect()
+
+
+    @staticmethod
+    async def _receive_messages(subscription, callback):
+        """ Pass every message of a subscription to the callback """
+        async for message in subscription:
+            callback(None, None, message)
+
+
+    def status_callback(self, client, userdata, message):
+        """Callback of player status messages, executed in the event loop.
+        Args:
+            client: mqtt client instance
+            userdata: user defined data of any type
+            message: received mqtt message
+        """
+        try:
+            status = json.loads(message.payload)
+        except ValueError as err:
+            settings.LOGGER.info("Invalid player status received: %s", err)
+            return
+        self.update_player_status(status)
+
+
+    def update_player_status(self, status):
+        """Store player status and signal end of trace to the test sequence.
+        Args:
+            status (dict): player status of a status message or command response
+        """
+        try:
+            trace_status = status["status"]
+            # trace of the player, players without trace name report for all traces
+            trace_name = status.get("trace_name")
+            if trace_status == PLAYER_OFFLINE:
+                settings.LOGGER.info("Trace Player %s offline", trace_name or "")
+                self._player_status = (trace_status, None, None)
+                self._player_states[trace_name] = trace_status
+                self._status_received.set()
+                return
+            run = status.get("run")
+            trace_time_elapsed = status["time_elapsed"]
+            trace_time_remained = status["trace_length"] - trace_time_elapsed
+            # completed trace runs, with high speed the end of trace
+            # may fall between two status messages
+            trace_runs = status.get("trace_runs", 0)
+            max_lag = float(status.get("max_lag", 0.0))
+            outage = (int(status.get("reconnects", 0)),
+                      float(status.get("outage_seconds", 0.0)))
+        except (ValueError, KeyError, TypeError) as err:
+            settings.LOGGER.info("Invalid player status received: %s", err)
+            return
+
+        self._player_status = (trace_status, trace_time_remained, trace_time_elapsed)
+        self._player_states[trace_name] = trace_status
+        self._player_lags[trace_name] = max_lag
+        self._player_outages[trace_name] = outage
+        self._status_received.set()
+
+        started_run = self._started_runs.get(trace_name)
+        if started_run is not None:
+            current_run = run == started_run
+        else:
+            current_run = time.monotonic() - self._test_start_time >= STATUS_SETTLE_TIME
+        if self._test_started is True and current_run \
+            and (trace_time_remained < 1.0 or trace_runs > 0):
+            if trace_name is None or None in self._running_traces:
+                self._completed_traces.update(self._running_traces)
+            elif trace_name in self._running_traces:
+                self._completed_traces.add(trace_name)
+            if self._completed_traces >= self._running_traces:
+                self._test_completed.set()
+
+
+    async def wait_player(self, condition, timeout):
+        """ Wait until a condition on the player status is met,
+        checked on every received player status
+
+        Args:
+            condition (callable): function returning True when met
+            timeout (float): maximum time to wait in [sec.]
+
+        Returns:
+            True if the condition is met, False on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while not condition():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0.0:
+                return False
+            self._status_received.clear()
             try:
-                settings.LOGGER.info("Connecting to MQTT broker...")
-                self.mqtt_client = MqttClient("IoT_signal_tester",
-                                            broker=settings.MQTT_HOST,
-                                            port=settings.MQTT_PORT)
-            except Exception as err:
-                settings.LOGGER.info("Connection to MQTT broker failed: %s", err)
+                await asyncio.wait_for(self._status_received.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+    async def request_player(self, topic, command):
+        """ Send command as MQTTv5 request to the players, the status of
+        the response is stored like a received status
+
+        Args:
+            topic (str): control topic of the player
+            command (dict): command sent as JSON
+
+        Returns:
+            response (dict): {"ack": bool, "status": dict} or None without response
+        """
+        try:
+            payload = await self.mqtt_client.request(topic, json.dumps(command),
+                                                     PLAYER_ACK_TIMEOUT, qos=settings.MQTT_QOS)
+            response = json.loads(payload)
+            status = response["status"]
+        except asyncio.TimeoutError:
+            settings.LOGGER.info("No response of Trace Player to %s within %s s",
+                                 topic, PLAYER_ACK_TIMEOUT)
+            return None
+        except MqttConnectError as err:
+            settings.LOGGER.info("Command %s not sent: %s", topic, err)
+            return None
+        except (ValueError, KeyError, TypeError) as err:
+            settings.LOGGER.info("Invalid response of Trace Player to %s: %s", topic, err)
+            return None
+        self.update_player_status(status)
+        return response
+
+
+    async def query_player_status(self):
+        """ Request the current status of the players of the running traces """
+        await asyncio.gather(*(self.request_player(TOPIC_PLAYER_QUERY, {"trace_name": trace_name})
+                               for trace_name in self._running_traces))
+
+
+    def player_ready(self):
+        """ True if a player status other than `offline` was received """
+        return any(state != PLAYER_OFFLINE for state in self._player_states.values())
+
+
+    def players_stopped(self):
+        """ True if the players of the running traces report `stopped` (or are offline) """
+        states = self._player_states
+        stopped = ("stopped", PLAYER_OFFLINE)
+        if None in self._running_traces or None in states:
+            return bool(states) and all(state in stopped for state in states.values())
+        return all(states.get(trace_name) in stopped for trace_name in self._running_traces)
+
+
+    @property
+    def tested_count(self):
+        """ Number of tested topics, tested by subscriber workers with a pool """
+        if self.subscriber_pool is not None:
+            return self.subscriber_pool.tested_count
+        return self._tested_count
+
+
+    def subscription_load(self):
+        """ Messages dropped by the subscription queues and length of the longest
+        queue, of all subscriber workers with a pool """
+        if self.subscriber_pool is not None:
+            return self.subscriber_pool.subscription_load()
+        return (sum(subscription.dropped for subscription in self._subscriptions),
+                max((subscription.qsize() for subscription in self._subscriptions), default=0))
+
+
+    def coverage_reached(self):
+        """ True if the share of tested topics reached STOP_COVERAGE """
+        return self.tested_count >= self._stop_tested_count
+
+
+    async def supervise_test(self):
+        """ Periodic check of the running test: stop it when the coverage
+        is reached and raise the speed in adaptive speed mode """
+        if self.coverage_reached():
+            settings.LOGGER.info("Coverage of %s %% reached", settings.STOP_COVERAGE)
+            self._test_completed.set()
+            return
+        # current publish lag and trace time of the players
+        await self.query_player_status()
+        if self._adaptive_speed is None:
+            return
+
+        dropped_total, longest_queue = self.subscription_load()
+        keeping_up = dropped_total == self._dropped_total \
+            and longest_queue < settings.SUBSCRIPTION_QUEUE_SIZE * ADAPTIVE_MAX_QUEUE_FILL \
+            and max(self._player_lags.values(), default=0.0) < settings.ADAPTIVE_MAX_LAG
+        self._dropped_total = dropped_total
+        speed = self._adaptive_speed.update(time.monotonic(), self.tested_count,
+                                            self._test_topics_amount, keeping_up)
+        if speed is None:
+            return
+        # the speed of the test only changes when the player acknowledged it
+        response = await self.request_player(TOPIC_PLAYER_SPEED, {"speed": speed})
+        if response is not None and response.get("ack"):
+            self._adaptive_speed.set_speed(speed, time.monotonic())
+            settings.LOGGER.info("Coverage rises slowly, trace speed raised to %s", speed)
+        elif response is None:
+            settings.LOGGER.info("Speed change to %s not acknowledged by Trace Player", speed)
+        else:
+            settings.LOGGER.info("Speed change to %s rejected by Trace Player", speed)
+
+
+    async def wait_test_completed(self, timeout):
+        """ Wait until player reports end of trace or timeout expires
+
+        Args:
+            timeout (float): maximum time to wait in [sec.]
+
+        Returns:
+            True if trace end was reported, False on timeout
+        """
+        try:
+            await asyncio.wait_for(self._test_completed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+    def add_topic(self, topic, expected_result=None, expected_rate=0.0):
+        """Add topic to the test and compile validator of its payload.
+        Args:
+            topic (str): mqtt topic
+            expected_result (list): expected payload (`result` in input JSON file),
+                                    if None only non-empty `schema` is checked
+            expected_rate (float): expected messages per second, 0.0 if unknown
+
+        Returns:
+            topic_id (int): id of the topic, a topic added before keeps
+                            its first expected result and rate
+        """
+        topic_id = self._mqtt_topics.add(topic)
+        if topic_id == len(self._validators):
+            self._expected_rates.append(expected_rate)
+            generated = False
+            if expected_result is None:
+                self._validators.append(schema_validator)
             else:
-                break
+                # generated signal values are checked by structure only
+                expected_result, generated = strip_generators(expected_result)
+                self._validators.append(compile_validator(expected_result))
+            if self._fingerprints is not None:
+                self._fingerprints.add_topic(None if generated else expected_result)
+        return topic_id
 
 
     def user_callback(self, client, userdata, message):
@@ -95,45 +465,176 @@ class MessageTestApp:
             message: received mqtt message
         """
 
-        if message.topic in self._mqtt_topics and self.__allow_mqtt_topic is True:
-            self.__handle_mqtt_topic(message.topic,json.loads(message.payload))
+        receive_time_ns = self._stamp_clock_ns()
+        self._received_total += 1
+
+        if self._received_total & SAMPLE_MASK:
+            self.__receive_message(message, receive_time_ns)
+        else:
+            call_start = time.perf_counter()
+            self.__receive_message(message, receive_time_ns)
+            self._callback_duration.observe(time.perf_counter() - call_start)
+
+
+    def __receive_message(self, message, receive_time_ns):
+        """Look up topic id of a received message and handle it during the test.
+        Args:
+            message: received mqtt message
+            receive_time_ns (int): receive timestamp in [ns]
+        """
+        topic_id = self._mqtt_topics.get_id(message.topic)
+
+        if topic_id is not None and self.__allow_mqtt_topic is True:
+            sequence, send_time_ns = read_stamp(message)
+            latency_us = None
+            if send_time_ns is not None:
+                latency_us = (receive_time_ns - send_time_ns) / 1000.0
+            rate_time_ns = receive_time_ns
+            if self._virtual_clock:
+                trace_time_ns = read_trace_time(message)
+                if trace_time_ns is not None:
+                    rate_time_ns = trace_time_ns
+            self.__handle_mqtt_topic(topic_id, message.payload,
+                                     sequence, latency_us, rate_time_ns)
         else:
             # topic not allowed in MessageTestApp
-            if not (self.__allow_mqtt_topic is False and topic in self._mqtt_topics):
-                settings.LOGGER.info("Received unhandled topic %s", message.topic)
+            if not (self.__allow_mqtt_topic is False and topic_id is not None):
+                self._unhandled_log.count(message.topic)
 
 
-    def __handle_mqtt_topic(self, topic, json_payload):
-        """Extract desired values from mqtt message and logger output
+    def __handle_mqtt_topic(self, topic_id, payload, sequence=None, latency_us=None,
+                            receive_time_ns=0):
+        """Extract desired values from mqtt message and logger output.
+        Payload is decoded and validated only until the topic is tested,
+        afterwards only every VALIDATION_SAMPLE_EVERY-th message (if enabled).
 
         Args:
-            topic (str): Topic name
-            json_payload (dict): json mqtt payload
+            topic_id (int): Topic id in topic index
+            payload (bytes): raw mqtt payload
+            sequence (int): sequence number stamped by player or None
+            latency_us (float): latency from player to tester in [us] or None
+            receive_time_ns (int): receive timestamp in [ns], trace time
+                                   on the virtual clock
         Returns:
         """
 
         if self._test_started is True:
             self.__mqtt_message_counter += 1
-            # check if topic already appeared before
-            if topic not in self._mqtt_topics_tested:
-                # field in payload should exist
-                if len(json_payload[0]["schema"]) > 0:
-                    self._mqtt_topics_tested.append(topic)
-                    settings.LOGGER.info("New MQTT topic received : \
-                                            %s MQTT | payload: %s",
-                                         topic,
-                                         json_payload[0]["schema"],
-                                         )
-
-
-    def create_test_report(self):
+            self._rate_stats.record(topic_id, receive_time_ns)
+            delivery_stats = self._delivery_stats[topic_id]
+            delivery_stats.record(sequence, latency_us)
+
+            # byte level conformance, decoded only if the raw payload differs
+            conforms = None
+            if self._fingerprints is not None:
+                conforms = self._fingerprints.match(topic_id, payload)
+                if conforms:
+                    self._conforming_counts[topic_id] += 1
+                elif conforms is False:
+                    self._nonconforming_counts[topic_id] += 1
+                    if self._nonconforming_samples[topic_id] is None:
+                        self._nonconforming_samples[topic_id] = payload
+
+            # fast path, topic already appeared before
+            if self._topics_tested[topic_id]:
+                if conforms or settings.VALIDATION_SAMPLE_EVERY <= 0 or \
+                    delivery_stats.received % settings.VALIDATION_SAMPLE_EVERY != 0:
+                    return
+
+            if conforms:
+                # payload defined in the trace has the expected structure
+                payload_valid = True
+            else:
+                try:
+                    payload_valid = self._validators[topic_id](json.loads(payload))
+                except ValueError:
+                    payload_valid = False
+
+            if not payload_valid:
+                self._invalid_counts[topic_id] += 1
+            elif not self._topics_tested[topic_id]:
+                self._topics_tested[topic_id] = 1
+                self._tested_count += 1
+                if self.shared_tested is not None:
+                    self.shared_tested[topic_id] = 1
+                if self._tested_count >= self._stop_tested_count:
+                    # early stop, report without waiting for the end of the trace
+                    self._test_completed.set()
+                if settings.LOG_PAYLOADS:
+                    self._tested_log.info("New MQTT topic received : %s MQTT | payload: %s",
+                                          self._mqtt_topics.names[topic_id], payload)
+                else:
+                    self._tested_log.info("New MQTT topic received : %s MQTT",
+                                          self._mqtt_topics.names[topic_id])
+
+
+    def collect_metrics(self):
+        """
+        Return metrics of the tester, read when metrics are scraped or published.
+        With subscriber workers only messages of this process are counted.
+        """
+        topic_received = counter("tester_topic_received",
+                                 "Messages received per topic since test start")
+        for topic, delivery_stats in zip(self._mqtt_topics, self._delivery_stats):
+            topic_received.add_sample(delivery_stats.received, {"topic": topic})
+
+        coverage = self._tested_count / len(self._mqtt_topics) if self._mqtt_topics else 0.0
+        families = [counter("tester_messages_received", "Messages received by the tester",
+                            self._received_total),
+                    topic_received,
+                    histogram("tester_callback_duration_seconds",
+                              "Duration of sampled user_callback calls",
+                              self._callback_duration),
+                    gauge("tester_topics_tested", "Topics with a valid payload received",
+                          self._tested_count),
+                    gauge("tester_coverage_ratio", "Share of tested topics",
+                          coverage),
+                    gauge("tester_subscription_queued_messages",
+                          "Received messages waiting in subscription queues",
+                          sum(subscription.qsize() for subscription in self._subscriptions)),
+                    counter("tester_subscription_dropped",
+                            "Received messages dropped because of full subscription queues",
+                            sum(subscription.dropped for subscription in self._subscriptions))]
+        if self.mqtt_client is not None:
+            families.append(gauge("tester_mqtt_inflight_messages",
+                                  "QoS 1/2 messages waiting for acknowledge",
+                                  self.mqtt_client.inflight_messages))
+        return families
+
+
+    def create_test_report(self, trace_name=TRACE_NAME, topic_ids=None):
         """ 
         Create final test report with statistics 
         how many topics were found during whole trace run
+
+            Args:
+            trace_name (str): name of the trace in the report file name
+            topic_ids (list): ids of the topics of the trace, None for all topics
+
+            Returns:
+            summary (dict): topic counts, coverage and delivery statistics of the trace
         """
-        if len(self._mqtt_topics_tested) > 0:
+        if topic_ids is None:
+            topic_ids = range(len(self._mqtt_topics))
+        tested_count = sum(self._topics_tested[topic_id] for topic_id in topic_ids)
+        coverage = round(100.0 * tested_count / len(topic_ids), 1) if topic_ids else 0.0
+        summary = {'trace': trace_name,
+                   'topics': len(topic_ids),
+                   'tested': tested_count,
+                   'coverage_pct': coverage,
+                   'off_rate': 0,
+                   'nonconforming': 0,
+                   'reconnects': 0,
+                   'outage_s': 0.0}
+        delivery_summary = self.__delivery_summary(topic_ids)
+        summary.update(delivery_summary)
+
+        if tested_count > 0:
 
             topics_not_found = []
+            topics_off_rate = []
+            # (topic, count, diff of first payload) of topics with non-conforming payloads
+            topics_nonconforming = []
 
             settings.LOGGER.info("=" * 40)
             settings.LOGGER.info("*" * 10 + " Creating Report " + "*" * 10)
@@ -141,87 +642,315 @@ class MessageTestApp:
 
             settings.LOGGER.info(" Number of MQTT topics found: %s \n \
                                  Total number of MQTT topics in JSON file %s",
-                                 len(self._mqtt_topics_tested),
-                                 len(self._mqtt_topics))
+                                 tested_count,
+                                 len(topic_ids))
 
-            settings.LOGGER.info(" Test coverage: %s %%",
-                                 round((100.0 *
-                                        len(self._mqtt_topics_tested)
-                                        /
-                                        len(self._mqtt_topics)),1))
+            settings.LOGGER.info(" Test coverage: %s %%", coverage)
 
             with open("output_csv_files/test-result-"
-                      + TRACE_NAME +
+                      + trace_name +
                       ".csv", "w", newline = '') as result_file:
-                header = ['topic', 'payload_type', 'status']
+                header = ['topic', 'payload_type', 'status',
+                          'invalid', 'conforming', 'nonconforming', 'payload_diff',
+                          'received', 'lost', 'duplicated', 'out_of_order',
+                          'latency_p50_ms', 'latency_p95_ms',
+                          'latency_p99_ms', 'latency_max_ms',
+                          'expected_rate_hz', 'observed_rate_hz',
+                          'gap_mean_ms', 'gap_stddev_ms', 'gap_max_ms',
+                          'rate_status']
                 writer = csv.DictWriter(result_file, fieldnames = header)
                 writer.writeheader()
 
                 # iterate all MQTT topics and
                 # check if topic exists in list with found topics
-                for topic in range(0, len(self._mqtt_topics)):
-                    if self._mqtt_topics[topic] in self._mqtt_topics_tested:
+                for topic_id in topic_ids:
+                    topic = self._mqtt_topics.names[topic_id]
+                    if self._topics_tested[topic_id]:
                         topic_status = 'OK'
                     else:
                         topic_status = 'NOK'
-                        topics_not_found.append(self._mqtt_topics[topic])
-
-                    writer.writerow({'topic':self._mqtt_topics[topic],
-                                     'payload_type':'json',
-                                     'status': topic_status })
+                        topics_not_found.append(topic)
+
+                    row = {'topic':topic,
+                           'payload_type':'json',
+                           'status': topic_status,
+                           'invalid': self._invalid_counts[topic_id] }
+                    row.update(self.__conformance_row(topic_id))
+                    if row['nonconforming']:
+                        topics_nonconforming.append((topic, row['nonconforming'],
+                                                     row['payload_diff']))
+                    row.update(self.__delivery_stats_row(self._delivery_stats[topic_id]))
+                    row.update(self.__rate_stats_row(topic_id))
+                    writer.writerow(row)
+                    if row['rate_status'] in ('UNDER_RATE', 'OVER_RATE'):
+                        topics_off_rate.append((topic, row['rate_status']))
 
                 result_file.write("\n\nNumber of MQTT topics found: {} \
                                   || Total number of MQTT topics in JSON file {}".
                                     format(
-                                 len(self._mqtt_topics_tested),
-                                 len(self._mqtt_topics))
+                                 tested_count,
+                                 len(topic_ids))
                                     )
 
-                result_file.write("\nTest coverage: {} %".format(
-                                  round((100.0 * len(self._mqtt_topics_tested)
-                                         /
-                                         len(self._mqtt_topics)),1)))
+                result_file.write("\nTest coverage: {} %".format(coverage))
                 result_file.write("\n\nTopics which were not found: \n")
                 for topic in topics_not_found:
                     result_file.write(str(topic) + " \n")
 
+                result_file.write("\n\nTopics with rate deviation above {} %: \n".format(
+                                  round(100.0 * settings.RATE_TOLERANCE, 1)))
+                for topic, rate_status in topics_off_rate:
+                    result_file.write("{} {} \n".format(topic, rate_status))
+                settings.LOGGER.info(" Topics with rate deviation: %s", len(topics_off_rate))
+                summary['off_rate'] = len(topics_off_rate)
+
+                if self._fingerprints is not None:
+                    result_file.write("\n\nTopics with payloads not as defined in the trace: \n")
+                    for topic, nonconforming, payload_diff in topics_nonconforming:
+                        result_file.write("{} {} payloads, first: {} \n".format(
+                                          topic, nonconforming, payload_diff))
+                    settings.LOGGER.info(" Topics with non-conforming payloads: %s",
+                                         len(topics_nonconforming))
+                summary['nonconforming'] = len(topics_nonconforming)
+
+                result_file.write("\n\nDelivery statistics of all topics: \n")
+                for name, value in delivery_summary.items():
+                    result_file.write("{}: {} \n".format(name, value))
+
+                # lost connections appear as gaps of the topics, not as lost messages
+                player_outage, tester_outage = self.__connection_outages(trace_name)
+                result_file.write("\n\nConnection outages during the test: \n")
+                result_file.write("player: {} reconnects, {} s disconnected \n".format(
+                                  *player_outage))
+                result_file.write("tester: {} reconnects, {} s disconnected \n".format(
+                                  *tester_outage))
+                summary['reconnects'] = player_outage[0] + tester_outage[0]
+                summary['outage_s'] = round(player_outage[1] + tester_outage[1], 3)
+                if summary['reconnects']:
+                    settings.LOGGER.info(" Reconnects of player and tester: %s, %s s "
+                                         "disconnected", summary['reconnects'],
+                                         summary['outage_s'])
+
+        return summary
+
+
+    def __connection_outages(self, trace_name):
+        """
+        Return reconnects and outage seconds of player and tester since test start.
+
+        Args:
+            trace_name (str): name of the trace, players without trace
+                              name report for all traces
+
+        Returns:
+            outages (tuple): (reconnects, outage seconds) of player and tester
+        """
+        if trace_name not in self._player_outages:
+            trace_name = None
+        reconnects, outage_seconds = self._player_outages.get(trace_name, (0, 0.0))
+        start_reconnects, start_outage = self._player_outages_start.get(trace_name, (0, 0.0))
+        player_outage = (reconnects - start_reconnects,
+                         round(max(outage_seconds - start_outage, 0.0), 3))
+        start_reconnects, start_outage = self._tester_outage_start
+        tester_outage = (self.mqtt_client.reconnects - start_reconnects,
+                         round(self.mqtt_client.outage_seconds - start_outage, 3))
+        return player_outage, tester_outage
+
+
+    def __delivery_summary(self, topic_ids):
+        """
+        Aggregate delivery statistics of topics.
+
+        Args:
+            topic_ids (iterable): ids of the topics
+
+        Returns:
+            summary (dict): message counts and latency percentiles in [ms]
+        """
+        latency = LatencyHistogram()
+        summary = {'received': 0, 'lost': 0, 'duplicated': 0, 'out_of_order': 0}
+        for topic_id in topic_ids:
+            delivery_stats = self._delivery_stats[topic_id]
+            summary['received'] += delivery_stats.received
+            summary['lost'] += delivery_stats.lost
+            summary['duplicated'] += delivery_stats.duplicated
+            summary['out_of_order'] += delivery_stats.out_of_order
+            latency.merge(delivery_stats.latency)
+
+        summary.update(self.__latency_columns(latency))
+        settings.LOGGER.info(" Delivery statistics: %s", summary)
+        return summary
+
+
+    def __conformance_row(self, topic_id):
+        """
+        Return report columns with payload conformance of one topic,
+        empty without expected payload.
+        """
+        if self._fingerprints is None or not self._fingerprints.has_expected(topic_id):
+            return {'conforming': '', 'nonconforming': '', 'payload_diff': ''}
+        sample = self._nonconforming_samples[topic_id]
+        return {'conforming': self._conforming_counts[topic_id],
+                'nonconforming': self._nonconforming_counts[topic_id],
+                'payload_diff': '' if sample is None
+                                else self._fingerprints.diff(topic_id, sample)}
+
+
+    def __delivery_stats_row(self, delivery_stats):
+        """
+        Return report columns with delivery statistics of one topic.
+        """
+        row = {'received': delivery_stats.received,
+               'lost': delivery_stats.lost,
+               'duplicated': delivery_stats.duplicated,
+               'out_of_order': delivery_stats.out_of_order}
+        row.update(self.__latency_columns(delivery_stats.latency))
+        return row
+
+
+    def __rate_stats_row(self, topic_id):
+        """
+        Return report columns with rate and inter-arrival statistics of one topic.
+        """
+        rate_stats = self._rate_stats
+        observed_rate = rate_stats.observed_rate(topic_id)
+        gap_mean, gap_stddev, gap_max = rate_stats.gap_stats(topic_id)
+
+        def to_ms(value):
+            return '' if value is None else round(value * 1000.0, 3)
 
-    def start_test(self, trace_no, speed):
+        return {'expected_rate_hz': round(rate_stats.expected_rates[topic_id], 3),
+                'observed_rate_hz': '' if observed_rate is None else round(observed_rate, 3),
+                'gap_mean_ms': to_ms(gap_mean),
+                'gap_stddev_ms': to_ms(gap_stddev),
+                'gap_max_ms': to_ms(gap_max),
+                'rate_status': rate_stats.rate_status(topic_id, settings.RATE_TOLERANCE)}
+
+
+    @staticmethod
+    def __latency_columns(latency):
+        """
+        Return latency percentiles of a histogram in [ms] as report columns.
+        """
+        columns = {}
+        for name, percent in (('latency_p50_ms', 50),
+                              ('latency_p95_ms', 95),
+                              ('latency_p99_ms', 99),
+                              ('latency_max_ms', 100)):
+            value_us = latency.percentile(percent)
+            columns[name] = '' if value_us is None else round(value_us / 1000.0, 3)
+        return columns
+
+
+    async def subscribe_topics(self, worker_no=0, workers=1):
+        """
+        Subscribe to all mqtt topics from json file.
+
+        In `topic` subscription mode every topic is subscribed (in batches of
+        SUBSCRIBE_BATCH_SIZE topics per SUBSCRIBE packet), in `wildcard` mode
+        only a small set of wildcard filters computed from the topic list.
+        Every SUBSCRIBE batch gets its own bounded queue (SUBSCRIPTION_QUEUE_SIZE),
+        a task passes its messages to `user_callback`,
+        which looks up the topic id in the hash index.
+
+        With several subscriber workers, every worker subscribes the topics
+        of its hash partition (`topic` mode) or all workers subscribe the
+        wildcard filters as MQTTv5 shared subscription (`wildcard` mode).
+
+        Args:
+            worker_no (int): number of this subscriber worker
+            workers (int): number of subscriber workers
+        """
+        filters = TopicTrie(self._mqtt_topics).wildcard_filters(
+                            depth=settings.WILDCARD_DEPTH,
+                            max_filters=settings.WILDCARD_MAX_FILTERS)
+
+        if settings.SUBSCRIPTION_MODE == "wildcard":
+            subscriptions = filters
+            if workers > 1:
+                subscriptions = [f"$share/{SHARED_SUBSCRIPTION_GROUP}/{topic_filter}"
+                                 for topic_filter in filters]
+        else:
+            subscriptions = [topic for topic in self._mqtt_topics.names
+                             if workers == 1 or
+                             zlib.crc32(topic.encode("utf-8")) % workers == worker_no]
+
+        for batch_start in range(0, len(subscriptions), SUBSCRIBE_BATCH_SIZE):
+            batch = subscriptions[batch_start:batch_start + SUBSCRIBE_BATCH_SIZE]
+            subscription = await self.mqtt_client.subscribe(
+                                batch, settings.MQTT_QOS,
+                                maxsize=settings.SUBSCRIPTION_QUEUE_SIZE)
+            self._subscriptions.append(subscription)
+            self._receive_tasks.append(asyncio.create_task(
+                self._receive_messages(subscription, self.user_callback)))
+
+        self._subscription_list = subscriptions
+        settings.LOGGER.info("Subscription of %s topics added (%s mode, %s filters: %s)",
+                             len(subscriptions),
+                             settings.SUBSCRIPTION_MODE,
+                             len(filters),
+                             filters)
+
+
+    async def start_test(self, trace_no, speed, fanout=1, expected_rates=None,
+                         topic_ids=None):
         """ Send json command to trace player to start it with proper settings
 
             Args:
-            trace_no (str): trace number to be run during test
+            trace_no (str or list): trace number to be run during test,
+                                    list of traces started together in batch mode
             speed (float): speed which the trace will run
+            fanout (int): number of copies of every topic published in load mode
+            expected_rates (list): expected rates by topic id of the started traces,
+                                   None for rates of the added topics
+            topic_ids (list): ids of the topics of the started traces, None for all
 
             Returns:
           """
+        trace_names = [trace_no] if isinstance(trace_no, str) or trace_no is None \
+                      else list(trace_no)
 
         settings.LOGGER.info("=" * 40)
         settings.LOGGER.info("*" *  14 + " Start Test " + "*" * 14)
         settings.LOGGER.info("=" * 40)
 
         settings.LOGGER.info(" ******** Testing trace: %s ******** ",
-                             settings.TRACE_NAME)
-        time.sleep(1)
-
-        self._test_started = True
-        self.__allow_mqtt_topic = True
-
-        # reinit data for test
-        self._mqtt_topics_tested.clear()
-        self.__mqtt_message_counter = 0
-
-        # create json command to send to trace player
-        json_send_cmd = {"trace_name":trace_no, "speed":speed}
-
-        self.mqtt_client.start()
-        self.mqtt_client.publish_message(topic=TOPIC_PLAYER_START, json=json.dumps(json_send_cmd))
-        time.sleep(0.2)
+                             ", ".join(str(trace_name) for trace_name in trace_names))
+
+        self.reset_test(speed, expected_rates, topic_ids)
+        self._running_traces = set(trace_names)
+        if settings.ADAPTIVE_SPEED and not self._virtual_clock:
+            self._adaptive_speed = AdaptiveSpeed(settings.MAX_SPEED, settings.SPEED_STEP,
+                                                 settings.ADAPTIVE_MIN_GAIN,
+                                                 settings.ADAPTIVE_INTERVAL)
+            self._adaptive_speed.start(speed, time.monotonic())
+        if self.subscriber_pool is not None:
+            self.subscriber_pool.start(speed)
+
+        # start commands of all traces are sent at once, every player acknowledges
+        # with the run number of the started trace
+        request_time = time.monotonic()
+        responses = await asyncio.gather(*(
+            self.request_player(TOPIC_PLAYER_START,
+                                {"trace_name": trace_name, "speed": speed, "fanout": fanout,
+                                 "mode": settings.PLAYBACK_MODE})
+            for trace_name in trace_names))
+        ack_ms = round((time.monotonic() - request_time) * 1000, 1)
+        for trace_name, response in zip(trace_names, responses):
+            if response is None:
+                continue
+            if not response.get("ack"):
+                settings.LOGGER.info("Start of trace %s rejected by Trace Player", trace_name)
+                continue
+            status = response["status"]
+            self._started_runs[status.get("trace_name")] = status.get("run")
+            settings.LOGGER.info("Start of trace %s acknowledged within %s ms",
+                                 trace_name, ack_ms)
 
         settings.LOGGER.info("*" * 14 + " Trace Player Started " + "*" * 14)
 
 
-    def stop_test(self):
+    async def stop_test(self):
         """ 
         Send json command to trace player to stop it 
         """
@@ -230,20 +959,131 @@ class MessageTestApp:
         settings.LOGGER.info(" Test Completed ")
         settings.LOGGER.info("*" * 20)
 
+        self.end_test()
+        if self.subscriber_pool is not None:
+            # waiting for worker results blocks, keep the event loop running
+            self.merge_results(await asyncio.get_running_loop().run_in_executor(
+                                   None, self.subscriber_pool.stop))
+        if self._adaptive_speed is not None:
+            # expected rates of the report at the mean speed of the test
+            self._rate_stats.expected_rates = array("d", (
+                rate * self._adaptive_speed.mean_speed(time.monotonic()) / self._speed
+                for rate in self._rate_stats.expected_rates))
+            self._adaptive_speed = None
+
+        # acknowledged stop commands carry the stopped status, without
+        # response the retained status of the players is awaited
+        await asyncio.gather(*(self.request_player(TOPIC_PLAYER_STOP, {"trace_name": trace_name})
+                               for trace_name in self._running_traces))
+        if await self.wait_player(self.players_stopped, PLAYER_STOP_TIMEOUT):
+            settings.LOGGER.info(" Trace Player Stopped ")
+        else:
+            settings.LOGGER.info(" No stopped status of Trace Player received ")
+
+
+    def reset_test(self, speed, expected_rates=None, topic_ids=None):
+        """ Reinit test data and start to handle received messages
+
+            Args:
+            speed (float): speed which the trace will run
+            expected_rates (list): expected rates by topic id at speed 1.0,
+                                   None for rates of the added topics
+            topic_ids (list): ids of the topics of the test, None for all topics
+        """
+        if expected_rates is None:
+            expected_rates = self._expected_rates
+        if self._virtual_clock:
+            # rates are measured in trace time, independent of speed
+            speed = 1.0
+        self._speed = speed
+        self._test_topics_amount = len(self._mqtt_topics) if topic_ids is None \
+                                   else len(topic_ids)
+        # STOP_COVERAGE 0 waits for the end of the trace
+        self._stop_tested_count = math.inf
+        if settings.STOP_COVERAGE > 0.0:
+            self._stop_tested_count = max(math.ceil(
+                self._test_topics_amount * min(settings.STOP_COVERAGE, 100.0) / 100.0), 1)
+        self._dropped_total = self.subscription_load()[0]
+        self._player_outages_start = dict(self._player_outages)
+        if self.mqtt_client is not None:
+            self._tester_outage_start = (self.mqtt_client.reconnects,
+                                         self.mqtt_client.outage_seconds)
+
+        self._test_started = True
+        self.__allow_mqtt_topic = True
+
+        # reinit data for test
+        self._test_completed.clear()
+        self._completed_traces = set()
+        self._started_runs = {}
+        self._test_start_time = time.monotonic()
+        self._topics_tested = bytearray(len(self._mqtt_topics))
+        self._tested_count = 0
+        self.__mqtt_message_counter = 0
+        self._delivery_stats = [DeliveryStats() for _ in range(len(self._mqtt_topics))]
+        self._invalid_counts = array("I", bytes(4 * len(self._mqtt_topics)))
+        self._conforming_counts = array("Q", bytes(8 * len(self._mqtt_topics)))
+        self._nonconforming_counts = array("Q", bytes(8 * len(self._mqtt_topics)))
+        self._nonconforming_samples = [None] * len(self._mqtt_topics)
+        self._rate_stats = RateStats([rate * speed for rate in expected_rates])
+
+
+    def end_test(self):
+        """ Stop to handle received messages """
+
         self._test_started = False
         self.__allow_mqtt_topic = False
+        self._unhandled_log.flush()
+        self._tested_log.flush()
+
 
-        json_send_cmd = ''
+    def export_results(self):
+        """ Return test results of this instance to be merged in the report process
 
-        self.mqtt_client.start()
-        self.mqtt_client.publish_message(topic=TOPIC_PLAYER_START, json=json_send_cmd)
-        time.sleep(1)
+        Returns:
+            results (dict): tested flags, statistics and message counter
+        """
+        return {"tested": self._topics_tested,
+                "invalid": self._invalid_counts,
+                "conforming": self._conforming_counts,
+                "nonconforming": self._nonconforming_counts,
+                "nonconforming_samples": self._nonconforming_samples,
+                "delivery": self._delivery_stats,
+                "rate": self._rate_stats,
+                "messages": self.__mqtt_message_counter}
 
-        settings.LOGGER.info(" Trace Player Stopped ")
+
+    def merge_results(self, results_list):
+        """ Merge test results of subscriber workers into this instance
+
+            Args:
+            results_list (list): results returned by `export_results` of workers
+        """
+        for results in results_list:
+            for topic_id, tested in enumerate(results["tested"]):
+                if tested and not self._topics_tested[topic_id]:
+                    self._topics_tested[topic_id] = 1
+                    self._tested_count += 1
+            for topic_id, invalid in enumerate(results["invalid"]):
+                self._invalid_counts[topic_id] += invalid
+            for topic_id, conforming in enumerate(results["conforming"]):
+                self._conforming_counts[topic_id] += conforming
+            for topic_id, nonconforming in enumerate(results["nonconforming"]):
+                self._nonconforming_counts[topic_id] += nonconforming
+                if self._nonconforming_samples[topic_id] is None:
+                    self._nonconforming_samples[topic_id] = \
+                        results["nonconforming_samples"][topic_id]
+            for topic_id, delivery_stats in enumerate(results["delivery"]):
+                self._delivery_stats[topic_id].merge(delivery_stats)
+            self._rate_stats.merge(results["rate"])
+            self.__mqtt_message_counter += results["messages"]
+        settings.LOGGER.info("Merged results of %s subscriber workers: %s messages",
+                             len(results_list), self.__mqtt_message_counter)
 
 
     def get_player_status(self):
-        """ Get player status of current running trace
+        """ Get player status of current running trace,
+        last status received by `status_callback` is returned without waiting
 
         Args:
 
@@ -253,59 +1093,126 @@ class MessageTestApp:
                                 to the end of current running trace
         """
 
-        self.mqtt_client.start()
-        self.mqtt_client.subscribe("signalPlayer/status")
-        self.mqtt_client.read_message()
+        trace_status, trace_time_remained, trace_time_elapsed = self._player_status
 
+        if trace_status is None:
+            settings.LOGGER.info(" No response from Player Status received ")
 
-        if self.mqtt_client.read_payload is not None \
-            and self.mqtt_client.read_topic == 'signalPlayer/status':
-            trace_status = json.loads(self.mqtt_client.read_payload.decode('utf-8'))["status"]
-            trace_length_in_sec = json.loads(self.mqtt_client.read_payload.decode('utf-8'))["trace_length"]
-            trace_time_elapsed = json.loads(self.mqtt_client.read_payload.decode('utf-8'))["time_elapsed"]
-            trace_time_remained = trace_length_in_sec - trace_time_elapsed
-            return trace_status, trace_time_remained, trace_time_elapsed
+        return trace_status, trace_time_remained, trace_time_elapsed
 
-        else:
-            settings.LOGGER.info(" No response from Player Status received ")
 
-        return None, None, None
+def read_input_file_topics(file_name):
+    """ Read topics to test from input JSON file. The file is streamed,
+    only topic names, counts and expected results of mqtt topics are kept.
 
+        Args:
+        file_name (str): input JSON file
 
-if __name__ == "__main__":
-    signal_tester = MessageTestApp()
+        Returns:
+        topic_specs (list): (topic, expected result, expected rate) of all topics
+        trace_length (float): `traceLengthSeconds` of the trace, 0 if not given
+    """
+    # expected results of mqtt topics by topic id
+    expected_results = {}
 
-    # read input config file with topics
-    try:
-        with open("./input_json_files/input_file_" + TRACE_NAME + ".json", "r") as data_file:
-            data = json.load(data_file)
+    def keep_result(topic_id, topic, entry):
+        if topic.startswith("mqtt"):
+            expected_results[topic_id] = entry.get('result')
 
-        # get number of topics in json file
-        topic_size = len(data['trace'][0]['topics'])
-        settings.LOGGER.info(f"Number of topics in JSON: {topic_size}")
+    topic_table, trace_fields = read_trace_definition(file_name, keep_result)
+    settings.LOGGER.info("Number of topics in JSON: %s", len(topic_table))
+    trace_length = trace_fields.get('traceLengthSeconds', 0)
 
-        for topic_number in range(0, topic_size):
-            # populate list with mqtt topics
-            if data['trace'][0]['topics'][topic_number]['topic'][0:4] == "mqtt":
-                signal_tester._mqtt_topics.append(data['trace'][0]['topics'][topic_number]['topic'])
+    topic_specs = []
+    for topic_id, expected_result in expected_results.items():
+        topic = topic_table.names[topic_id]
+        expected_rate = topic_table.counts[topic_id] / trace_length if trace_length > 0 else 0.0
+        # in load mode player publishes LOAD_FANOUT copies of every topic
+        for copy_no in range(settings.LOAD_FANOUT):
+            topic_specs.append((load_topic_name(topic, copy_no),
+                                expected_result, expected_rate))
+    return topic_specs, trace_length
 
-    except (FileNotFoundError, IOError):
-        settings.LOGGER.info("Wrong JSON file name of file doesn't exist")
+
+def read_trace_file_topics(file_name):
+    """ Read topics to test from a recorded binary trace file (trace_recorder.py
+    of the message player). Expected payload structure of a topic is taken from
+    its first recorded payload, expected rate from its recorded message count.
+
+        Args:
+        file_name (str): binary trace file
+
+        Returns:
+        topic_specs (list): (topic, expected result, expected rate) of all topics
+    """
+    topic_specs = []
+    with TraceReader(file_name) as trace_reader:
+        settings.LOGGER.info("Number of topics in trace file: %s", len(trace_reader.topics))
+        duration = trace_reader.trace_length
+        for topic_id, topic in enumerate(trace_reader.topics):
+            try:
+                expected_result = json.loads(trace_reader.first_payload(topic_id))
+            except (TypeError, ValueError):
+                expected_result = None
+            if not isinstance(expected_result, list) or len(expected_result) == 0:
+                # only non-empty `schema` is checked
+                expected_result = None
+            topic_specs.append((topic, expected_result,
+                                trace_reader.counts[topic_id] / duration))
+    return topic_specs
+
+
+def start_metrics(signal_tester):
+    """ Start serving/publishing metrics of the connected tester if configured
+
+        Returns:
+        metrics_task (asyncio.Task): task serving the metrics or None
+    """
+    if settings.METRICS_PORT or settings.METRICS_TOPIC:
+        return asyncio.create_task(serve_metrics(
+            signal_tester.metrics, settings.METRICS_PORT, signal_tester.mqtt_client,
+            settings.METRICS_TOPIC, settings.METRICS_INTERVAL))
+    return None
+
+
+async def run_batch_sequence(signal_tester, batch_traces):
+    """ Connect the tester, subscribe topics of all traces once,
+    run the traces of the batch and write reports and summary
+
+        Args:
+        signal_tester (MessageTestApp): tester with topics of all traces added
+        batch_traces (list): BatchTrace of all traces in batch order
+    """
+    await signal_tester.connect()
+    metrics_task = start_metrics(signal_tester)
+    try:
+        if signal_tester.subscriber_pool is None:
+            await signal_tester.subscribe_topics()
+        if not await signal_tester.wait_player(signal_tester.player_ready,
+                                               PLAYER_READY_TIMEOUT):
+            settings.LOGGER.info(" No response from Player Status received ")
+        summaries = await run_batch(signal_tester, batch_traces,
+                                    settings.TEST_SPEED, settings.LOAD_FANOUT)
+        write_batch_summary(summaries)
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+        await signal_tester.close()
 
 
-    registered_mqtt_topics = []
+async def run_test_sequence(signal_tester):
+    """ Connect the tester and run the test sequence until the report is created
 
-    # Subscribe to all mqtt topics from json file
-    if len(signal_tester._mqtt_topics) > 0:
-        for topic in range(0, len(signal_tester._mqtt_topics)):
-            signal_tester.mqtt_client.client.subscribe(signal_tester._mqtt_topics[topic],
-                                                       qos=settings.MQTT_QOS)
-            signal_tester.mqtt_client.client.message_callback_add(
-                        signal_tester._mqtt_topics[topic], signal_tester.user_callback)
+        Args:
+        signal_tester (MessageTestApp): tester with all topics added
+    """
+    await signal_tester.connect()
+    metrics_task = start_metrics(signal_tester)
 
-            settings.LOGGER.info("Subscription of %s added",
-                                 signal_tester._mqtt_topics[topic])
-    signal_tester.mqtt_client.start()
+    # Subscribe to all mqtt topics from json file,
+    # with subscriber workers they subscribe the topics
+    if len(signal_tester._mqtt_topics) > 0 and signal_tester.subscriber_pool is None:
+        await signal_tester.subscribe_topics()
 
     # Start the program procedure
     seq_status = SequenceStatus(0)
@@ -320,25 +1227,35 @@ if __name__ == "__main__":
 
                     if last_seq_status == SequenceStatus.TEST_STOPPED:
                         last_seq_status = SequenceStatus.UNKNOWN
-                        time.sleep(1)
                         settings.LOGGER.info("=" * 55)
                         settings.LOGGER.info("#" * 14 + \
                                              " Waiting to start the test " + \
                                              "#" * 14)
                         settings.LOGGER.info("=" * 55)
-                        time.sleep(2)
                     if len(signal_tester._mqtt_topics) > 0:
+                        # start as soon as the player publishes its status
+                        if not await signal_tester.wait_player(signal_tester.player_ready,
+                                                               PLAYER_READY_TIMEOUT):
+                            settings.LOGGER.info(" No response from Player Status received ")
                         seq_status = SequenceStatus.TEST_STARTED
+                    else:
+                        # nothing to test, wait without spinning
+                        await asyncio.sleep(STATUS_LOG_PERIOD)
 
                 case SequenceStatus.TEST_STARTED:
-                    timer = SimpleTimer(1.0)
                     seq_status = SequenceStatus.TEST_RUNNING
-                    time.sleep(2)
-                    signal_tester.start_test(trace_no=TRACE_NAME, speed=1.0)
+                    await signal_tester.start_test(trace_no=TRACE_NAME,
+                                                   speed=settings.TEST_SPEED,
+                                                   fanout=settings.LOAD_FANOUT)
 
                 case SequenceStatus.TEST_RUNNING:
-                    # check every 1 sec if trace end reached
-                    if timer.is_time_elapsed():
+                    # sleep until player reports end of trace or coverage is reached,
+                    # wake up every STATUS_LOG_PERIOD to log the status
+                    if await signal_tester.wait_test_completed(timeout=STATUS_LOG_PERIOD):
+                        await signal_tester.stop_test()
+                        seq_status = SequenceStatus.TEST_STOPPED
+                    else:
+                        await signal_tester.supervise_test()
                         trace_status, \
                         trace_time_remained, \
                         trace_time_elapsed = signal_tester.get_player_status()
@@ -352,19 +1269,70 @@ if __name__ == "__main__":
                                                 trace_status,
                                                 round(trace_time_remained,1),
                                                 round(trace_time_elapsed, 1))
-                        if trace_status is not None and trace_time_remained < 1.0:
-                            signal_tester.stop_test()
-                            seq_status = SequenceStatus.TEST_STOPPED
-
-                        # reinit timer
-                        timer = SimpleTimer(1.0)
 
                 case SequenceStatus.TEST_STOPPED:
                     last_seq_status = SequenceStatus.TEST_STOPPED
                     signal_tester.create_test_report()
-                    signal_tester.mqtt_client.close()
                     break
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+        await signal_tester.close()
+
 
+if __name__ == "__main__":
+    # topics to test: (topic, expected result, expected rate)
+    topic_specs = []
+    # batch mode: (trace name, topic specs, trace length) of every trace
+    batch_specs = []
+
+    # read topics from recorded trace file or input config file
+    try:
+        if settings.BATCH_TRACES:
+            for batch_trace_name, batch_file_name in find_batch_traces(settings.BATCH_TRACES):
+                trace_specs, batch_trace_length = read_input_file_topics(batch_file_name)
+                batch_specs.append((batch_trace_name, trace_specs, batch_trace_length))
+                topic_specs += trace_specs
+        elif settings.TRACE_FILE:
+            topic_specs = read_trace_file_topics(settings.TRACE_FILE)
+        else:
+            topic_specs, _ = read_input_file_topics(
+                              "./input_json_files/input_file_" + TRACE_NAME + ".json")
+    except (FileNotFoundError, IOError):
+        settings.LOGGER.info("Wrong JSON file name of file doesn't exist")
+    except TraceDefinitionError as err:
+        settings.LOGGER.info("Invalid JSON trace definition: %s", err)
+    except TraceFormatError as err:
+        settings.LOGGER.info("Invalid trace file: %s", err)
+
+    # start subscriber workers before the event loop runs in this process
+    subscriber_pool = None
+    if settings.TESTER_WORKERS > 1 and len(topic_specs) > 0:
+        subscriber_pool = SubscriberPool(MessageTestApp, CLIENT_ID,
+                                         settings.TESTER_WORKERS, topic_specs)
+
+    signal_tester = MessageTestApp()
+    signal_tester.subscriber_pool = subscriber_pool
+    for topic_spec in topic_specs:
+        signal_tester.add_topic(*topic_spec)
+
+    # topics of batch traces are added above, same topic ids in all traces
+    batch_traces = []
+    for batch_trace_name, trace_specs, batch_trace_length in batch_specs:
+        batch_trace = BatchTrace(batch_trace_name, batch_trace_length)
+        for topic, expected_result, expected_rate in trace_specs:
+            batch_trace.add_topic(signal_tester.add_topic(topic, expected_result),
+                                  expected_rate)
+        batch_traces.append(batch_trace)
+
+    try:
+        if batch_traces:
+            asyncio.run(run_batch_sequence(signal_tester, batch_traces))
+        else:
+            asyncio.run(run_test_sequence(signal_tester))
     except Exception as ex:
         settings.LOGGER.error(ex)
         raise ex
+    finally:
+        if subscriber_pool is not None:
+            subscriber_pool.close()
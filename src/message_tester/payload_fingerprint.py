@@ -0,0 +1,148 @@
+"""
+Expected payload fingerprints of the message tester.
+
+The expected `result` of a topic is encoded once at load time into the set
+of payloads the player publishes (every entry as one-element list, encoded
+like the player does) plus their canonical form (sorted keys, compact
+separators). A received payload conforms if its raw bytes are in the set,
+only payloads which differ byte by byte are decoded and compared in
+canonical form. Topics with the same expected result share one set.
+The structural difference to the expected payload is calculated only for
+the report, from a kept sample of a non-conforming payload.
+"""
+
+import json
+
+
+# maximum number of differences listed in a payload diff
+MAX_DIFFERENCES = 3
+
+
+def canonical_payload(value):
+    """
+    Return canonical encoding of a decoded JSON value.
+    """
+    return json.dumps(value, sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False).encode("utf-8")
+
+
+def expected_payloads(expected_result):
+    """
+    Return payload variants the player publishes for an expected `result`.
+    """
+    if isinstance(expected_result, list) and len(expected_result) > 0:
+        return [[entry] for entry in expected_result]
+    return [expected_result]
+
+
+class PayloadFingerprints:
+    """
+    Sets of conforming payloads indexed by topic id.
+    """
+    def __init__(self):
+        # conforming payloads (raw and canonical) by topic id, None if unknown
+        self._fingerprints = []
+        # expected result by topic id for payload diffs
+        self._results = []
+        # shared sets by canonical expected result
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def add_topic(self, expected_result):
+        """
+        Add expected result of the next topic id.
+
+        Args:
+            expected_result (list): expected payload from input JSON file,
+                                    None if only the structure is checked
+        """
+        fingerprints = None
+        if expected_result is not None:
+            key = canonical_payload(expected_result)
+            fingerprints = self._cache.get(key)
+            if fingerprints is None:
+                payloads = set()
+                for payload in expected_payloads(expected_result):
+                    payloads.add(json.dumps(payload).encode("utf-8"))
+                    payloads.add(canonical_payload(payload))
+                fingerprints = frozenset(payloads)
+                self._cache[key] = fingerprints
+        self._fingerprints.append(fingerprints)
+        self._results.append(expected_result)
+
+    def has_expected(self, topic_id):
+        """ True if the topic has an expected payload """
+        return self._fingerprints[topic_id] is not None
+
+    def match(self, topic_id, payload):
+        """
+        Check received payload against the expected payloads of a topic.
+
+        Args:
+            topic_id (int): topic id
+            payload (bytes): raw mqtt payload
+
+        Returns:
+            conforms (bool): None if the topic has no expected payload
+        """
+        fingerprints = self._fingerprints[topic_id]
+        if fingerprints is None:
+            return None
+        if payload in fingerprints:
+            return True
+        # another encoder (key order, separators) or another payload
+        try:
+            return canonical_payload(json.loads(payload)) in fingerprints
+        except ValueError:
+            return False
+
+    def diff(self, topic_id, payload):
+        """
+        Return structural difference of a received payload to the closest
+        expected payload of a topic as text.
+        """
+        try:
+            received = json.loads(payload)
+        except ValueError as err:
+            return f"invalid JSON: {err}"
+        differences = min((payload_differences(expected, received)
+                           for expected in expected_payloads(self._results[topic_id])),
+                          key=len)
+        if not differences:
+            return "same values, different encoding"
+        return "; ".join(differences[:MAX_DIFFERENCES])
+
+
+def payload_differences(expected, received, path="$"):
+    """
+    Return list of differences between two decoded JSON values.
+
+    Args:
+        expected: expected JSON value
+        received: received JSON value
+        path (str): JSON path of the compared values
+
+    Returns:
+        differences (list): text of every difference, e.g.
+                            `$[0].schema.message: expected 'DME', received 'DSC'`
+    """
+    if isinstance(expected, dict) and isinstance(received, dict):
+        differences = [f"{path}.{key}: missing" for key in expected if key not in received]
+        differences += [f"{path}.{key}: unexpected" for key in received if key not in expected]
+        for key, value in expected.items():
+            if key in received:
+                differences += payload_differences(value, received[key], f"{path}.{key}")
+        return differences
+    if isinstance(expected, list) and isinstance(received, list):
+        differences = []
+        if len(expected) != len(received):
+            differences.append(f"{path}: expected {len(expected)} entries, "
+                               f"received {len(received)}")
+        for index, (value, received_value) in enumerate(zip(expected, received)):
+            differences += payload_differences(value, received_value, f"{path}[{index}]")
+        return differences
+    if type(expected) is not type(received) or expected != received:
+        return [f"{path}: expected {expected!r}, received {received!r}"]
+    return []
@@ -0,0 +1,121 @@
+"""
+Compiled payload validators of the message tester.
+
+The expected `result` of a topic from the input JSON file is compiled once
+into a validator, which checks that a received payload has the same structure:
+same keys of JSON objects, same value types (int and float are both numbers)
+and every list entry matches one of the expected list entries.
+Topics with the same payload structure share one cached validator.
+"""
+
+import json
+
+
+_NUMBER = "number"
+
+# compiled validators by structure key
+_VALIDATOR_CACHE = {}
+
+
+def _value_type(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return _NUMBER
+    if isinstance(value, str):
+        return "str"
+    if value is None:
+        return "null"
+    if isinstance(value, dict):
+        return "object"
+    return "array"
+
+
+def structure_key(expected):
+    """
+    Return canonical string which describes structure of a JSON value.
+    """
+    if isinstance(expected, dict):
+        return "{" + ",".join(json.dumps(key) + ":" + structure_key(value)
+                              for key, value in sorted(expected.items())) + "}"
+    if isinstance(expected, list):
+        return "[" + "|".join(sorted({structure_key(entry)
+                                      for entry in expected})) + "]"
+    return _value_type(expected)
+
+
+def _compile(expected):
+    if isinstance(expected, dict):
+        keys = frozenset(expected)
+        fields = tuple((key, _compile(value)) for key, value in expected.items())
+
+        def validate_object(value):
+            if not isinstance(value, dict) or value.keys() != keys:
+                return False
+            for key, validate in fields:
+                if not validate(value[key]):
+                    return False
+            return True
+        return validate_object
+
+    if isinstance(expected, list):
+        entries = {}
+        for entry in expected:
+            entries.setdefault(structure_key(entry), _compile(entry))
+        alternatives = tuple(entries.values())
+
+        def validate_array(value):
+            if not isinstance(value, list):
+                return False
+            if not alternatives:
+                return True
+            for entry in value:
+                for validate in alternatives:
+                    if validate(entry):
+                        break
+                else:
+                    return False
+            return True
+        return validate_array
+
+    expected_type = _value_type(expected)
+
+    def validate_scalar(value):
+        return _value_type(value) == expected_type
+    return validate_scalar
+
+
+def compile_validator(expected_result):
+    """
+    Return validator function for the expected `result` of a topic.
+    A received payload is valid if it is a non-empty list and every entry
+    has the structure of one of the entries of expected result.
+
+    Args:
+        expected_result (list): expected payload from input JSON file
+
+    Returns:
+        validator (callable): function(decoded_payload) -> bool
+    """
+    key = structure_key(expected_result)
+    validator = _VALIDATOR_CACHE.get(key)
+    if validator is None:
+        validate_result = _compile(expected_result)
+
+        def validator(decoded_payload):
+            return isinstance(decoded_payload, list) \
+                and len(decoded_payload) > 0 \
+                and validate_result(decoded_payload)
+        _VALIDATOR_CACHE[key] = validator
+    return validator
+
+
+def schema_validator(decoded_payload):
+    """
+    Default validator for topics without expected result:
+    field `schema` in first entry of payload should exist and be non-empty.
+    """
+    try:
+        return len(decoded_payload[0]["schema"]) > 0
+    except (LookupError, TypeError):
+        return False
@@ -1,5 +1,6 @@
 import logging
 import os
+import sys
 from dotenv import load_dotenv
 
 LOG_FORMAT = "%(levelname)s %(asctime)s \
@@ -7,15 +8,117 @@ LOG_FORMAT = "%(levelname)s %(asctime)s \
     Line: %(lineno)d \
     Message: %(message)s"
 
-logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
-LOGGER = logging.getLogger(__name__)
+# shared package mqtt_common is next to the app directory in the source tree,
+# in the docker image it is copied into the app directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
 
 # Load environment variables from the .env file
 load_dotenv()
 
+from mqtt_common.logs import configure_logging
+
+# log records are written by a background thread
+configure_logging(LOG_FORMAT)
+LOGGER = logging.getLogger(__name__)
+
 MQTT_HOST = os.getenv("MQTT_HOST", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_BROKER_USER = os.getenv("MQTT_USERNAME")
 MQTT_BROKER_PASSWORD = os.getenv("MQTT_PASSWORD")
 MQTT_QOS = int(os.getenv("MQTT_QOS", 1))
-TRACE_NAME = os.getenv("TRACE_NAME")
\ No newline at end of file
+TRACE_NAME = os.getenv("TRACE_NAME")
+
+# seconds the broker keeps the MQTTv5 session (subscriptions, queued QoS 1/2
+# messages) after a lost connection, 0 starts a clean session on every connect
+MQTT_SESSION_EXPIRY = max(int(os.getenv("MQTT_SESSION_EXPIRY", 300)), 0)
+# delay in seconds before the first reconnect attempt, doubled after every
+# failed attempt up to RECONNECT_MAX_DELAY
+RECONNECT_DELAY = float(os.getenv("RECONNECT_DELAY", 0.5))
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", 30.0))
+
+# clock for latency stamps of messages: monotonic (player and tester
+# on the same host) or wall (hosts synchronized with NTP/PTP)
+LATENCY_CLOCK = os.getenv("LATENCY_CLOCK", "monotonic")
+
+# subscription of trace topics: `topic` (one subscription per topic)
+# or `wildcard` (few wildcard filters computed from topic list)
+SUBSCRIPTION_MODE = os.getenv("SUBSCRIPTION_MODE", "topic")
+# number of topic levels in wildcard filters, e.g. 2 -> `mqtt/DME/#`
+WILDCARD_DEPTH = int(os.getenv("WILDCARD_DEPTH", 2))
+# maximum number of wildcard filters, depth is reduced to stay below
+WILDCARD_MAX_FILTERS = int(os.getenv("WILDCARD_MAX_FILTERS", 100))
+
+# validate every n-th payload of topics which were already tested,
+# 0 disables validation after the first valid payload of a topic
+VALIDATION_SAMPLE_EVERY = int(os.getenv("VALIDATION_SAMPLE_EVERY", 0))
+
+# allowed relative deviation of observed from expected topic rate (0.1 = 10 %)
+RATE_TOLERANCE = float(os.getenv("RATE_TOLERANCE", 0.1))
+
+# batch mode: comma separated trace names or glob patterns of trace names
+# (input files input_json_files/input_file_<trace>.json, e.g. `trace-*`),
+# the traces are tested one after another over one connection;
+# empty tests only TRACE_NAME
+BATCH_TRACES = [pattern.strip() for pattern
+                in os.getenv("BATCH_TRACES", "").split(",") if pattern.strip()]
+# run batch traces without common topics at the same time
+# (one player per trace with PLAYER_TRACE_NAME of the trace)
+BATCH_PARALLEL = os.getenv("BATCH_PARALLEL", "false").lower() in ("true", "1", "yes")
+# seconds after trace length / speed until a trace whose end isn't reported
+# by the player is stopped in batch mode
+TRACE_TIMEOUT_MARGIN = float(os.getenv("TRACE_TIMEOUT_MARGIN", 30.0))
+
+# stop the trace and create the report as soon as this share of topics
+# in percent is tested, 0 waits for the end of the trace reported by the player
+STOP_COVERAGE = float(os.getenv("STOP_COVERAGE", 0))
+
+# adaptive speed: every ADAPTIVE_INTERVAL seconds the speed is raised by factor
+# SPEED_STEP (up to MAX_SPEED) while coverage rises by less than ADAPTIVE_MIN_GAIN
+# percent per interval, no messages are dropped and the publish lag of the
+# player stays below ADAPTIVE_MAX_LAG seconds
+ADAPTIVE_SPEED = os.getenv("ADAPTIVE_SPEED", "false").lower() in ("true", "1", "yes")
+ADAPTIVE_INTERVAL = float(os.getenv("ADAPTIVE_INTERVAL", 2.0))
+ADAPTIVE_MIN_GAIN = float(os.getenv("ADAPTIVE_MIN_GAIN", 1.0))
+ADAPTIVE_MAX_LAG = float(os.getenv("ADAPTIVE_MAX_LAG", 0.5))
+SPEED_STEP = max(float(os.getenv("SPEED_STEP", 2.0)), 1.0)
+MAX_SPEED = float(os.getenv("MAX_SPEED", 100.0))
+
+# speed (time compression factor) of the trace requested from the player
+TEST_SPEED = float(os.getenv("TEST_SPEED", 1.0))
+# playback mode requested from the player: realtime or virtual (trace played
+# as fast as possible, topic rates are measured from the stamped trace time,
+# TEST_SPEED and ADAPTIVE_SPEED don't apply)
+PLAYBACK_MODE = os.getenv("PLAYBACK_MODE", "realtime").lower()
+# load mode: number of copies of every topic requested from the player
+LOAD_FANOUT = max(int(os.getenv("LOAD_FANOUT", 1)), 1)
+
+# number of subscriber worker processes, each with its own MQTT connection
+# and a partition of the topics; 1 receives all topics in the main process
+TESTER_WORKERS = max(int(os.getenv("TESTER_WORKERS", 1)), 1)
+
+# maximum number of received messages queued per subscription (SUBSCRIBE batch),
+# messages above are dropped (oldest first) and counted in the log
+SUBSCRIPTION_QUEUE_SIZE = int(os.getenv("SUBSCRIPTION_QUEUE_SIZE", 100000))
+
+# recorded binary trace file (trace_recorder.py of the player) to derive
+# the topics to test from, instead of the input JSON file of TRACE_NAME
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# metrics in OpenMetrics format: HTTP endpoint http://<host>:<METRICS_PORT>/metrics
+# (0 disables it) and MQTT topic published every METRICS_INTERVAL seconds
+# (empty disables it)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_TOPIC = os.getenv("METRICS_TOPIC", "")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 5.0))
+
+# check every received payload against the expected `result` of its topic
+# (fingerprint lookup of the raw payload), counts and a sample diff of
+# non-conforming payloads are reported; not for topics of a TRACE_FILE
+PAYLOAD_CONFORMANCE = os.getenv("PAYLOAD_CONFORMANCE", "true").lower() in ("true", "1", "yes")
+
+# logging of received messages: unhandled topics are summarized every
+# LOG_SUMMARY_INTERVAL seconds, at most LOG_RATE_LIMIT newly tested topics are
+# logged per interval (0 logs all), payloads only with LOG_PAYLOADS
+LOG_SUMMARY_INTERVAL = float(os.getenv("LOG_SUMMARY_INTERVAL", 10.0))
+LOG_RATE_LIMIT = max(int(os.getenv("LOG_RATE_LIMIT", 20)), 0)
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() in ("true", "1", "yes")
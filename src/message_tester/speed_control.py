@@ -0,0 +1,80 @@
+"""
+Adaptive trace speed of the message tester.
+
+While the coverage of a test rises slowly and tester and player keep up
+with the message rate, the speed of the trace is raised step by step, so
+topics published rarely are seen earlier. The trace time played at every
+speed is accumulated to calculate the mean speed of the test, which scales
+the expected topic rates of the report. A raised speed is proposed by
+`update` and only applied with `set_speed` once the player acknowledged it.
+"""
+
+
+class AdaptiveSpeed:
+    """
+    Speed controller of one test, updated periodically by the test sequence.
+    """
+    def __init__(self, max_speed, step, min_gain, interval):
+        """
+        Args:
+            max_speed (float): speed is not raised above
+            step (float): factor the speed is raised by
+            min_gain (float): coverage gain in percent per interval below
+                              which the speed is raised
+            interval (float): minimum time in seconds between speed changes
+        """
+        self.max_speed = max_speed
+        self.step = step
+        self.min_gain = min_gain
+        self.interval = interval
+        self.speed = 1.0
+        self._start_time = 0.0
+        self._change_time = 0.0
+        # trace time in seconds played before the last speed change
+        self._trace_time = 0.0
+        self._check_time = 0.0
+        self._check_tested = 0
+
+    def start(self, speed, now):
+        """ Start of the test with its initial speed """
+        self.speed = speed
+        self._start_time = now
+        self._change_time = now
+        self._trace_time = 0.0
+        self._check_time = now
+        self._check_tested = 0
+
+    def mean_speed(self, now):
+        """ Mean speed of the test since start """
+        trace_time = self._trace_time + (now - self._change_time) * self.speed
+        duration = now - self._start_time
+        return trace_time / duration if duration > 0.0 else self.speed
+
+    def update(self, now, tested, topics, keeping_up):
+        """
+        Check coverage gain since the last check (every `interval` seconds).
+
+        Args:
+            now (float): current monotonic time
+            tested (int): number of tested topics
+            topics (int): number of topics of the test
+            keeping_up (bool): tester and player keep up with the message rate
+
+        Returns:
+            speed (float): new speed to request from the player or None,
+                           the current speed is kept until `set_speed`
+        """
+        if now - self._check_time < self.interval or topics == 0:
+            return None
+        gain = 100.0 * (tested - self._check_tested) / topics
+        self._check_time = now
+        self._check_tested = tested
+        if gain >= self.min_gain or not keeping_up or self.speed >= self.max_speed:
+            return None
+        return min(self.speed * self.step, self.max_speed)
+
+    def set_speed(self, speed, now):
+        """ Speed change acknowledged by the player at time `now` """
+        self._trace_time += (now - self._change_time) * self.speed
+        self._change_time = now
+        self.speed = speed
@@ -0,0 +1,169 @@
+"""
+Subscriber worker processes of the message tester.
+
+Every worker has its own MQTT connection (client id with worker number) and
+MessageTestApp instance, which receives and validates messages of a partition
+of the topics: hash partition of the topic list in `topic` subscription mode
+or MQTTv5 shared subscription of the wildcard filters in `wildcard` mode.
+All workers know all topics with the same topic ids, so that their results
+can be merged into the single report of the main process.
+Topics tested by any worker are flagged in shared memory, so the main
+process can follow the coverage while the test is running. Dropped and
+queued messages of the subscription queues of every worker are shared
+the same way for the adaptive speed of the main process.
+"""
+
+import asyncio
+import multiprocessing
+import queue
+import time
+import settings
+
+
+# maximum time in seconds to wait for results of a worker after stop
+RESULT_TIMEOUT = 10.0
+
+# seconds between updates of the subscription load of a worker in shared memory
+LOAD_UPDATE_INTERVAL = 0.5
+
+
+async def _update_load(test_app, worker_no, load_counters):
+    """
+    Copy dropped messages and longest queue of the worker's subscriptions
+    into its slots of the shared load counters.
+    """
+    while True:
+        load_counters[2 * worker_no], load_counters[2 * worker_no + 1] = \
+            test_app.subscription_load()
+        await asyncio.sleep(LOAD_UPDATE_INTERVAL)
+
+
+async def _run_subscriber_worker(app_class, client_id, worker_no, workers, topic_specs,
+                                 command_queue, result_queue, tested_flags, load_counters):
+    """
+    Event loop of a subscriber worker process.
+    Handles received messages between start and stop command
+    and returns its results after stop.
+    """
+    loop = asyncio.get_running_loop()
+    test_app = app_class(client_id=f"{client_id}_{worker_no}", subscribe_status=False)
+    for topic_spec in topic_specs:
+        test_app.add_topic(*topic_spec)
+    test_app.shared_tested = tested_flags
+    await test_app.connect()
+    await test_app.subscribe_topics(worker_no, workers)
+    load_task = loop.create_task(_update_load(test_app, worker_no, load_counters))
+
+    while True:
+        # commands arrive over multiprocessing queue, wait in a thread
+        command = await loop.run_in_executor(None, command_queue.get)
+        if command[0] == "start":
+            test_app.reset_test(command[1])
+        elif command[0] == "stop":
+            test_app.end_test()
+            # results are tagged, late results of an earlier stop are discarded
+            result_queue.put((command[1], worker_no, test_app.export_results()))
+        elif command[0] == "exit":
+            break
+
+    load_task.cancel()
+    await test_app.close()
+
+
+def _subscriber_worker(*args):
+    """
+    Main function of a subscriber worker process.
+    """
+    asyncio.run(_run_subscriber_worker(*args))
+
+
+class SubscriberPool:
+    """
+    Coordinator of subscriber worker processes.
+    """
+    def __init__(self, app_class, client_id, workers, topic_specs):
+        """
+        Args:
+            app_class (type): MessageTestApp class to be instantiated in workers
+            client_id (str): base of mqtt client ids of workers
+            workers (int): number of worker processes
+            topic_specs (list): (topic, expected result, expected rate) of all topics
+        """
+        self.workers = workers
+        # tested flag of every topic id, set by the worker which tested the topic
+        topics_amount = len({topic_spec[0] for topic_spec in topic_specs})
+        self.tested_flags = multiprocessing.Array("B", topics_amount, lock=False)
+        # dropped messages and longest subscription queue of every worker
+        self.load_counters = multiprocessing.Array("q", 2 * workers, lock=False)
+        self._result_queue = multiprocessing.Queue()
+        self._command_queues = []
+        self._processes = []
+        # number of the last stop command, tags the results of the workers
+        self._stop_no = 0
+
+        for worker_no in range(workers):
+            command_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_subscriber_worker,
+                args=(app_class, client_id, worker_no, workers, topic_specs,
+                      command_queue, self._result_queue, self.tested_flags,
+                      self.load_counters),
+                name=f"subscriber-{worker_no}",
+                daemon=True)
+            process.start()
+            self._command_queues.append(command_queue)
+            self._processes.append(process)
+        settings.LOGGER.info("Started %s subscriber worker processes", workers)
+
+    @property
+    def tested_count(self):
+        """ Number of topics tested by any worker since start """
+        return bytes(self.tested_flags).count(1)
+
+    def subscription_load(self):
+        """
+        Return messages dropped by the subscription queues of all workers
+        and length of the longest queue, updated every LOAD_UPDATE_INTERVAL seconds.
+        """
+        load_counters = self.load_counters[:]
+        return sum(load_counters[0::2]), max(load_counters[1::2], default=0)
+
+    def start(self, speed):
+        """ Start handling of received messages in all workers """
+        self.tested_flags[:] = bytes(len(self.tested_flags))
+        for command_queue in self._command_queues:
+            command_queue.put(("start", speed))
+
+    def stop(self):
+        """
+        Stop handling of received messages in all workers.
+
+        Returns:
+            results_list (list): results of all workers which answered in time
+        """
+        self._stop_no += 1
+        for command_queue in self._command_queues:
+            command_queue.put(("stop", self._stop_no))
+
+        results = {}
+        deadline = time.monotonic() + RESULT_TIMEOUT
+        while len(results) < self.workers:
+            try:
+                stop_no, worker_no, worker_results = self._result_queue.get(
+                    timeout=max(deadline - time.monotonic(), 0.0))
+            except queue.Empty:
+                settings.LOGGER.error("Results of subscriber workers missing: %s",
+                                      sorted(set(range(self.workers)) - set(results)))
+                break
+            if stop_no != self._stop_no:
+                settings.LOGGER.info("Late results of subscriber worker %s discarded", worker_no)
+                continue
+            results[worker_no] = worker_results
+        return [results[worker_no] for worker_no in sorted(results)]
+
+    def close(self):
+        """ Terminate all worker processes """
+        for command_queue in self._command_queues:
+            command_queue.put(("exit",))
+        for process in self._processes:
+            process.join(timeout=5.0)
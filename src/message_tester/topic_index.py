@@ -0,0 +1,111 @@
+"""
+Topic bookkeeping of the message tester.
+
+TopicIndex maps every topic of the trace to an integer id (hash index),
+so that per-message lookups and per-topic state are O(1).
+TopicTrie stores topic levels as a tree and computes a small set of MQTT
+wildcard filters (e.g. `mqtt/DME/#`) which cover all topics of the trace.
+"""
+
+
+def load_topic_name(topic, copy_no):
+    """
+    Return name of a topic copy generated by message player in load mode.
+    Copy 0 is the original topic, other copies get suffix `/load<copy_no>`.
+    Must match load_topic_name in message player (payload_table.py).
+    """
+    if copy_no == 0:
+        return topic
+    return f"{topic}/load{copy_no}"
+
+
+class TopicIndex:
+    """
+    Hash index of trace topics to integer topic ids.
+    """
+    __slots__ = ("names", "_ids")
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, topic):
+        return topic in self._ids
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def add(self, topic):
+        """
+        Add topic to the index (if not yet added) and return its id.
+        """
+        topic_id = self._ids.get(topic)
+        if topic_id is None:
+            topic_id = len(self.names)
+            self._ids[topic] = topic_id
+            self.names.append(topic)
+        return topic_id
+
+    def get_id(self, topic):
+        """
+        Return id of the topic or None if topic isn't part of the trace.
+        """
+        return self._ids.get(topic)
+
+
+class TopicTrie:
+    """
+    Tree of topic levels, every node is a dict of its child levels.
+    """
+    # marks node where a complete topic ends, not a string since
+    # empty topic levels (`a//b`, `/x`) are valid
+    _END = None
+
+    def __init__(self, topics=()):
+        self._root = {}
+        for topic in topics:
+            self.insert(topic)
+
+    def insert(self, topic):
+        """ Add topic to the trie """
+        node = self._root
+        for level in topic.split("/"):
+            node = node.setdefault(level, {})
+        node[self._END] = {}
+
+    def wildcard_filters(self, depth, max_filters):
+        """
+        Compute wildcard filters which cover all topics in the trie.
+
+        Topics are grouped by their first `depth` levels, each group is
+        subscribed with `<levels>/#`. If there would be more than
+        `max_filters` filters, depth is reduced until they fit.
+        Topics with less levels than depth are returned unchanged.
+
+        Args:
+            depth (int): number of topic levels kept in front of `#`
+            max_filters (int): maximum number of returned filters
+
+        Returns:
+            filters (list): MQTT topic filters
+        """
+        depth = max(depth, 1)
+        while True:
+            filters = []
+            self._collect_filters(self._root, [], depth, filters)
+            if len(filters) <= max_filters or depth == 1:
+                return filters
+            depth -= 1
+
+    def _collect_filters(self, node, levels, depth, filters):
+        if len(levels) == depth:
+            filters.append("/".join(levels + ["#"]))
+            return
+        for level, child in node.items():
+            if level is self._END:
+                filters.append("/".join(levels))
+            else:
+                self._collect_filters(child, levels + [level], depth, filters)
@@ -0,0 +1,287 @@
+"""
+Per-topic delivery statistics of the message tester.
+
+Message player stamps every message with a per-topic sequence number and
+a send timestamp (MQTTv5 user properties). Based on these stamps the tester
+measures end-to-end latency through the broker and counts lost,
+duplicated and out-of-order messages.
+"""
+
+from array import array
+from bisect import bisect_left
+
+
+# latency histogram buckets: 1 us .. 100 s, 20 log-spaced buckets per decade
+_BUCKETS_PER_DECADE = 20
+_BUCKET_BOUNDS_US = [10 ** (decade / _BUCKETS_PER_DECADE)
+                     for decade in range(0, 8 * _BUCKETS_PER_DECADE + 1)]
+
+
+# sequence numbers per topic kept for duplicate detection
+SEQUENCE_WINDOW = 1 << 14
+_WINDOW_BYTES = SEQUENCE_WINDOW // 8
+
+
+class LatencyHistogram:
+    """
+    Fixed size histogram of latencies with log-spaced buckets.
+    Percentiles are reported as upper bound of the respective bucket,
+    which gives relative error below 12 %.
+    """
+    __slots__ = ("counts", "total", "max_us")
+
+    def __init__(self):
+        # last bucket collects latencies above the highest bound
+        self.counts = array("Q", bytes(8 * (len(_BUCKET_BOUNDS_US) + 1)))
+        self.total = 0
+        self.max_us = 0.0
+
+    def record(self, latency_us):
+        """
+        Add one latency value in microseconds to the histogram.
+        """
+        if latency_us < 0.0:
+            # clocks of player and tester are not synchronized
+            latency_us = 0.0
+        self.counts[bisect_left(_BUCKET_BOUNDS_US, latency_us)] += 1
+        self.total += 1
+        if latency_us > self.max_us:
+            self.max_us = latency_us
+
+    def merge(self, other):
+        """
+        Add all values of other histogram to this histogram.
+        """
+        for bucket, count in enumerate(other.counts):
+            self.counts[bucket] += count
+        self.total += other.total
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, percent):
+        """
+        Return latency in microseconds below which `percent` of values are,
+        None if the histogram is empty.
+        """
+        if self.total == 0:
+            return None
+        rank = self.total * percent / 100.0
+        cumulated = 0
+        for bucket, count in enumerate(self.counts):
+            cumulated += count
+            if count > 0 and cumulated >= rank:
+                if bucket >= len(_BUCKET_BOUNDS_US):
+                    return self.max_us
+                return min(_BUCKET_BOUNDS_US[bucket], self.max_us)
+        return self.max_us
+
+
+class DeliveryStats:
+    """
+    Sequence and latency bookkeeping of one topic.
+    Received sequence numbers are kept in a bitmap, so that duplicates
+    and late (out-of-order) arrivals which fill a gap can be told apart.
+    The bitmap covers the last SEQUENCE_WINDOW sequence numbers below the
+    highest one, older arrivals can't be checked and count as duplicates.
+    """
+    __slots__ = ("received", "unique", "duplicated", "out_of_order",
+                 "highest_sequence", "latency", "_seen", "_base")
+
+    def __init__(self):
+        self.received = 0
+        self.unique = 0
+        self.duplicated = 0
+        self.out_of_order = 0
+        self.highest_sequence = 0
+        self.latency = LatencyHistogram()
+        # bit n of the bitmap is sequence number _base + n, _base is a multiple of 8
+        self._seen = bytearray()
+        self._base = 0
+
+    @property
+    def lost(self):
+        """
+        Number of messages missing below the highest received sequence number.
+        """
+        return self.highest_sequence - self.unique
+
+    def _rebase(self, base):
+        """ Move start of the bitmap up to sequence number `base` (multiple of 8) """
+        drop = (base - self._base) // 8
+        if drop > 0:
+            del self._seen[:drop]
+            self._base = base
+
+    def record(self, sequence, latency_us):
+        """
+        Register one received message.
+
+        Args:
+            sequence (int): sequence number stamped by player (starts with 1),
+                            None if message wasn't stamped
+            latency_us (float): latency in microseconds or None
+        """
+        self.received += 1
+        if sequence is None or sequence < 1:
+            return
+
+        offset = sequence - self._base
+        if offset < 0:
+            # below the window, a duplicate can't be told from a late arrival
+            self.duplicated += 1
+            return
+        byte_index, bit = divmod(offset, 8)
+        if byte_index >= len(self._seen):
+            if byte_index >= _WINDOW_BYTES:
+                # slide by a quarter window at least, bytes are moved rarely
+                self._rebase(self._base + 8 * max(byte_index - _WINDOW_BYTES + 1,
+                                                  _WINDOW_BYTES // 4))
+                byte_index = (sequence - self._base) // 8
+            if byte_index >= len(self._seen):
+                self._seen.extend(bytes(min(byte_index + 64, _WINDOW_BYTES) - len(self._seen)))
+        if self._seen[byte_index] & (1 << bit):
+            self.duplicated += 1
+            return
+        self._seen[byte_index] |= 1 << bit
+        self.unique += 1
+
+        if sequence < self.highest_sequence:
+            self.out_of_order += 1
+        else:
+            self.highest_sequence = sequence
+
+        if latency_us is not None:
+            self.latency.record(latency_us)
+
+    def merge(self, other):
+        """
+        Add statistics of the same topic received over another connection.
+        Sequence numbers seen by both are counted as duplicates.
+        """
+        end = max(self._base + 8 * len(self._seen), other._base + 8 * len(other._seen))
+        base = max(self._base, other._base, end - 8 * _WINDOW_BYTES)
+        self._rebase(base)
+        if (end - base) // 8 > len(self._seen):
+            self._seen.extend(bytes((end - base) // 8 - len(self._seen)))
+        # bytes of other below the common window are dropped
+        shift = (other._base - base) // 8
+        overlap = 0
+        for other_index in range(max(-shift, 0), len(other._seen)):
+            other_byte = other._seen[other_index]
+            if other_byte:
+                byte_index = other_index + shift
+                overlap += bin(self._seen[byte_index] & other_byte).count("1")
+                self._seen[byte_index] |= other_byte
+
+        self.received += other.received
+        self.unique += other.unique - overlap
+        self.duplicated += other.duplicated + overlap
+        self.out_of_order += other.out_of_order
+        self.highest_sequence = max(self.highest_sequence, other.highest_sequence)
+        self.latency.merge(other.latency)
+
+
+class RateStats:
+    """
+    Inter-arrival statistics of all topics in arrays indexed by topic id.
+    Gap sums are kept in seconds to calculate mean and standard deviation
+    of the time between two messages of a topic.
+    """
+    __slots__ = ("expected_rates", "counts", "first_ns", "last_ns",
+                 "gaps", "gap_sum", "gap_square_sum", "max_gap")
+
+    def __init__(self, expected_rates):
+        """
+        Args:
+            expected_rates (list): expected messages per second by topic id,
+                                   0.0 if unknown
+        """
+        topics_amount = len(expected_rates)
+        self.expected_rates = array("d", expected_rates)
+        self.counts = array("Q", bytes(8 * topics_amount))
+        self.first_ns = array("q", bytes(8 * topics_amount))
+        self.last_ns = array("q", bytes(8 * topics_amount))
+        self.gaps = array("Q", bytes(8 * topics_amount))
+        self.gap_sum = array("d", bytes(8 * topics_amount))
+        self.gap_square_sum = array("d", bytes(8 * topics_amount))
+        self.max_gap = array("d", bytes(8 * topics_amount))
+
+    def record(self, topic_id, receive_time_ns):
+        """
+        Register arrival of one message of a topic.
+        """
+        count = self.counts[topic_id]
+        if count == 0:
+            self.first_ns[topic_id] = receive_time_ns
+        else:
+            gap = (receive_time_ns - self.last_ns[topic_id]) / 1e9
+            self.gaps[topic_id] += 1
+            self.gap_sum[topic_id] += gap
+            self.gap_square_sum[topic_id] += gap * gap
+            if gap > self.max_gap[topic_id]:
+                self.max_gap[topic_id] = gap
+        self.last_ns[topic_id] = receive_time_ns
+        self.counts[topic_id] = count + 1
+
+    def merge(self, other):
+        """
+        Add statistics received over another connection.
+        Gaps are measured per connection, with a topic received over several
+        connections (shared subscription) they are longer than between all messages.
+        """
+        for topic_id, count in enumerate(other.counts):
+            if count == 0:
+                continue
+            if self.counts[topic_id] == 0:
+                self.first_ns[topic_id] = other.first_ns[topic_id]
+                self.last_ns[topic_id] = other.last_ns[topic_id]
+            else:
+                self.first_ns[topic_id] = min(self.first_ns[topic_id], other.first_ns[topic_id])
+                self.last_ns[topic_id] = max(self.last_ns[topic_id], other.last_ns[topic_id])
+            self.counts[topic_id] += count
+            self.gaps[topic_id] += other.gaps[topic_id]
+            self.gap_sum[topic_id] += other.gap_sum[topic_id]
+            self.gap_square_sum[topic_id] += other.gap_square_sum[topic_id]
+            self.max_gap[topic_id] = max(self.max_gap[topic_id], other.max_gap[topic_id])
+
+    def observed_rate(self, topic_id):
+        """
+        Return received messages per second of a topic, None if less than 2 messages.
+        """
+        count = self.counts[topic_id]
+        duration = (self.last_ns[topic_id] - self.first_ns[topic_id]) / 1e9
+        if count < 2 or duration <= 0.0:
+            return None
+        return (count - 1) / duration
+
+    def rate_status(self, topic_id, tolerance):
+        """
+        Compare observed with expected rate of a topic.
+
+        Args:
+            topic_id (int): topic id
+            tolerance (float): allowed relative deviation, e.g. 0.1 for 10 %
+
+        Returns:
+            status (str): OK, UNDER_RATE, OVER_RATE or '' if unknown
+        """
+        expected_rate = self.expected_rates[topic_id]
+        observed_rate = self.observed_rate(topic_id)
+        if expected_rate <= 0.0 or observed_rate is None:
+            return ''
+        if observed_rate < expected_rate * (1.0 - tolerance):
+            return 'UNDER_RATE'
+        if observed_rate > expected_rate * (1.0 + tolerance):
+            return 'OVER_RATE'
+        return 'OK'
+
+    def gap_stats(self, topic_id):
+        """
+        Return mean, standard deviation and maximum of gaps between messages
+        of a topic in seconds, None values if less than 2 messages.
+        """
+        gaps = self.gaps[topic_id]
+        if gaps < 1:
+            return None, None, None
+        mean = self.gap_sum[topic_id] / gaps
+        variance = max(self.gap_square_sum[topic_id] / gaps - mean * mean, 0.0)
+        return mean, variance ** 0.5, self.max_gap[topic_id]
@@ -0,0 +1,12 @@
+"""
+Shared MQTT client layer and trace file formats of message player and message tester.
+"""
+
+from mqtt_common.async_client import AsyncMqttClient, MqttConnectError, Subscription
+from mqtt_common.metrics import MetricsRegistry, serve_metrics
+from mqtt_common.publish_pipeline import PublishPipeline
+from mqtt_common.stamps import STAMP_SEQUENCE, STAMP_TIMESTAMP, STAMP_TRACE_TIME, \
+                               read_stamp, read_trace_time, stamp_clock, stamp_properties
+from mqtt_common.trace_definition import GENERATOR_KEY, TopicTable, TraceDefinitionError, \
+                                         read_trace_definition, strip_generators
+from mqtt_common.trace_file import TraceFormatError, TraceReader, TraceWriter
@@ -0,0 +1,619 @@
+"""
+asyncio MQTT client based on paho-mqtt.
+
+The paho client doesn't run its own network thread: its socket is registered
+in the asyncio event loop (add_reader/add_writer), so all paho callbacks run
+in the event loop thread and no thread hand-offs between paho and the
+application are necessary.
+
+- `publish` returns when the message is acknowledged (PUBACK/PUBCOMP for
+  QoS 1/2, written to the socket for QoS 0), `publish_nowait` only queues it.
+- `subscribe` returns a Subscription, an async iterator over received messages
+  with a bounded queue. A full queue doesn't overwrite silently, dropped
+  messages are counted per subscription and logged. Messages are dispatched
+  by a dict of exact topics, which also lists the wildcard subscriptions
+  matching each topic, only other topics are matched in the filter trie of
+  paho (MQTTMatcher).
+- With a session expiry interval the client starts a clean MQTTv5 session
+  on the first connect only. After an unexpected disconnect it reconnects
+  in a background task with exponential backoff and resumes the session
+  (broker keeps subscriptions and queued QoS 1/2 messages, paho resends
+  unacknowledged publishes); if the session expired, topics are subscribed
+  again. Outages are counted and measured.
+- `request` publishes a message with MQTTv5 response topic and correlation
+  data and returns the payload of the response, `respond` answers such a
+  request. Responses arrive on `<client id>/response`.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from paho.mqtt import client as mqtt_client
+from paho.mqtt.matcher import MQTTMatcher
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.reasoncodes import ReasonCode
+
+
+LOGGER = logging.getLogger(__name__)
+
+# queue overflow policies of subscriptions
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+# interval in seconds of paho housekeeping (keepalive, retries)
+MISC_INTERVAL = 1.0
+
+# random factor applied to reconnect delays, spreads reconnects of many clients
+RECONNECT_JITTER = 0.2
+
+# topic level appended to the client id for responses to requests
+RESPONSE_LEVEL = "response"
+
+
+class MqttConnectError(Exception):
+    """ Connection to the MQTT broker failed or was refused """
+
+
+def _matching_filter(topic_filter):
+    """
+    Return filter used to match topics of a subscription,
+    shared subscriptions `$share/<group>/<filter>` match with <filter>.
+    """
+    if topic_filter.startswith("$share/"):
+        return topic_filter.split("/", 2)[2]
+    return topic_filter
+
+
+def _is_wildcard(topic_filter):
+    return "+" in topic_filter or "#" in topic_filter
+
+
+def _remove_from(subscriptions, subscription):
+    """ Remove all entries of subscription from a list of subscriptions """
+    subscriptions[:] = [other for other in subscriptions if other is not subscription]
+
+
+class Subscription:
+    """
+    Received messages of one or several topic filters in a bounded queue.
+    Iterate with `async for message in subscription`.
+    """
+    def __init__(self, filters, maxsize, overflow=DROP_OLDEST):
+        """
+        Args:
+            filters (list): subscribed topic filters
+            maxsize (int): maximum number of queued messages
+            overflow (str): `drop_oldest` or `drop_newest` if queue is full
+        """
+        if overflow not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.filters = list(filters)
+        self.overflow = overflow
+        # number of messages dropped because of full queue
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+    async def get(self):
+        """ Wait for next received message """
+        return await self._queue.get()
+
+    def qsize(self):
+        """ Number of queued messages """
+        return self._queue.qsize()
+
+    def put_message(self, message):
+        """
+        Queue received message, applying the overflow policy if queue is full.
+        """
+        try:
+            self._queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            LOGGER.warning("Subscription queue %s full, %s messages dropped",
+                           self.filters[:3], self.dropped)
+        if self.overflow == DROP_OLDEST:
+            self._queue.get_nowait()
+            self._queue.put_nowait(message)
+
+
+class AsyncMqttClient:
+    """
+    MQTTv5 client integrated into the asyncio event loop.
+    """
+    def __init__(self, client_id, host, port, username=None, password=None,
+                 keepalive=60, session_expiry=0, reconnect_delay=0.5,
+                 max_reconnect_delay=30.0):
+        """
+        Args:
+            client_id (str): mqtt client id
+            host (str): broker host name
+            port (int): broker port
+            username (str): broker user name or None
+            password (str): broker password or None
+            keepalive (int): keepalive interval in seconds
+            session_expiry (int): seconds the broker keeps the session after
+                                  a disconnect, 0 for a clean session on every connect
+            reconnect_delay (float): delay in seconds before the first reconnect
+                                     attempt, doubled after every failed attempt
+            max_reconnect_delay (float): maximum delay between reconnect attempts
+        """
+        self.client_id = client_id
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.session_expiry = session_expiry
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max(max_reconnect_delay, reconnect_delay)
+
+        self.client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2,
+                                         client_id, protocol=mqtt_client.MQTTv5)
+        if username is not None:
+            self.client.username_pw_set(username, password)
+
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.client.on_publish = self._on_publish
+        self.client.on_subscribe = self._on_subscribe
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        self._loop = None
+        self._misc_task = None
+        self._connected = None
+        self._connect_result = None
+        # futures waiting for acknowledge by message id
+        self._pending_publishes = {}
+        self._pending_subscribes = {}
+        # subscriptions by exact topic, including the wildcard subscriptions
+        # matching the topic, and subscriptions by wildcard filter in a trie
+        self._exact_subscriptions = {}
+        self._wildcard_subscriptions = MQTTMatcher()
+        # (filters, qos) of all subscribe calls, subscribed again if the session is lost
+        self._subscribed = []
+        # futures waiting for the response of a request by correlation data
+        self._response_topic = None
+        self._response_lock = asyncio.Lock()
+        self._pending_requests = {}
+        self._request_no = 0
+
+        # reconnect after unexpected disconnects (not after `disconnect`)
+        self._was_connected = False
+        self._closing = False
+        self._reconnect_task = None
+        self._disconnect_time = None
+        # True if the broker resumed the previous session on the last connect
+        self.session_present = False
+        # number of reconnects, duration of the last outage and of all outages in seconds
+        self.reconnects = 0
+        self.last_outage = 0.0
+        self.outage_seconds = 0.0
+
+        # optional hooks: function(mid) called when a message is acknowledged
+        # (written to the socket for QoS 0), function() called on disconnect,
+        # function(outage_seconds) called after a reconnect
+        self.publish_ack_callback = None
+        self.disconnect_callback = None
+        self.reconnect_callback = None
+        # messages queued by paho and acknowledged (written for QoS 0), the
+        # queue and in-flight counters of paho itself are not public
+        self._published_count = 0
+        self._acknowledged_count = 0
+
+    @property
+    def is_connected(self):
+        """ True if connection to the broker is established """
+        return self.client.is_connected()
+
+    @property
+    def disconnected_time(self):
+        """ Seconds since the connection was lost, 0.0 if connected """
+        if self._disconnect_time is None:
+            return 0.0
+        return time.monotonic() - self._disconnect_time
+
+    @property
+    def unacknowledged_messages(self):
+        """ Number of published messages not acknowledged yet (QoS 0: not written) """
+        return self._published_count - self._acknowledged_count
+
+    @property
+    def queued_messages(self):
+        """ Number of packets in paho outgoing queue (not yet written to the socket),
+        unacknowledged messages if paho doesn't expose its queue """
+        out_packet = getattr(self.client, "_out_packet", None)
+        if out_packet is None:
+            return self.unacknowledged_messages
+        return len(out_packet)
+
+    @property
+    def inflight_messages(self):
+        """ Number of QoS 1/2 messages waiting for acknowledge,
+        unacknowledged messages if paho doesn't expose its counter """
+        inflight = getattr(self.client, "_inflight_messages", None)
+        if not isinstance(inflight, int):
+            return self.unacknowledged_messages
+        return inflight
+
+    async def connect(self, timeout=10.0):
+        """
+        Connect to the broker and wait for CONNACK.
+
+        Raises:
+            MqttConnectError: connection failed, refused or timed out
+        """
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        properties = None
+        clean_start = True
+        if self.session_expiry > 0:
+            properties = Properties(PacketTypes.CONNECT)
+            properties.SessionExpiryInterval = self.session_expiry
+            # stale session of a previous run is dropped, reconnects resume the session
+            clean_start = mqtt_client.MQTT_CLEAN_START_FIRST_ONLY
+        await self._wait_connack(lambda: self.client.connect(self.host, self.port,
+                                                             self.keepalive,
+                                                             clean_start=clean_start,
+                                                             properties=properties),
+                                 timeout)
+
+    async def _wait_connack(self, open_connection, timeout=10.0):
+        """
+        Open connection to the broker and wait for CONNACK.
+
+        Raises:
+            MqttConnectError: connection failed, refused or timed out
+        """
+        self._connected = asyncio.Event()
+        self._connect_result = None
+        try:
+            open_connection()
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except (OSError, asyncio.TimeoutError) as err:
+            raise MqttConnectError(f"Connection to {self.host}:{self.port} failed: {err!r}") from err
+        if self._connect_result != 0:
+            raise MqttConnectError(f"Connection refused: {self._connect_result}")
+
+    async def connect_retry(self, timeout=10.0):
+        """
+        Connect to the broker, retry with exponential backoff until connected.
+        """
+        delay = self.reconnect_delay
+        while True:
+            try:
+                LOGGER.info("Connecting to MQTT broker...")
+                await self.connect(timeout)
+                return
+            except MqttConnectError as err:
+                LOGGER.info("Connection to MQTT broker failed: %s, retry in %s s",
+                            err, round(delay, 2))
+            await asyncio.sleep(delay * random.uniform(1.0 - RECONNECT_JITTER,
+                                                       1.0 + RECONNECT_JITTER))
+            delay = min(delay * 2.0, self.max_reconnect_delay)
+
+    async def disconnect(self, publish_will=False):
+        """
+        Disconnect from the broker.
+
+        Args:
+            publish_will (bool): broker publishes the will message (MQTTv5)
+        """
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        reason_code = None
+        if publish_will:
+            reason_code = ReasonCode(PacketTypes.DISCONNECT, "Disconnect with will message")
+        self.client.disconnect(reasoncode=reason_code)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+
+    def publish_nowait(self, topic, payload, qos=0, retain=False, properties=None):
+        """
+        Queue message for publishing without waiting for acknowledge.
+
+        Returns:
+            message_info (MQTTMessageInfo): paho message info with `mid`
+        """
+        message_info = self.client.publish(topic, payload, qos=qos, retain=retain,
+                                           properties=properties)
+        if message_info.rc == mqtt_client.MQTT_ERR_SUCCESS \
+            or (message_info.rc == mqtt_client.MQTT_ERR_NO_CONN and qos > 0):
+            self._published_count += 1
+        return message_info
+
+    def publish_tracked(self, topic, payload, qos=0, retain=False, properties=None):
+        """
+        Queue message for publishing and return future of its acknowledge.
+
+        Returns:
+            future (asyncio.Future): resolved when message is acknowledged
+        """
+        future = self._loop.create_future()
+        message_info = self.publish_nowait(topic, payload, qos, retain, properties)
+        if message_info.rc != mqtt_client.MQTT_ERR_SUCCESS \
+            and not (message_info.rc == mqtt_client.MQTT_ERR_NO_CONN and qos > 0):
+            # QoS 0 messages are not queued by paho while disconnected
+            future.set_exception(
+                MqttConnectError(mqtt_client.error_string(message_info.rc)))
+        elif message_info.is_published():
+            future.set_result(message_info.mid)
+        else:
+            self._pending_publishes[message_info.mid] = future
+        return future
+
+    async def publish(self, topic, payload, qos=0, retain=False, properties=None):
+        """
+        Publish message and wait until it is acknowledged.
+        """
+        await self.publish_tracked(topic, payload, qos, retain, properties)
+
+    async def subscribe(self, filters, qos=0, maxsize=1000, overflow=DROP_OLDEST):
+        """
+        Subscribe to topic filters (one SUBSCRIBE packet) and wait for SUBACK.
+
+        Args:
+            filters (str or list): topic filter or list of topic filters
+            qos (int): maximum QoS of received messages
+            maxsize (int): maximum number of queued messages of the subscription
+            overflow (str): `drop_oldest` or `drop_newest` if queue is full
+
+        Returns:
+            subscription (Subscription): async iterator of received messages
+        """
+        if isinstance(filters, str):
+            filters = [filters]
+        subscription = Subscription(filters, maxsize, overflow)
+        self.add_subscription(subscription)
+        self._subscribed.append((list(filters), qos))
+
+        future = self._loop.create_future()
+        result, mid = self.client.subscribe([(topic_filter, qos) for topic_filter in filters])
+        if result != mqtt_client.MQTT_ERR_SUCCESS:
+            self.remove_subscription(subscription)
+            raise MqttConnectError(mqtt_client.error_string(result))
+        self._pending_subscribes[mid] = future
+        await future
+        return subscription
+
+    async def request(self, topic, payload, timeout=5.0, qos=1):
+        """
+        Publish request with response topic and correlation data, wait for the response.
+
+        Args:
+            topic (str): request topic
+            payload (str or bytes): request payload
+            timeout (float): maximum time in seconds to wait for the response
+            qos (int): QoS of request and response
+
+        Returns:
+            payload (bytes): payload of the response
+
+        Raises:
+            asyncio.TimeoutError: no response within timeout
+            MqttConnectError: not connected or subscription of responses refused
+        """
+        async with self._response_lock:
+            if self._response_topic is None:
+                # responses are subscribed with the first request and
+                # passed to the waiting requests instead of a subscription queue
+                response_topic = f"{self.client_id}/{RESPONSE_LEVEL}"
+                self.remove_subscription(await self.subscribe(response_topic, qos))
+                self._response_topic = response_topic
+
+        self._request_no += 1
+        correlation_data = str(self._request_no).encode("ascii")
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.ResponseTopic = self._response_topic
+        properties.CorrelationData = correlation_data
+        future = self._loop.create_future()
+        self._pending_requests[correlation_data] = future
+        try:
+            await self.publish(topic, payload, qos, properties=properties)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending_requests.pop(correlation_data, None)
+
+    def respond(self, request, payload, qos=1):
+        """
+        Publish response to a request received with response topic.
+
+        Args:
+            request (MQTTMessage): received request
+            payload (str or bytes): response payload
+            qos (int): QoS of the response
+
+        Returns:
+            responded (bool): False if the request has no response topic
+        """
+        request_properties = request.properties
+        response_topic = getattr(request_properties, "ResponseTopic", None)
+        if not response_topic:
+            return False
+        properties = Properties(PacketTypes.PUBLISH)
+        correlation_data = getattr(request_properties, "CorrelationData", None)
+        if correlation_data is not None:
+            properties.CorrelationData = correlation_data
+        self.publish_nowait(response_topic, payload, qos=qos, properties=properties)
+        return True
+
+    def add_subscription(self, subscription):
+        """ Dispatch received messages matching filters of subscription to it """
+        for topic_filter in subscription.filters:
+            topic_filter = _matching_filter(topic_filter)
+            if not _is_wildcard(topic_filter):
+                subscriptions = self._exact_subscriptions.get(topic_filter)
+                if subscriptions is None:
+                    subscriptions = [other for others in
+                                     self._wildcard_subscriptions.iter_match(topic_filter)
+                                     for other in others]
+                    self._exact_subscriptions[topic_filter] = subscriptions
+                subscriptions.append(subscription)
+                continue
+
+            try:
+                self._wildcard_subscriptions[topic_filter].append(subscription)
+            except KeyError:
+                self._wildcard_subscriptions[topic_filter] = [subscription]
+            # exact topics matching the filter are dispatched without the trie
+            matcher = MQTTMatcher()
+            matcher[topic_filter] = True
+            for topic, subscriptions in self._exact_subscriptions.items():
+                if next(matcher.iter_match(topic), False):
+                    subscriptions.append(subscription)
+
+    def remove_subscription(self, subscription):
+        """ Stop dispatching messages to subscription (no UNSUBSCRIBE is sent) """
+        wildcard = False
+        for topic_filter in subscription.filters:
+            topic_filter = _matching_filter(topic_filter)
+            if not _is_wildcard(topic_filter):
+                subscriptions = self._exact_subscriptions.get(topic_filter)
+                if subscriptions is not None:
+                    _remove_from(subscriptions, subscription)
+                    if not subscriptions:
+                        del self._exact_subscriptions[topic_filter]
+                continue
+            wildcard = True
+            try:
+                subscriptions = self._wildcard_subscriptions[topic_filter]
+            except KeyError:
+                continue
+            _remove_from(subscriptions, subscription)
+            if not subscriptions:
+                del self._wildcard_subscriptions[topic_filter]
+        if wildcard:
+            for subscriptions in self._exact_subscriptions.values():
+                _remove_from(subscriptions, subscription)
+
+    async def _reconnect_loop(self):
+        """
+        Reconnect after an unexpected disconnect with exponential backoff,
+        subscribe again if the broker didn't resume the session.
+        """
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay * random.uniform(1.0 - RECONNECT_JITTER,
+                                                       1.0 + RECONNECT_JITTER))
+            try:
+                # connect parameters (and clean start on first connect only) are kept
+                await self._wait_connack(self.client.reconnect)
+            except MqttConnectError as err:
+                delay = min(delay * 2.0, self.max_reconnect_delay)
+                LOGGER.info("Reconnect to MQTT broker failed: %s, retry in %s s",
+                            err, round(delay, 2))
+                continue
+            break
+
+        outage = self.disconnected_time
+        self._disconnect_time = None
+        self._reconnect_task = None
+        self.reconnects += 1
+        self.last_outage = outage
+        self.outage_seconds += outage
+        LOGGER.warning("Reconnected to MQTT Broker after %s s, session resumed: %s",
+                       round(outage, 3), self.session_present)
+        if not self.session_present:
+            for filters, qos in self._subscribed:
+                # SUBACK is not awaited, the dispatching of subscriptions is kept
+                self.client.subscribe([(topic_filter, qos) for topic_filter in filters])
+        if self.reconnect_callback is not None:
+            self.reconnect_callback(outage)
+
+    # ===== paho callbacks, executed in the event loop =====
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        self._connect_result = reason_code
+        if reason_code == 0:
+            self._was_connected = True
+            self.session_present = flags.session_present
+            LOGGER.info("Connected to MQTT Broker as %s", self.client_id)
+        else:
+            LOGGER.error("Failed to connect to MQTT Broker: %s", reason_code)
+        if self._connected is not None:
+            self._connected.set()
+
+    def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
+        LOGGER.warning("Disconnected from MQTT Broker: %s", reason_code)
+        error = MqttConnectError(f"Disconnected: {reason_code}")
+        for future in self._pending_subscribes.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending_subscribes.clear()
+        if self.disconnect_callback is not None:
+            self.disconnect_callback()
+        if self._was_connected and not self._closing and self._reconnect_task is None:
+            self._disconnect_time = time.monotonic()
+            self._reconnect_task = self._loop.create_task(self._reconnect_loop())
+
+    def _on_message(self, client, userdata, message):
+        if message.topic == self._response_topic:
+            future = self._pending_requests.get(
+                getattr(message.properties, "CorrelationData", None))
+            if future is not None and not future.done():
+                future.set_result(message.payload)
+            return
+        subscriptions = self._exact_subscriptions.get(message.topic)
+        if subscriptions is None:
+            for subscriptions in self._wildcard_subscriptions.iter_match(message.topic):
+                for subscription in subscriptions:
+                    subscription.put_message(message)
+            return
+        for subscription in subscriptions:
+            subscription.put_message(message)
+
+    def _on_publish(self, client, userdata, mid, reason_code, properties):
+        self._acknowledged_count += 1
+        future = self._pending_publishes.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(mid)
+        if self.publish_ack_callback is not None:
+            self.publish_ack_callback(mid)
+
+    def _on_subscribe(self, client, userdata, mid, reason_code_list, properties):
+        future = self._pending_subscribes.pop(mid, None)
+        if future is None or future.done():
+            return
+        failures = [reason_code for reason_code in reason_code_list
+                    if reason_code.is_failure]
+        if failures:
+            future.set_exception(MqttConnectError(f"Subscription refused: {failures}"))
+        else:
+            future.set_result(mid)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._loop.add_reader(sock, client.loop_read)
+        self._misc_task = self._loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._loop.remove_writer(sock)
+
+    async def _misc_loop(self):
+        while self.client.loop_misc() == mqtt_client.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(MISC_INTERVAL)
@@ -0,0 +1,164 @@
+"""
+Logging of message player and message tester off the hot paths.
+
+Log records are put on a queue by the logging thread and formatted and
+written to the stream by a background thread (QueueListener), so a log call
+costs the creation of a record only. Arguments of log calls are formatted
+later in the background thread and must not be modified after the call.
+Events which can occur for every message are not logged one by one:
+LogSummary counts them per key and logs one summary line per interval,
+RateLimitedLog logs at most `burst` lines per interval and the number of
+suppressed lines with the next logged one.
+"""
+
+import atexit
+import logging
+import multiprocessing.util
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler which leaves formatting of records to the listener thread.
+    """
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            # traceback objects must not leave the logging thread
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stop_listener(listener):
+    """ Write remaining records and stop the listener thread (once) """
+    if listener._thread is not None:
+        listener.stop()
+
+
+def _finalize_in_worker(queue_handler):
+    # worker processes of multiprocessing exit without atexit handlers
+    multiprocessing.util.Finalize(None, _stop_listener, (queue_handler.listener,),
+                                  exitpriority=0)
+
+
+def configure_logging(log_format, level=logging.INFO):
+    """
+    Configure the root logger to write records to stderr from a background thread.
+    Forked worker processes start their own background thread.
+
+    Args:
+        log_format (str): format of log lines
+        level (int): level of the root logger
+
+    Returns:
+        listener (QueueListener): started listener, stopped at exit
+    """
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(log_format))
+    queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+    listener = QueueListener(queue_handler.queue, stream_handler)
+    queue_handler.listener = listener
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    listener.start()
+    # remaining records are written before exit
+    atexit.register(_stop_listener, listener)
+
+    def restart_in_child():
+        # the listener thread doesn't exist in a forked process
+        queue_handler.queue = queue.SimpleQueue()
+        queue_handler.listener = QueueListener(queue_handler.queue, stream_handler)
+        queue_handler.listener.start()
+        atexit.register(_stop_listener, queue_handler.listener)
+
+    os.register_at_fork(after_in_child=restart_in_child)
+    # runs after multiprocessing has cleared the finalizers of the parent
+    multiprocessing.util.register_after_fork(queue_handler, _finalize_in_worker)
+    return listener
+
+
+class LogSummary:
+    """
+    Counts events per key (e.g. topic) and logs the counts once per interval.
+    """
+    def __init__(self, logger, message, interval=10.0, max_keys=10, clock=time.monotonic):
+        """
+        Args:
+            logger (logging.Logger): logger of the summary lines
+            message (str): description of the events, e.g. `Unhandled topics received`
+            interval (float): seconds between summary lines, 0 logs every event
+            max_keys (int): number of keys with most events listed in a summary
+            clock (callable): time in seconds
+        """
+        self.logger = logger
+        self.message = message
+        self.interval = interval
+        self.max_keys = max_keys
+        self._clock = clock
+        self._counts = {}
+        self._start_time = clock()
+
+    def count(self, key):
+        """ Count one event, log the summary when the interval has passed """
+        counts = self._counts
+        counts[key] = counts.get(key, 0) + 1
+        if self._clock() - self._start_time >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """ Log counts of the current interval (if any) and start a new interval """
+        now = self._clock()
+        if self._counts:
+            top = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+            self.logger.info("%s: %s in %s keys within %s s, most frequent: %s",
+                             self.message, sum(self._counts.values()), len(self._counts),
+                             round(now - self._start_time, 1), top[:self.max_keys])
+            self._counts = {}
+        self._start_time = now
+
+
+class RateLimitedLog:
+    """
+    Logs at most `burst` lines per interval, further lines are counted
+    and reported with the first line of the next interval.
+    """
+    def __init__(self, logger, burst=10, interval=10.0, clock=time.monotonic):
+        """
+        Args:
+            logger (logging.Logger): logger of the lines
+            burst (int): maximum number of lines per interval, 0 logs every line
+            interval (float): length of an interval in seconds
+            clock (callable): time in seconds
+        """
+        self.logger = logger
+        self.burst = burst
+        self.interval = interval
+        self._clock = clock
+        self._start_time = clock()
+        self._logged = 0
+        # lines suppressed in the current interval
+        self.suppressed = 0
+
+    def info(self, message, *args):
+        """ Log line at INFO level unless the limit of the interval is reached """
+        if self.burst > 0 and self._logged >= self.burst:
+            now = self._clock()
+            if now - self._start_time < self.interval:
+                self.suppressed += 1
+                return
+            self._start_time = now
+            self._logged = 0
+        self.flush()
+        self._logged += 1
+        self.logger.info(message, *args, stacklevel=2)
+
+    def flush(self):
+        """ Log the number of suppressed lines (if any) """
+        if self.suppressed:
+            self.logger.info("%s similar log lines suppressed", self.suppressed)
+            self.suppressed = 0
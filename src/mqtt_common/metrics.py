@@ -0,0 +1,212 @@
+"""
+OpenMetrics instrumentation of message player and message tester.
+
+Hot paths only update plain counters, arrays and histograms owned by the
+instrumented objects (everything runs in one event loop thread, no locks).
+Collectors registered in MetricsRegistry read these values when metrics are
+rendered, which happens only on a scrape of the HTTP endpoint or when the
+metrics are published to the MQTT metrics topic.
+Durations in hot paths are measured only for every SAMPLE_EVERY-th call.
+"""
+
+import asyncio
+import logging
+import math
+from array import array
+from bisect import bisect_left
+
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# durations are measured for every 16th call (mask of the call counter)
+SAMPLE_EVERY = 16
+SAMPLE_MASK = SAMPLE_EVERY - 1
+
+# histogram buckets of durations in seconds, 1 us .. 1 s
+DURATION_BUCKETS = tuple(factor * 10.0 ** exponent
+                         for exponent in range(-6, 0)
+                         for factor in (1.0, 2.5, 5.0)) + (1.0,)
+
+
+class Histogram:
+    """
+    Histogram with fixed bucket upper bounds.
+    """
+    __slots__ = ("bounds", "counts", "total", "sum")
+
+    def __init__(self, bounds=DURATION_BUCKETS):
+        self.bounds = tuple(bounds)
+        # last bucket collects values above the highest bound (+Inf)
+        self.counts = array("Q", bytes(8 * (len(self.bounds) + 1)))
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """ Add one value to the histogram """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def percentile(self, percent):
+        """
+        Return upper bound of the bucket containing the given percentile,
+        None if the histogram is empty (inf for values above the highest bound).
+        """
+        if self.total == 0:
+            return None
+        rank = self.total * percent / 100.0
+        cumulated = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulated += count
+            if count and cumulated >= rank:
+                return bound
+        return math.inf
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\")
+                                                          .replace('"', '\\"')
+                                                          .replace("\n", "\\n"))
+                          for name, value in labels.items()) + "}"
+
+
+class MetricFamily:
+    """
+    Metric with its samples in OpenMetrics text format.
+    """
+    __slots__ = ("name", "metric_type", "help_text", "lines")
+
+    def __init__(self, name, metric_type, help_text):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.lines = []
+
+    def add_sample(self, value, labels=None, suffix=""):
+        """ Add sample with optional labels, counters get suffix `_total` """
+        if self.metric_type == "counter" and not suffix:
+            suffix = "_total"
+        self.lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return self
+
+    def add_histogram(self, histogram, labels=None):
+        """ Add buckets, count and sum of a Histogram """
+        labels = dict(labels or {})
+        cumulated = 0
+        for bound, count in zip(histogram.bounds + (math.inf,), histogram.counts):
+            cumulated += count
+            self.add_sample(cumulated, dict(labels, le=_format_value(float(bound))), "_bucket")
+        self.add_sample(histogram.total, labels, "_count")
+        self.add_sample(histogram.sum, labels, "_sum")
+        return self
+
+    def render(self):
+        """ Return metric in OpenMetrics text format """
+        return "\n".join([f"# TYPE {self.name} {self.metric_type}",
+                          f"# HELP {self.name} {self.help_text}"] + self.lines)
+
+
+def counter(name, help_text, value=None, labels=None):
+    """ Return counter family, with one sample if value is given """
+    family = MetricFamily(name, "counter", help_text)
+    return family if value is None else family.add_sample(value, labels)
+
+
+def gauge(name, help_text, value=None, labels=None):
+    """ Return gauge family, with one sample if value is given """
+    family = MetricFamily(name, "gauge", help_text)
+    return family if value is None else family.add_sample(value, labels)
+
+
+def histogram(name, help_text, values=None, labels=None):
+    """ Return histogram family, with samples of a Histogram if given """
+    family = MetricFamily(name, "histogram", help_text)
+    return family if values is None else family.add_histogram(values, labels)
+
+
+class MetricsRegistry:
+    """
+    Collectors of an app, rendered together in OpenMetrics text format.
+    """
+    def __init__(self):
+        self._collectors = []
+
+    def add_collector(self, collector):
+        """
+        Args:
+            collector (callable): function returning list of MetricFamily
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """ Return all metrics in OpenMetrics text format """
+        families = []
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as err:  # metrics must not break the app
+                LOGGER.warning("Metrics collector %s failed: %r", collector, err)
+        return "\n".join([family.render() for family in families] + ["# EOF", ""])
+
+
+async def _handle_http(registry, reader, writer):
+    try:
+        request_line = await reader.readline()
+        # ignore request headers
+        while (await reader.readline()).strip():
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, content_type = "200 OK", CONTENT_TYPE
+            body = registry.render().encode("utf-8")
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"Not Found\n"
+        writer.write((f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+                     .encode("latin-1") + body)
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(registry, port=0, mqtt_client=None, topic="", interval=5.0):
+    """
+    Serve metrics on http://<host>:<port>/metrics and publish them
+    every `interval` seconds to an MQTT topic, until cancelled.
+
+    Args:
+        registry (MetricsRegistry): metrics of the app
+        port (int): HTTP port, 0 disables the endpoint
+        mqtt_client (AsyncMqttClient): connected client to publish metrics
+        topic (str): MQTT metrics topic, empty disables publishing
+        interval (float): publish interval in seconds
+    """
+    server = None
+    if port:
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle_http(registry, reader, writer), port=port)
+        LOGGER.info("Metrics endpoint on port %s", port)
+    try:
+        if mqtt_client is not None and topic:
+            while True:
+                await asyncio.sleep(interval)
+                mqtt_client.publish_nowait(topic, registry.render())
+        elif server is not None:
+            await server.serve_forever()
+    finally:
+        if server is not None:
+            server.close()
@@ -0,0 +1,315 @@
+"""
+Publish pipeline with QoS, in-flight window and bounded queue.
+
+Messages are handed to paho only while fewer than `max_inflight` messages
+are unacknowledged (PUBACK/PUBCOMP for QoS 1/2, written to the socket for
+QoS 0), so paho's own outgoing queue can't grow without limit.
+Further messages wait in a queue of at most `max_queued` messages.
+When this queue is full, the overflow policy decides:
+
+- `block`:       the caller stops publishing (`blocked` is True) and waits
+                 with `wait_space`, which delays the publish scheduler
+- `drop_oldest`: the oldest queued message is dropped
+- `drop_newest`: the new message is dropped
+
+Time between handing a message to paho and its acknowledge is recorded
+as ack latency, together with the acknowledged messages it gives the
+sustained throughput for the chosen QoS and window.
+
+With an offline buffer, messages published while the client is disconnected
+are kept in a ring buffer of at most `buffer_messages` messages and
+`buffer_bytes` payload bytes (the oldest message is dropped when full).
+After the reconnect the buffer is drained in order at `replay_rate` messages
+per second, new messages are appended behind the buffered ones meanwhile.
+"""
+
+import asyncio
+import time
+from collections import deque
+from paho.mqtt.client import MQTT_ERR_NO_CONN, MQTT_ERR_SUCCESS
+from mqtt_common.async_client import DROP_NEWEST, DROP_OLDEST
+from mqtt_common.metrics import DURATION_BUCKETS, Histogram
+
+
+# overflow policy which applies backpressure to the publisher
+BLOCK = "block"
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+# histogram buckets of ack latencies in seconds, 1 us .. 10 s
+ACK_LATENCY_BUCKETS = DURATION_BUCKETS + (2.5, 5.0, 10.0)
+
+# draining the offline buffer without rate limit yields to the event loop
+# after this number of messages
+DRAIN_YIELD_EVERY = 1000
+
+
+class PublishPipeline:
+    """
+    Publishes messages over an AsyncMqttClient with a bounded number of
+    unacknowledged and queued messages.
+    """
+    def __init__(self, mqtt_client, qos=0, max_inflight=100, max_queued=10000,
+                 overflow=BLOCK, clock=time.monotonic, buffer_messages=0, buffer_bytes=0,
+                 replay_rate=0.0):
+        """
+        Args:
+            mqtt_client (AsyncMqttClient): MQTT client, its ack and connection
+                                           hooks are set by the pipeline
+            qos (int): QoS of published messages
+            max_inflight (int): maximum number of unacknowledged messages
+            max_queued (int): maximum number of messages waiting for the window
+            overflow (str): `block`, `drop_oldest` or `drop_newest` if the queue is full
+            clock (callable): time in seconds for ack latencies
+            buffer_messages (int): maximum number of messages of the offline buffer,
+                                   0 publishes to paho also while disconnected
+            buffer_bytes (int): maximum payload bytes of the offline buffer, 0 unlimited
+            replay_rate (float): messages per second drained from the offline
+                                 buffer after reconnect, 0 as fast as the window allows
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.mqtt_client = mqtt_client
+        self.qos = qos
+        self.max_inflight = max(max_inflight, 1)
+        self.max_queued = max(max_queued, 0)
+        self.overflow = overflow
+        self._clock = clock
+        self._queue = deque()
+        # hand-over time by message id of unacknowledged messages
+        self._inflight = {}
+        self._space = asyncio.Event()
+
+        self.buffer_messages = max(buffer_messages, 0)
+        self.buffer_bytes = max(buffer_bytes, 0)
+        self.replay_rate = replay_rate
+        self._buffer = deque()
+        self._buffer_size = 0
+        self._offline = False
+        self._drain_task = None
+
+        # messages accepted, acknowledged, dropped by overflow policy
+        # and failed (rejected by paho or lost on disconnect)
+        self.submitted = 0
+        self.acknowledged = 0
+        self.dropped = 0
+        self.failed = 0
+        # seconds from hand-over to paho until acknowledge
+        self.ack_latency = Histogram(ACK_LATENCY_BUCKETS)
+        # messages put into the offline buffer, dropped from the full buffer
+        # and replayed after reconnect, messages and duration in seconds of the last replay
+        self.buffered = 0
+        self.buffer_dropped = 0
+        self.replayed = 0
+        self.last_replayed = 0
+        self.replay_seconds = 0.0
+
+        # paho must not hold back messages the pipeline counts as in flight
+        mqtt_client.client.max_inflight_messages_set(self.max_inflight)
+        mqtt_client.publish_ack_callback = self._on_ack
+        mqtt_client.disconnect_callback = self._on_disconnect
+        mqtt_client.reconnect_callback = self._on_reconnect
+
+    @property
+    def inflight(self):
+        """ Number of messages handed to paho and not yet acknowledged """
+        return len(self._inflight)
+
+    @property
+    def queued(self):
+        """ Number of messages waiting for a free slot of the in-flight window """
+        return len(self._queue)
+
+    @property
+    def buffering(self):
+        """ True if new messages go to the offline buffer (until it is drained) """
+        return bool(self._buffer) or self._drain_task is not None \
+            or (self._offline and self.buffer_messages > 0)
+
+    @property
+    def buffered_messages(self):
+        """ Number of messages in the offline buffer """
+        return len(self._buffer)
+
+    @property
+    def full(self):
+        """ True if queue and in-flight window are full """
+        return len(self._queue) >= self.max_queued \
+            and len(self._inflight) >= self.max_inflight
+
+    @property
+    def free_slots(self):
+        """ Number of messages accepted until queue and in-flight window are full """
+        return max(self.max_inflight - len(self._inflight), 0) \
+            + max(self.max_queued - len(self._queue), 0)
+
+    @property
+    def blocking(self):
+        """ True if the publisher has to wait when the pipeline is full
+        (`block` policy), never while messages go to the offline buffer """
+        return self.overflow == BLOCK and not self.buffering
+
+    @property
+    def blocked(self):
+        """ True if the publisher has to wait (`block` policy and queue full),
+        never while messages go to the offline buffer """
+        return self.blocking and self.full
+
+    @property
+    def backlogged(self):
+        """ True if queue and window are full or messages wait in the offline buffer """
+        return self.full or self.buffering
+
+    def publish_nowait(self, topic, payload, properties=None):
+        """
+        Publish message or queue it until the in-flight window has space.
+        With `block` policy callers check `blocked` before publishing,
+        a message published into a full queue anyway is dropped.
+
+        Returns:
+            accepted (bool): False if the message was dropped
+        """
+        if self.buffer_messages and (self._offline or self._buffer):
+            self._buffer_message(topic, payload, properties)
+            return True
+        return self._submit(topic, payload, properties)
+
+    def _submit(self, topic, payload, properties):
+        """ Send message or queue it (overflow policy), see `publish_nowait` """
+        if len(self._inflight) < self.max_inflight and not self._queue:
+            self.submitted += 1
+            self._send(topic, payload, properties)
+            return True
+        if len(self._queue) >= self.max_queued:
+            self.dropped += 1
+            if self.overflow != DROP_OLDEST or not self._queue:
+                return False
+            self._queue.popleft()
+        self.submitted += 1
+        self._queue.append((topic, payload, properties))
+        return True
+
+    async def wait_space(self, backlog=False):
+        """
+        Wait until queue or in-flight window has space (publisher isn't blocked).
+
+        Args:
+            backlog (bool): wait also until the offline buffer is drained
+        """
+        while self.full or backlog and self.buffering:
+            self._space.clear()
+            await self._space.wait()
+
+    async def flush(self, timeout=None):
+        """
+        Wait until all queued and in-flight messages are acknowledged.
+
+        Returns:
+            flushed (bool): False if the timeout elapsed before
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        while self._queue or self._inflight or self._buffer:
+            remaining = None if deadline is None else deadline - self._clock()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def reset_stats(self):
+        """ Reset counters and ack latencies, e.g. on start of a trace run """
+        self.submitted = 0
+        self.acknowledged = 0
+        self.dropped = 0
+        self.failed = 0
+        self.ack_latency = Histogram(ACK_LATENCY_BUCKETS)
+        self.buffered = 0
+        self.buffer_dropped = 0
+        self.replayed = 0
+        self.last_replayed = 0
+        self.replay_seconds = 0.0
+
+    def _buffer_message(self, topic, payload, properties):
+        """ Append message to the offline ring buffer, drop the oldest when full """
+        buffer = self._buffer
+        buffer.append((topic, payload, properties))
+        self._buffer_size += len(payload)
+        self.buffered += 1
+        while len(buffer) > self.buffer_messages \
+                or (self.buffer_bytes and self._buffer_size > self.buffer_bytes and len(buffer) > 1):
+            self._buffer_size -= len(buffer.popleft()[1])
+            self.buffer_dropped += 1
+
+    async def _drain(self):
+        """ Hand buffered messages to the pipeline at the replay rate """
+        buffer = self._buffer
+        start = self._clock()
+        replayed = 0
+        while buffer and not self._offline:
+            if self.full:
+                await self.wait_space()
+                continue
+            topic, payload, properties = buffer.popleft()
+            self._buffer_size -= len(payload)
+            self._submit(topic, payload, properties)
+            replayed += 1
+            if self.replay_rate > 0.0:
+                delay = start + replayed / self.replay_rate - self._clock()
+                if delay > 0.0:
+                    await asyncio.sleep(delay)
+            elif replayed % DRAIN_YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+        self.replayed += replayed
+        self.last_replayed = replayed
+        self.replay_seconds = self._clock() - start
+        self._drain_task = None
+        self._space.set()
+
+    def _send(self, topic, payload, properties):
+        message_info = self.mqtt_client.publish_nowait(topic, payload, qos=self.qos,
+                                                       properties=properties)
+        if message_info.rc != MQTT_ERR_SUCCESS:
+            # QoS 1/2 messages are kept by paho and sent after reconnect
+            if self.qos == 0 or message_info.rc != MQTT_ERR_NO_CONN:
+                self.failed += 1
+                return
+        if message_info.is_published():
+            self.acknowledged += 1
+            self.ack_latency.observe(0.0)
+            return
+        self._inflight[message_info.mid] = self._clock()
+
+    def _fill_window(self):
+        """ Hand queued messages to paho while the window has space """
+        queue = self._queue
+        while queue and len(self._inflight) < self.max_inflight:
+            self._send(*queue.popleft())
+        self._space.set()
+
+    def _on_ack(self, mid):
+        sent_time = self._inflight.pop(mid, None)
+        if sent_time is None:
+            return
+        self.acknowledged += 1
+        self.ack_latency.observe(self._clock() - sent_time)
+        self._fill_window()
+
+    def _on_disconnect(self):
+        if self.buffer_messages:
+            self._offline = True
+        if self.qos == 0:
+            # paho discards unwritten QoS 0 packets on disconnect
+            self.failed += len(self._inflight)
+            self._inflight.clear()
+            self._fill_window()
+        # publishers blocked by a full window continue into the offline buffer
+        self._space.set()
+
+    def _on_reconnect(self, outage_seconds):
+        self._offline = False
+        self._fill_window()
+        if self._buffer and self._drain_task is None:
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain())
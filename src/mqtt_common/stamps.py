@@ -0,0 +1,73 @@
+"""
+Message stamps for latency and loss measurement.
+
+Message player stamps every message with a per-topic sequence number and
+a send timestamp as MQTTv5 user properties, the JSON payload stays untouched.
+In virtual-clock playback messages additionally carry their trace time,
+the position in the trace at which they are scheduled.
+"""
+
+import time
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+
+# MQTTv5 user properties to stamp messages for latency and loss measurement
+STAMP_SEQUENCE = "seq"
+STAMP_TIMESTAMP = "ts"
+STAMP_TRACE_TIME = "tt"
+
+
+def stamp_clock(clock_name):
+    """
+    Return function giving timestamps in nanoseconds for message stamps.
+    `monotonic` clock is comparable only between processes on the same host,
+    `wall` clock needs synchronized hosts (NTP/PTP).
+    """
+    if clock_name == "wall":
+        return time.time_ns
+    return time.monotonic_ns
+
+
+def stamp_properties(sequence, timestamp_ns, trace_time_ns=None):
+    """
+    Create MQTTv5 publish properties with sequence number, send timestamp
+    and optional trace time.
+    """
+    properties = Properties(PacketTypes.PUBLISH)
+    properties.UserProperty = [(STAMP_SEQUENCE, str(sequence)),
+                               (STAMP_TIMESTAMP, str(timestamp_ns))]
+    if trace_time_ns is not None:
+        properties.UserProperty.append((STAMP_TRACE_TIME, str(trace_time_ns)))
+    return properties
+
+
+def read_stamp(message):
+    """
+    Return sequence number and send timestamp in ns of a received message,
+    (None, None) if message isn't stamped.
+    """
+    sequence = None
+    timestamp_ns = None
+    properties = getattr(message, "properties", None)
+    user_properties = getattr(properties, "UserProperty", None)
+    if user_properties:
+        for key, value in user_properties:
+            if key == STAMP_SEQUENCE:
+                sequence = int(value)
+            elif key == STAMP_TIMESTAMP:
+                timestamp_ns = int(value)
+    return sequence, timestamp_ns
+
+
+def read_trace_time(message):
+    """
+    Return trace time in ns of a received message, None if it isn't stamped.
+    """
+    properties = getattr(message, "properties", None)
+    user_properties = getattr(properties, "UserProperty", None)
+    if user_properties:
+        for key, value in user_properties:
+            if key == STAMP_TRACE_TIME:
+                return int(value)
+    return None
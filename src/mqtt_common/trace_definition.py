@@ -0,0 +1,274 @@
+"""
+Streaming loader of JSON trace definitions (input files of player and tester).
+
+The input file is parsed incrementally: only the containers on the path
+`trace[0].topics` are walked by this module, every entry of `topics` is
+decoded on its own with the C decoder of the json module and handed to
+the caller, which keeps only what it needs (e.g. encoded payloads or
+compiled validators). The nested dict of the whole file is never built.
+
+    {"trace": [{"traceLengthSeconds": 60,
+                "topics": [{"topic": "mqtt/DME/Torque_1_KCAN",
+                            "count": 60,
+                            "result": [...]}, ...]}]}
+
+Topic names and counts are kept in a compact TopicTable.
+
+A signal in `signals` of a payload may declare a generator, the player then
+publishes generated values as `raw_value` instead of the fixed one, e.g.
+
+    "signals": {"Torque_1_KCAN": {"raw_value": 3, "unit": "",
+                                  "generator": {"type": "sine", "amplitude": 10,
+                                                "period": 5}}}
+
+The `generator` key itself isn't published.
+"""
+
+import json
+import logging
+import re
+import sys
+from array import array
+
+
+LOGGER = logging.getLogger(__name__)
+
+# characters read from the input file at once
+CHUNK_SIZE = 1 << 20
+
+# a decode error this close to the end of the read characters may be caused
+# by a value cut at the end of the chunk (e.g. `tru`, `-Infinit`, `\u00`, `1.`)
+_TRUNCATED_TAIL = 16
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# key of the generator declaration of a signal
+GENERATOR_KEY = "generator"
+
+
+class TraceDefinitionError(ValueError):
+    """ Input file isn't a valid trace definition """
+
+
+def strip_generators(value, in_signals=False):
+    """
+    Remove generator declarations of signals from a payload definition.
+
+    Args:
+        value: decoded payload definition (`result` of a topic or an entry of it)
+        in_signals (bool): value is the `signals` object of a payload
+
+    Returns:
+        value: payload definition as published by the player
+        generated (bool): True if any signal declares a generator
+    """
+    if isinstance(value, list):
+        stripped = [strip_generators(entry) for entry in value]
+        return [entry for entry, _ in stripped], any(generated for _, generated in stripped)
+    if not isinstance(value, dict):
+        return value, False
+
+    generated = False
+    stripped = {}
+    for key, member in value.items():
+        if in_signals and isinstance(member, dict) and GENERATOR_KEY in member:
+            member = {signal_key: signal_value for signal_key, signal_value in member.items()
+                      if signal_key != GENERATOR_KEY}
+            member.setdefault("raw_value", 0)
+            generated = True
+        else:
+            member, member_generated = strip_generators(member, key == "signals")
+            generated = generated or member_generated
+        stripped[key] = member
+    return stripped, generated
+
+
+class TopicTable:
+    """
+    Topics of a trace definition with integer ids.
+    Topic names are interned, message counts are kept in an array.
+    """
+    __slots__ = ("names", "counts", "_ids")
+
+    def __init__(self):
+        self.names = []
+        self.counts = array("I")
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, topic):
+        return topic in self._ids
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def add(self, topic, count=0):
+        """
+        Add topic with its message count per trace run.
+
+        Returns:
+            topic_id (int): id of the topic, None if topic was already added
+        """
+        if topic in self._ids:
+            return None
+        topic = sys.intern(topic)
+        topic_id = len(self.names)
+        self._ids[topic] = topic_id
+        self.names.append(topic)
+        self.counts.append(count)
+        return topic_id
+
+    def get_id(self, topic):
+        """ Return id of the topic or None """
+        return self._ids.get(topic)
+
+
+class _JsonStream:
+    """
+    Incremental reader of JSON values and containers from a text file.
+    """
+    def __init__(self, text_file):
+        self._file = text_file
+        self._buffer = ""
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size=None):
+        """ Drop consumed characters and read next chunk, False at end of file """
+        chunk = self._file.read(size or CHUNK_SIZE)
+        if not chunk:
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """ Return next non-whitespace character without consuming it, '' at end """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        """ Consume next non-whitespace character, which must be `char` """
+        found = self.peek()
+        if found != char:
+            raise TraceDefinitionError(f"Expected '{char}', found '{found}'")
+        self._pos += 1
+
+    def value(self):
+        """ Decode and consume next complete JSON value """
+        self.peek()
+        read_size = CHUNK_SIZE
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as err:
+                # only a value cut at the end of the buffer continues in the
+                # next chunk, other syntax errors don't read the rest of the file
+                truncated = err.pos >= len(self._buffer) - _TRUNCATED_TAIL \
+                    or err.msg.startswith("Unterminated string")
+                if not truncated or not self._fill(read_size):
+                    raise TraceDefinitionError(str(err)) from err
+                read_size *= 2
+                continue
+            if end == len(self._buffer) and self._fill(read_size):
+                # number at end of buffer may continue in the next chunk
+                continue
+            self._pos = end
+            return value
+
+    def members(self):
+        """
+        Iterate over keys of the next JSON object,
+        the caller has to consume the value of every key.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == "}":
+                self._pos += 1
+                return
+            self.expect(",")
+
+    def items(self):
+        """
+        Iterate over indexes of the next JSON array,
+        the caller has to consume every entry.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.peek() == "]":
+                self._pos += 1
+                return
+            self.expect(",")
+
+
+def read_trace_definition(file_name, topic_callback=None):
+    """
+    Stream topics of the first trace in a JSON trace definition.
+
+    Args:
+        file_name (str): JSON input file
+        topic_callback (callable): function(topic_id, topic, entry) called
+                                   for every new topic with its `topics` entry
+
+    Returns:
+        topic_table (TopicTable): topic names and counts
+        trace_fields (dict): other fields of the trace, e.g. `traceLengthSeconds`
+
+    Raises:
+        OSError: file can't be read
+        TraceDefinitionError: file isn't a valid trace definition
+    """
+    topic_table = TopicTable()
+    trace_fields = {}
+
+    with open(file_name, "r") as data_file:
+        stream = _JsonStream(data_file)
+        for key in stream.members():
+            if key != "trace":
+                stream.value()
+                continue
+            for trace_no in stream.items():
+                if trace_no > 0:
+                    stream.value()
+                    continue
+                for field in stream.members():
+                    if field != "topics":
+                        trace_fields[field] = stream.value()
+                        continue
+                    for _ in stream.items():
+                        _add_topic(topic_table, stream.value(), topic_callback)
+
+    return topic_table, trace_fields
+
+
+def _add_topic(topic_table, entry, topic_callback):
+    try:
+        topic = entry["topic"]
+        count = int(entry.get("count", 0))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        LOGGER.warning("Invalid topic entry skipped: %.200s", entry)
+        return
+
+    topic_id = topic_table.add(topic, count)
+    if topic_id is None:
+        LOGGER.warning("Topic %s defined more than once, first definition used", topic)
+    elif topic_callback is not None:
+        topic_callback(topic_id, topic_table.names[topic_id], entry)
@@ -0,0 +1,233 @@
+"""
+Binary trace files with recorded MQTT traffic.
+
+A trace file starts with the magic bytes `MQTRACE1` followed by
+length-prefixed records (little endian):
+
+    record:  body length (uint32) | record type (uint8) | body
+    topic:   topic id (uint32) | topic name (utf-8)
+    message: timestamp in ns since start of recording (uint64) |
+             topic id (uint32) | raw payload
+
+The topic dictionary is part of the record stream, a topic record is written
+before the first message of a topic. Records are only appended, a file of an
+interrupted recording is readable up to its last complete record.
+
+TraceReader maps the file into memory (mmap), record headers are parsed in
+place and payloads are sliced from the mapping on demand, so multi-GB traces
+are replayed without loading them into RAM. The reader isn't zero-copy:
+slicing copies a payload into a new bytes object, the one copy per message
+which is needed anyway, paho publishes only bytes (no memoryview).
+"""
+
+import math
+import mmap
+import struct
+
+
+TRACE_MAGIC = b"MQTRACE1"
+
+RECORD_TOPIC = 1
+RECORD_MESSAGE = 2
+
+_RECORD_HEADER = struct.Struct("<IB")
+_TOPIC_HEADER = struct.Struct("<I")
+_MESSAGE_HEADER = struct.Struct("<QI")
+
+
+class TraceFormatError(Exception):
+    """ File isn't a trace file or contains an invalid record """
+
+
+class TraceWriter:
+    """
+    Append-only writer of a binary trace file.
+    """
+    def __init__(self, file_name):
+        """
+        Args:
+            file_name (str): trace file, an existing file is overwritten
+        """
+        self.file_name = file_name
+        self.messages = 0
+        self._topic_ids = {}
+        self._file = open(file_name, "wb")
+        self._file.write(TRACE_MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def topics_amount(self):
+        """ Number of topics recorded so far """
+        return len(self._topic_ids)
+
+    def write_message(self, timestamp_ns, topic, payload):
+        """
+        Append message record, preceded by topic record for a new topic.
+
+        Args:
+            timestamp_ns (int): time in ns since start of recording
+            topic (str): mqtt topic
+            payload (bytes): raw mqtt payload
+        """
+        topic_id = self._topic_ids.get(topic)
+        if topic_id is None:
+            topic_id = len(self._topic_ids)
+            self._topic_ids[topic] = topic_id
+            name = topic.encode("utf-8")
+            self._file.write(_RECORD_HEADER.pack(_TOPIC_HEADER.size + len(name),
+                                                 RECORD_TOPIC))
+            self._file.write(_TOPIC_HEADER.pack(topic_id))
+            self._file.write(name)
+
+        self._file.write(_RECORD_HEADER.pack(_MESSAGE_HEADER.size + len(payload),
+                                             RECORD_MESSAGE))
+        self._file.write(_MESSAGE_HEADER.pack(timestamp_ns, topic_id))
+        self._file.write(payload)
+        self.messages += 1
+
+    def flush(self):
+        """ Write buffered records to the file """
+        self._file.flush()
+
+    def close(self):
+        """ Flush and close the file """
+        if not self._file.closed:
+            self._file.close()
+
+
+class TraceReader:
+    """
+    Memory-mapped reader of a binary trace file.
+
+    Opening the file scans the record headers once to build the topic
+    dictionary, message counts per topic and the duration of the trace.
+    """
+    def __init__(self, file_name):
+        """
+        Args:
+            file_name (str): trace file written by TraceWriter
+
+        Raises:
+            TraceFormatError: file isn't a trace file
+        """
+        self.file_name = file_name
+        # topic names and message counts by topic id
+        self.topics = []
+        self.counts = []
+        # offset of first message record of every topic
+        self._first_offsets = []
+        self.messages = 0
+        self.duration_ns = 0
+        # end of the last complete record
+        self._end = len(TRACE_MAGIC)
+
+        with open(file_name, "rb") as trace_file:
+            if trace_file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+                raise TraceFormatError(f"{file_name} is not a trace file")
+            self._map = mmap.mmap(trace_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._scan()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.messages
+
+    @property
+    def trace_length(self):
+        """ Length of the trace in whole seconds (at least 1) """
+        return max(math.ceil(self.duration_ns / 1e9), 1)
+
+    def close(self):
+        """ Unmap the file """
+        self._map.close()
+
+    def _scan(self):
+        trace_map = self._map
+        size = len(trace_map)
+        offset = len(TRACE_MAGIC)
+
+        while offset + _RECORD_HEADER.size <= size:
+            length, record_type = _RECORD_HEADER.unpack_from(trace_map, offset)
+            body = offset + _RECORD_HEADER.size
+            if body + length > size:
+                # record of an interrupted recording
+                break
+
+            if record_type == RECORD_TOPIC:
+                if length < _TOPIC_HEADER.size:
+                    raise TraceFormatError(f"Topic record too short at {offset}")
+                topic_id, = _TOPIC_HEADER.unpack_from(trace_map, body)
+                if topic_id != len(self.topics):
+                    raise TraceFormatError(f"Unexpected topic id {topic_id} at {offset}")
+                self.topics.append(str(trace_map[body + _TOPIC_HEADER.size:body + length],
+                                       "utf-8"))
+                self.counts.append(0)
+                self._first_offsets.append(None)
+            elif record_type == RECORD_MESSAGE:
+                if length < _MESSAGE_HEADER.size:
+                    raise TraceFormatError(f"Message record too short at {offset}")
+                timestamp_ns, topic_id = _MESSAGE_HEADER.unpack_from(trace_map, body)
+                if topic_id >= len(self.topics):
+                    raise TraceFormatError(f"Undeclared topic id {topic_id} at {offset}")
+                if self.counts[topic_id] == 0:
+                    self._first_offsets[topic_id] = offset
+                self.counts[topic_id] += 1
+                self.messages += 1
+                self.duration_ns = max(self.duration_ns, timestamp_ns)
+            else:
+                raise TraceFormatError(f"Unknown record type {record_type} at {offset}")
+
+            offset = body + length
+            self._end = offset
+
+    def first_payload(self, topic_id):
+        """
+        Return payload of the first message of a topic (a copy), None if never published.
+        """
+        offset = self._first_offsets[topic_id]
+        if offset is None:
+            return None
+        length, _ = _RECORD_HEADER.unpack_from(self._map, offset)
+        body = offset + _RECORD_HEADER.size
+        return self._map[body + _MESSAGE_HEADER.size:body + length]
+
+    def messages_iter(self, shard_no=0, shards=1):
+        """
+        Iterate over all messages in recorded order.
+
+        Args:
+            shard_no (int): only topics with `topic_id % shards == shard_no`
+            shards (int): number of shards
+
+        Yields:
+            timestamp_ns (int): time in ns since start of recording
+            topic_id (int): topic id, name in `topics`
+            payload (bytes): raw mqtt payload, copied from the mapping
+        """
+        trace_map = self._map
+        end = self._end
+        offset = len(TRACE_MAGIC)
+        record_header = _RECORD_HEADER.unpack_from
+        message_header = _MESSAGE_HEADER.unpack_from
+        header_size = _RECORD_HEADER.size
+        message_size = _MESSAGE_HEADER.size
+
+        while offset < end:
+            length, record_type = record_header(trace_map, offset)
+            body = offset + header_size
+            offset = body + length
+            if record_type != RECORD_MESSAGE:
+                continue
+            timestamp_ns, topic_id = message_header(trace_map, body)
+            if shards > 1 and topic_id % shards != shard_no:
+                continue
+            yield timestamp_ns, topic_id, trace_map[body + message_size:offset]
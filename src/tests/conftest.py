@@ -0,0 +1,33 @@
+"""
+Unit tests of player, tester and the shared package.
+
+Player and tester modules are imported like the apps import them (module
+directory on the import path). Both apps have a `settings` module, in the
+test process they share the player module extended with the settings only
+the tester has (as in the benchmarks).
+"""
+
+import importlib.util
+import logging
+import os
+import sys
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SRC_DIR,
+                os.path.join(SRC_DIR, "message_player"),
+                os.path.join(SRC_DIR, "message_tester")]
+
+
+def _load_settings():
+    import settings
+    spec = importlib.util.spec_from_file_location(
+        "tester_settings", os.path.join(SRC_DIR, "message_tester", "settings.py"))
+    tester_settings = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tester_settings)
+    for name, value in vars(tester_settings).items():
+        if name.isupper() and not hasattr(settings, name):
+            setattr(settings, name, value)
+    settings.LOGGER.setLevel(logging.WARNING)
+
+
+_load_settings()
@@ -0,0 +1,243 @@
+import asyncio
+import types
+from paho.mqtt.client import MQTTMessage
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from mqtt_common.async_client import AsyncMqttClient, Subscription
+
+
+def _message(topic, payload=b""):
+    message = MQTTMessage(topic=topic.encode("utf-8"))
+    message.payload = payload
+    return message
+
+
+def _response(correlation_data, payload):
+    message = _message("test/response", payload)
+    message.properties = Properties(PacketTypes.PUBLISH)
+    message.properties.CorrelationData = correlation_data
+    return message
+
+
+class _Paho:
+    """
+    paho client stand-in, records subscribe and publish calls,
+    subscriptions are acknowledged in the event loop
+    """
+    class _MessageInfo:
+        rc = 0
+
+        def __init__(self, mid):
+            self.mid = mid
+
+        def is_published(self):
+            return True
+
+    def __init__(self, client):
+        self._client = client
+        self.subscribed = []
+        self.published = []
+        self._mid = 0
+        # reconnect attempts failing before the broker accepts, session resumed by the broker
+        self.failed_reconnects = 0
+        self.session_present = False
+        self.reconnect_attempts = 0
+
+    def reconnect(self):
+        self.reconnect_attempts += 1
+        if self.reconnect_attempts <= self.failed_reconnects:
+            raise ConnectionRefusedError("broker down")
+        flags = types.SimpleNamespace(session_present=self.session_present)
+        self._client._loop.call_soon(self._client._on_connect, None, None, flags, 0, None)
+
+    def subscribe(self, topics):
+        self._mid += 1
+        self.subscribed.append([topic_filter for topic_filter, _ in topics])
+        self._client._loop.call_soon(self._client._on_subscribe, None, None, self._mid, [], None)
+        return 0, self._mid
+
+    def publish(self, topic, payload, qos=0, retain=False, properties=None):
+        self._mid += 1
+        self.published.append((topic, payload, properties))
+        return self._MessageInfo(self._mid)
+
+
+def _client():
+    """ Client with paho stand-in, to be created in the event loop """
+    client = AsyncMqttClient("test", "localhost", 1883)
+    client._loop = asyncio.get_running_loop()
+    client.client = _Paho(client)
+    return client
+
+
+def _received(subscription):
+    topics = []
+    while subscription.qsize():
+        topics.append(subscription._queue.get_nowait().topic)
+    return topics
+
+
+def _dispatch(subscriptions, topics):
+    async def run():
+        client = AsyncMqttClient("test", "localhost", 1883)
+        for subscription in subscriptions:
+            client.add_subscription(subscription)
+        for topic in topics:
+            client._on_message(None, None, _message(topic))
+        return client
+
+    return asyncio.run(run())
+
+
+def test_exact_and_wildcard_dispatch():
+    exact = Subscription(["a/b"], 10)
+    wildcard = Subscription(["a/#", "$share/group/+/c"], 10)
+    status = Subscription(["status/#"], 10)
+    _dispatch([exact, wildcard, status], ["a/b", "a/x", "b/c", "a", "other", "status"])
+    assert _received(exact) == ["a/b"]
+    assert _received(wildcard) == ["a/b", "a/x", "b/c", "a"]
+    assert _received(status) == ["status"]
+
+
+def test_wildcard_added_after_exact_topic():
+    wildcard = Subscription(["a/+"], 10)
+    exact = Subscription(["a/b"], 10)
+    client = _dispatch([exact, wildcard], ["a/b"])
+    assert _received(exact) == ["a/b"]
+    assert _received(wildcard) == ["a/b"]
+
+    client.remove_subscription(wildcard)
+    client._on_message(None, None, _message("a/b"))
+    client._on_message(None, None, _message("a/c"))
+    assert _received(exact) == ["a/b"]
+    assert _received(wildcard) == []
+
+
+def test_remove_exact_subscription_keeps_wildcard():
+    wildcard = Subscription(["a/#"], 10)
+    exact = Subscription(["a/b"], 10)
+    client = _dispatch([wildcard, exact], [])
+    client.remove_subscription(exact)
+    client._on_message(None, None, _message("a/b"))
+    assert _received(exact) == []
+    assert _received(wildcard) == ["a/b"]
+
+
+def test_system_topics_not_matched_by_leading_wildcard():
+    wildcard = Subscription(["#"], 10)
+    _dispatch([wildcard], ["$SYS/load", "a"])
+    assert _received(wildcard) == ["a"]
+
+
+def test_full_queue_overflow_policies():
+    oldest = Subscription(["t"], 2)
+    newest = Subscription(["t"], 2, overflow="drop_newest")
+    client = _dispatch([oldest, newest], [])
+    for payload in (b"1", b"2", b"3"):
+        client._on_message(None, None, _message("t", payload))
+    assert [oldest._queue.get_nowait().payload for _ in range(2)] == [b"2", b"3"]
+    assert [newest._queue.get_nowait().payload for _ in range(2)] == [b"1", b"2"]
+    assert oldest.dropped == newest.dropped == 1
+
+
+def test_request_waits_for_response_with_correlation_data():
+    async def run():
+        client = _client()
+        request = asyncio.ensure_future(client.request("service/get", b"question", timeout=1.0))
+        while not client.client.published:
+            await asyncio.sleep(0)
+        topic, payload, properties = client.client.published[0]
+        assert (topic, payload) == ("service/get", b"question")
+        assert properties.ResponseTopic == "test/response"
+        # other correlation data and topics are ignored
+        client._on_message(None, None, _response(b"other", b"wrong"))
+        client._on_message(None, None, _response(properties.CorrelationData, b"answer"))
+        return client, await request
+
+    client, response = asyncio.run(run())
+    assert response == b"answer"
+    assert client.client.subscribed == [["test/response"]]
+    assert client._exact_subscriptions == {}
+    assert client._pending_requests == {}
+
+
+def test_request_timeout():
+    async def run():
+        client = _client()
+        try:
+            await client.request("service/get", b"question", timeout=0.05)
+        except asyncio.TimeoutError:
+            return client
+        raise AssertionError("request without response didn't time out")
+
+    client = asyncio.run(run())
+    assert client._pending_requests == {}
+
+
+def test_respond_to_request():
+    async def run():
+        client = _client()
+        request = _message("service/get")
+        request.properties = Properties(PacketTypes.PUBLISH)
+        request.properties.ResponseTopic = "other/response"
+        request.properties.CorrelationData = b"7"
+        assert client.respond(request, b"answer")
+        assert not client.respond(_message("service/get"), b"answer")
+        return client
+
+    client = asyncio.run(run())
+    assert len(client.client.published) == 1
+    topic, payload, properties = client.client.published[0]
+    assert (topic, payload, properties.CorrelationData) == ("other/response", b"answer", b"7")
+
+
+def _reconnect(session_present):
+    async def run():
+        client = _client()
+        client.reconnect_delay = 0.001
+        client.client.failed_reconnects = 2
+        client.client.session_present = session_present
+        outages = []
+        client.reconnect_callback = outages.append
+        subscription = await client.subscribe(["a/b", "c/#"])
+        client._on_connect(None, None, types.SimpleNamespace(session_present=False), 0, None)
+        client._on_disconnect(None, None, None, 1, None)
+        assert client.disconnected_time > 0.0
+        await client._reconnect_task
+        client._on_message(None, None, _message("c/d"))
+        return client, subscription, outages
+
+    return asyncio.run(run())
+
+
+def test_reconnect_subscribes_again_if_session_lost():
+    client, subscription, outages = _reconnect(session_present=False)
+    assert client.client.reconnect_attempts == 3
+    assert client.client.subscribed == [["a/b", "c/#"], ["a/b", "c/#"]]
+    assert client.reconnects == 1
+    assert outages == [client.last_outage] and client.last_outage > 0.0
+    assert client.disconnected_time == 0.0
+    # dispatching of the subscription is kept
+    assert _received(subscription) == ["c/d"]
+
+
+def test_reconnect_resumes_session():
+    client, subscription, outages = _reconnect(session_present=True)
+    assert client.session_present
+    assert client.client.subscribed == [["a/b", "c/#"]]
+    assert client.reconnects == 1 and len(outages) == 1
+    assert _received(subscription) == ["c/d"]
+
+
+def test_no_reconnect_after_disconnect():
+    async def run():
+        client = _client()
+        client.client.disconnect = lambda reasoncode=None: None
+        client._on_connect(None, None, types.SimpleNamespace(session_present=False), 0, None)
+        await client.disconnect()
+        client._on_disconnect(None, None, None, 0, None)
+        return client
+
+    client = asyncio.run(run())
+    assert client._reconnect_task is None
+    assert client.client.reconnect_attempts == 0
@@ -0,0 +1,96 @@
+import asyncio
+import csv
+import batch_runner
+from batch_runner import BatchTrace, find_batch_traces, plan_batch_groups, run_batch, \
+    write_batch_summary
+
+
+def _trace(name, topic_ids, trace_length=10.0):
+    batch_trace = BatchTrace(name, trace_length)
+    for topic_id in topic_ids:
+        batch_trace.add_topic(topic_id, 1.0)
+    return batch_trace
+
+
+class _Tester:
+    """ MessageTestApp stand-in, traces end after `runs_until_end` checks """
+    def __init__(self, topics_amount, runs_until_end):
+        self._mqtt_topics = [None] * topics_amount
+        self.runs_until_end = runs_until_end
+        self.started = []
+        self.stopped = 0
+        self._checks = 0
+
+    async def start_test(self, trace_names, speed, fanout, expected_rates, topic_ids):
+        self.started.append((trace_names, expected_rates, topic_ids))
+        self._checks = 0
+
+    async def wait_test_completed(self, timeout):
+        self._checks += 1
+        return self._checks >= self.runs_until_end
+
+    async def supervise_test(self):
+        pass
+
+    async def stop_test(self):
+        self.stopped += 1
+
+    def create_test_report(self, trace_name, topic_ids):
+        return {"trace": trace_name, "topics": len(topic_ids)}
+
+
+def test_find_batch_traces(tmp_path, monkeypatch):
+    for name in ("trace-02", "trace-01", "other"):
+        (tmp_path / f"input_file_{name}.json").write_text("{}")
+    monkeypatch.setattr(batch_runner, "INPUT_DIR", str(tmp_path))
+    traces = find_batch_traces(["trace-*", "other", "trace-01", "missing"])
+    assert [name for name, _ in traces] == ["trace-01", "trace-02", "other"]
+    assert traces[0][1] == str(tmp_path / "input_file_trace-01.json")
+
+
+def test_add_topic_keeps_topic_once():
+    assert _trace("a", [1, 2, 1]).topic_ids == [1, 2]
+
+
+def test_sequential_groups():
+    traces = [_trace("a", [0]), _trace("b", [1])]
+    assert plan_batch_groups(traces, False) == [[traces[0]], [traces[1]]]
+
+
+def test_parallel_groups_without_common_topics():
+    a, b, c, d = _trace("a", [0, 1]), _trace("b", [1, 2]), _trace("c", [3]), _trace("d", [2])
+    assert plan_batch_groups([a, b, c, d], True) == [[a, c, d], [b]]
+
+
+def test_run_batch_reports_in_batch_order(monkeypatch):
+    monkeypatch.setattr(batch_runner.settings, "BATCH_PARALLEL", True)
+    tester = _Tester(3, runs_until_end=1)
+    traces = [_trace("a", [0, 1]), _trace("b", [1]), _trace("c", [2])]
+    summaries = asyncio.run(run_batch(tester, traces, 1.0, 1))
+
+    assert [started[0] for started in tester.started] == [["a", "c"], ["b"]]
+    # expected rates of the group's topics only
+    assert tester.started[1][1] == [0.0, 1.0, 0.0]
+    assert tester.stopped == 2
+    assert [summary["trace"] for summary in summaries] == ["a", "b", "c"]
+    assert all(summary["completed"] for summary in summaries)
+
+
+def test_run_batch_stops_trace_without_reported_end(monkeypatch):
+    monkeypatch.setattr(batch_runner.settings, "BATCH_PARALLEL", False)
+    monkeypatch.setattr(batch_runner.settings, "TRACE_TIMEOUT_MARGIN", 0.0)
+    monkeypatch.setattr(batch_runner, "TIMEOUT_CHECK_PERIOD", 0.0)
+    tester = _Tester(1, runs_until_end=10 ** 9)
+    summaries = asyncio.run(run_batch(tester, [_trace("a", [0], trace_length=0.0)], 1.0, 1))
+    assert summaries[0]["completed"] is False
+    assert tester.stopped == 1
+
+
+def test_write_batch_summary(tmp_path):
+    file_name = tmp_path / "summary.csv"
+    write_batch_summary([{"trace": "a", "completed": True, "unknown": 1}], str(file_name))
+    with open(file_name, newline="") as summary_file:
+        rows = list(csv.DictReader(summary_file))
+    assert rows[0]["trace"] == "a"
+    assert rows[0]["completed"] == "True"
+    assert rows[0]["lost"] == ""
@@ -0,0 +1,46 @@
+import json
+from payload_fingerprint import PayloadFingerprints, payload_differences
+
+
+EXPECTED = [{"schema": {"message": "DME", "value": 3}}, {"schema": {"message": "DME", "value": 4}}]
+
+
+def _fingerprints(*results):
+    fingerprints = PayloadFingerprints()
+    for expected_result in results:
+        fingerprints.add_topic(expected_result)
+    return fingerprints
+
+
+def test_published_payloads_conform():
+    fingerprints = _fingerprints(EXPECTED)
+    assert fingerprints.match(0, json.dumps([EXPECTED[1]]).encode())
+    # other key order and separators of another encoder
+    assert fingerprints.match(0, b'[{"schema":{"value":3,"message":"DME"}}]')
+    assert fingerprints.match(0, json.dumps(EXPECTED).encode()) is False
+    assert fingerprints.match(0, b'[{"schema": {"message": "DME", "value": 5}}]') is False
+    assert fingerprints.match(0, b"not json") is False
+
+
+def test_topic_without_expected_payload():
+    fingerprints = _fingerprints(None, EXPECTED, [dict(entry) for entry in EXPECTED])
+    assert len(fingerprints) == 3
+    assert not fingerprints.has_expected(0)
+    assert fingerprints.match(0, b"[]") is None
+    assert fingerprints._fingerprints[1] is fingerprints._fingerprints[2]
+
+
+def test_diff_to_closest_expected_payload():
+    fingerprints = _fingerprints(EXPECTED)
+    assert fingerprints.diff(0, b'[{"schema": {"message": "DSC", "value": 4}}]') \
+        == "$[0].schema.message: expected 'DME', received 'DSC'"
+    assert fingerprints.diff(0, b'[{"schema":{"value":3,"message":"DME"}}]') \
+        == "same values, different encoding"
+    assert fingerprints.diff(0, b"{").startswith("invalid JSON")
+
+
+def test_payload_differences():
+    assert payload_differences({"a": 1, "b": [1, 2]}, {"a": 1.5, "c": 0, "b": [1]}) == [
+        "$.c: unexpected",
+        "$.a: expected 1, received 1.5",
+        "$.b: expected 2 entries, received 1"]
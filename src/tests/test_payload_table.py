@@ -0,0 +1,86 @@
+import json
+import pytest
+from payload_table import PayloadTable
+
+
+def _decoded(payload):
+    return json.loads(payload)
+
+
+def test_single_result_published_as_one_element_list():
+    table = PayloadTable()
+    topic_id = table.add_topic("a", 60, [{"v": 1}])
+    assert (topic_id, len(table), table.counts[0]) == (0, 1, 60)
+    assert _decoded(table.next_payload(0)) == [{"v": 1}]
+    assert table.next_payload(0) is table.next_payload(0)
+
+
+def test_result_which_isnt_a_list_is_published_unchanged():
+    table = PayloadTable()
+    table.add_topic("a", 1, {"v": 1})
+    table.add_topic("b", 1, [])
+    assert _decoded(table.next_payload(0)) == {"v": 1}
+    assert _decoded(table.next_payload(1)) == []
+
+
+def test_cycle_rotation_and_reset():
+    table = PayloadTable()
+    table.add_topic("a", 1, [{"v": 1}, {"v": 2}, {"v": 3}])
+    assert [_decoded(table.next_payload(0))[0]["v"] for _ in range(4)] == [1, 2, 3, 1]
+    table.reset()
+    assert _decoded(table.next_payload(0)) == [{"v": 1}]
+
+
+def test_random_rotation_reproducible_with_seed():
+    def sequence(seed):
+        table = PayloadTable(rotation="random", seed=seed)
+        table.add_topic("a", 1, [{"v": n} for n in range(10)])
+        return [table.next_payload(0) for _ in range(20)]
+
+    assert sequence(7) == sequence(7)
+    assert len(set(sequence(7))) > 1
+
+
+def test_unknown_rotation():
+    with pytest.raises(ValueError):
+        PayloadTable(rotation="shuffle")
+
+
+def _table(topics=3):
+    table = PayloadTable()
+    for topic_no in range(topics):
+        table.add_topic(f"t/{topic_no}", topic_no + 1, [{"v": topic_no}, {"w": topic_no}])
+    return table
+
+
+def test_fan_out_copies_topics_and_shares_payloads():
+    table = _table(2)
+    assert table.fan_out(1) is table
+    copies = table.fan_out(3)
+    assert copies.topics == ["t/0", "t/1", "t/0/load1", "t/1/load1", "t/0/load2", "t/1/load2"]
+    assert list(copies.counts) == [1, 2] * 3
+    assert copies.payloads[3] is table.payloads[1]
+    # every copy rotates its variants on its own
+    assert _decoded(copies.next_payload(0)) == [{"v": 0}]
+    assert _decoded(copies.next_payload(2)) == [{"v": 0}]
+    assert _decoded(copies.next_payload(0)) == [{"w": 0}]
+
+
+def test_shards_partition_the_topics():
+    table = _table(5).fan_out(2)
+    shards = [table.shard(shard_no, 3) for shard_no in range(3)]
+    assert table.shard(0, 1) is table
+    assert shards[1].topics == table.topics[1::3]
+    assert sorted(topic for shard in shards for topic in shard.topics) == sorted(table.topics)
+    assert sum(len(shard) for shard in shards) == len(table)
+    assert [_decoded(shard.next_payload(0)) for shard in shards] \
+        == [_decoded(table.payloads[topic_id][0]) for topic_id in range(3)]
+
+
+def test_load_topic_names_of_player_and_tester_match():
+    import payload_table
+    import topic_index
+
+    for copy_no in range(3):
+        assert payload_table.load_topic_name("a/b", copy_no) \
+            == topic_index.load_topic_name("a/b", copy_no)
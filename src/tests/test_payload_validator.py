@@ -0,0 +1,41 @@
+from payload_validator import compile_validator, schema_validator, structure_key
+
+
+EXPECTED = [{"schema": {"message": "DME", "signals": {"Torque": {"raw_value": 3, "unit": ""}}}},
+            {"schema": {"message": "DME", "flags": [True]}}]
+
+
+def test_same_structure_is_valid():
+    validate = compile_validator(EXPECTED)
+    assert validate([{"schema": {"message": "X", "signals": {"Torque": {"raw_value": 2.5,
+                                                                        "unit": "Nm"}}}}])
+    # every entry matches one of the expected entries
+    assert validate([{"schema": {"message": "X", "flags": [False, True]}},
+                     {"schema": {"message": "Y", "signals": {"Torque": {"raw_value": -1,
+                                                                        "unit": ""}}}}])
+
+
+def test_different_structure_is_invalid():
+    validate = compile_validator(EXPECTED)
+    assert not validate([])
+    assert not validate({"schema": {}})
+    assert not validate([{"schema": {"message": 1, "flags": [True]}}])
+    assert not validate([{"schema": {"message": "X", "flags": [1]}}])
+    assert not validate([{"schema": {"message": "X", "flags": [True], "extra": None}}])
+    # bool isn't a number
+    assert not validate([{"schema": {"message": "X", "signals": {"Torque": {"raw_value": True,
+                                                                            "unit": ""}}}}])
+
+
+def test_validators_shared_by_structure():
+    other = [{"schema": {"message": "DSC", "flags": [False]}},
+             {"schema": {"signals": {"Torque": {"unit": "x", "raw_value": 0}}, "message": "Y"}}]
+    assert structure_key(other) == structure_key(EXPECTED)
+    assert compile_validator(other) is compile_validator(EXPECTED)
+
+
+def test_schema_validator():
+    assert schema_validator([{"schema": {"a": 1}}])
+    assert not schema_validator([{"schema": {}}])
+    assert not schema_validator([])
+    assert not schema_validator(None)
@@ -0,0 +1,119 @@
+import asyncio
+from paho.mqtt.client import MQTT_ERR_NO_CONN, MQTT_ERR_SUCCESS
+from mqtt_common.async_client import DROP_NEWEST, DROP_OLDEST
+from mqtt_common.publish_pipeline import BLOCK, PublishPipeline
+
+
+class _MessageInfo:
+    def __init__(self, mid, rc):
+        self.mid = mid
+        self.rc = rc
+
+    def is_published(self):
+        return False
+
+
+class _PahoClient:
+    def max_inflight_messages_set(self, inflight):
+        self.max_inflight = inflight
+
+
+class _Client:
+    """ MQTT client which keeps messages unacknowledged until `ack` """
+    def __init__(self):
+        self.client = _PahoClient()
+        self.connected = True
+        self.published = []
+        self._mid = 0
+
+    def publish_nowait(self, topic, payload, qos=0, properties=None):
+        self._mid += 1
+        self.published.append((self._mid, payload))
+        return _MessageInfo(self._mid, MQTT_ERR_SUCCESS if self.connected else MQTT_ERR_NO_CONN)
+
+    def ack(self, count=None):
+        for mid, _ in self.published[:count]:
+            self.publish_ack_callback(mid)
+
+    def payloads(self):
+        return [payload for _, payload in self.published]
+
+
+def _pipeline(overflow, **kwargs):
+    client = _Client()
+    return client, PublishPipeline(client, qos=1, max_inflight=2, max_queued=2,
+                                   overflow=overflow, clock=lambda: 0.0, **kwargs)
+
+
+def _publish(pipeline, count):
+    return [pipeline.publish_nowait("t", b"%d" % n) for n in range(count)]
+
+
+def test_inflight_window_and_queue():
+    client, pipeline = _pipeline(BLOCK)
+    _publish(pipeline, 4)
+    assert client.payloads() == [b"0", b"1"]
+    assert (pipeline.inflight, pipeline.queued) == (2, 2)
+    assert pipeline.blocked
+    client.ack(1)
+    assert client.payloads() == [b"0", b"1", b"2"]
+    assert not pipeline.blocked
+    assert pipeline.acknowledged == 1
+
+
+def test_block_drops_message_published_into_full_queue():
+    client, pipeline = _pipeline(BLOCK)
+    assert _publish(pipeline, 5) == [True] * 4 + [False]
+    assert pipeline.dropped == 1
+
+
+def test_drop_oldest():
+    client, pipeline = _pipeline(DROP_OLDEST)
+    assert _publish(pipeline, 5) == [True] * 5
+    assert not pipeline.blocked
+    client.ack()
+    client.ack()
+    assert client.payloads() == [b"0", b"1", b"3", b"4"]
+    assert (pipeline.dropped, pipeline.submitted, pipeline.acknowledged) == (1, 5, 4)
+
+
+def test_drop_newest():
+    client, pipeline = _pipeline(DROP_NEWEST)
+    assert _publish(pipeline, 5) == [True] * 4 + [False]
+    client.ack()
+    client.ack()
+    assert client.payloads() == [b"0", b"1", b"2", b"3"]
+    assert pipeline.dropped == 1
+
+
+def test_offline_ring_buffer_replayed_in_order():
+    async def run():
+        client, pipeline = _pipeline(BLOCK, buffer_messages=3)
+        client.connected = False
+        pipeline._on_disconnect()
+        _publish(pipeline, 5)
+        assert client.published == []
+        assert pipeline.buffered_messages == 3
+        assert (pipeline.buffered, pipeline.buffer_dropped) == (5, 2)
+        assert pipeline.buffering and not pipeline.blocked
+
+        client.connected = True
+        pipeline._on_reconnect(1.0)
+        while pipeline.buffered_messages or pipeline.inflight:
+            await asyncio.sleep(0)
+            client.ack()
+        await pipeline.flush(timeout=1.0)
+        assert client.payloads() == [b"2", b"3", b"4"]
+        assert pipeline.replayed == 3
+        assert not pipeline.buffering
+
+    asyncio.run(run())
+
+
+def test_offline_buffer_byte_limit():
+    client, pipeline = _pipeline(BLOCK, buffer_messages=10, buffer_bytes=4)
+    pipeline._on_disconnect()
+    for payload in (b"aa", b"bb", b"cc"):
+        pipeline.publish_nowait("t", payload)
+    assert pipeline.buffered_messages == 2
+    assert pipeline.buffer_dropped == 1
@@ -0,0 +1,57 @@
+import pytest
+from publish_scheduler import PublishScheduler
+
+
+def test_pop_due_in_deadline_order():
+    scheduler = PublishScheduler([1.0, 0.5, 0.0])
+    scheduler.start(start_time=100.0)
+    assert scheduler.next_deadline() == 100.5
+    assert list(scheduler.pop_due(now=100.4)) == []
+    assert list(scheduler.pop_due(now=101.0)) == [1, 0, 1]
+    # topic with period 0 is never scheduled
+    assert list(scheduler.pop_due(now=110.0)).count(2) == 0
+
+
+def test_deadlines_do_not_drift():
+    scheduler = PublishScheduler([0.1])
+    scheduler.start(start_time=0.0)
+    # late publish doesn't move later deadlines
+    assert list(scheduler.pop_due(now=0.15)) == [0]
+    assert scheduler.next_deadline() == pytest.approx(0.2)
+    assert scheduler.max_lag == pytest.approx(0.05)
+
+
+def test_limit_keeps_further_topics_due():
+    scheduler = PublishScheduler([1.0, 1.0, 1.0])
+    scheduler.start(start_time=0.0)
+    assert len(list(scheduler.pop_due(now=1.0, limit=2))) == 2
+    assert list(scheduler.pop_due(now=1.0)) == [2]
+
+
+def test_speed_compresses_trace_time():
+    scheduler = PublishScheduler([1.0])
+    scheduler.start(start_time=0.0, speed=10.0)
+    assert scheduler.next_deadline() == pytest.approx(0.1)
+    assert scheduler.elapsed(now=1.0) == pytest.approx(10.0)
+
+
+def test_set_speed_keeps_trace_position():
+    scheduler = PublishScheduler([1.0])
+    scheduler.start(start_time=0.0)
+    assert list(scheduler.pop_due(now=1.0)) == [0]
+    scheduler.set_speed(2.0, now=1.5)
+    assert scheduler.elapsed(now=1.5) == pytest.approx(1.5)
+    # second publish at trace time 2.0, 0.5 s trace time = 0.25 s later
+    assert scheduler.next_deadline() == pytest.approx(1.75)
+
+
+def test_invalid_speed_and_stop():
+    scheduler = PublishScheduler([1.0])
+    with pytest.raises(ValueError):
+        scheduler.start(speed=0.0)
+    scheduler.start(start_time=0.0)
+    assert scheduler.running
+    scheduler.stop()
+    assert not scheduler.running
+    assert scheduler.next_deadline() is None
+    assert scheduler.elapsed() == 0.0
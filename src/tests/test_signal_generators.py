@@ -0,0 +1,80 @@
+import json
+import pytest
+from payload_table import PayloadTable
+from signal_generators import SignalBank
+
+
+def _values(bank, rows, trace_time=0.0):
+    return [float(value) for value in bank.evaluate(rows, trace_time)]
+
+
+def test_periodic_generators():
+    bank = SignalBank()
+    bank.add({"type": "ramp", "period": 10.0, "min": 0, "max": 100})
+    bank.add({"type": "sine", "amplitude": 2.0, "period": 4.0}, raw_value=5)
+    bank.add({"type": "square", "period": 2.0, "duty": 0.25})
+    assert _values(bank, [0, 1, 2], 0.0) == [0.0, 5.0, 1.0]
+    assert _values(bank, [0, 1, 2], 1.0) == [10.0, 7.0, 0.0]
+    assert _values(bank, [0, 1], 14.0) == [40.0, 5.0]
+
+
+def test_counter_steps_per_publish_and_restarts():
+    bank = SignalBank()
+    bank.add({"type": "counter", "step": 2, "max": 5}, raw_value=1)
+    assert [_values(bank, [0])[0] for _ in range(4)] == [1.0, 3.0, 5.0, 1.0]
+    bank.reset()
+    assert _values(bank, [0]) == [1.0]
+
+
+def test_random_walk_limited_and_reproducible():
+    def walk(seed):
+        bank = SignalBank(seed)
+        bank.add({"type": "random_walk", "step": 1.0, "min": -2, "max": 2})
+        return [_values(bank, [0])[0] for _ in range(200)]
+
+    assert walk(3) == walk(3)
+    assert all(-2.0 <= value <= 2.0 for value in walk(3))
+
+
+def test_decimals_and_encoding():
+    bank = SignalBank()
+    bank.add({"type": "sine", "amplitude": 1.0, "period": 3.0, "decimals": 1})
+    assert bank.evaluate([0], 0.5) == [b"0.9"]
+
+
+def test_invalid_generators():
+    bank = SignalBank()
+    with pytest.raises(ValueError):
+        bank.add({"type": "noise"})
+    with pytest.raises(ValueError):
+        bank.add({"type": "ramp", "period": 0})
+    with pytest.raises(ValueError):
+        bank.add({"type": "sine", "amplitude": "x"})
+
+
+def test_tile_and_take_start_in_initial_state():
+    bank = SignalBank()
+    bank.add({"type": "counter"}, raw_value=0)
+    bank.add({"type": "counter"}, raw_value=10)
+    _values(bank, [0, 1])
+    assert _values(bank.tile(2), [0, 1, 2, 3]) == [0.0, 10.0, 0.0, 10.0]
+    assert _values(bank.take([1]), [0]) == [10.0]
+
+
+def test_payload_table_splices_generated_values():
+    table = PayloadTable()
+    table.add_topic("a", 1, [{"schema": {"signals": {
+        "s": {"raw_value": 3, "unit": "", "generator": {"type": "counter"}},
+        "f": {"raw_value": 7, "unit": ""}}}}])
+    table.add_topic("b", 1, [{"v": 1}])
+    first, fixed = table.next_payloads([0, 1], 0.0)
+    second, = table.next_payloads([0], 0.0)
+    assert json.loads(first) == [{"schema": {"signals": {"s": {"raw_value": 3, "unit": ""},
+                                                         "f": {"raw_value": 7, "unit": ""}}}}]
+    assert json.loads(second)[0]["schema"]["signals"]["s"]["raw_value"] == 4
+    assert json.loads(fixed) == [{"v": 1}]
+
+    copy = table.fan_out(2).shard(0, 2)
+    assert copy.topics == ["a", "a/load1"]
+    assert json.loads(copy.next_payloads([1], 0.0)[0])[0]["schema"]["signals"]["s"] \
+        == {"raw_value": 3, "unit": ""}
@@ -0,0 +1,33 @@
+from speed_control import AdaptiveSpeed
+
+
+def _adaptive():
+    adaptive = AdaptiveSpeed(max_speed=8.0, step=2.0, min_gain=1.0, interval=2.0)
+    adaptive.start(1.0, now=0.0)
+    return adaptive
+
+
+def test_speed_proposed_on_slow_coverage_gain():
+    adaptive = _adaptive()
+    assert adaptive.update(1.0, 0, 100, True) is None
+    assert adaptive.update(2.0, 0, 100, False) is None
+    assert adaptive.update(4.0, 0, 100, True) == 2.0
+    # not applied before the player acknowledged it
+    assert adaptive.speed == 1.0
+    assert adaptive.mean_speed(6.0) == 1.0
+
+
+def test_acknowledged_speed_counts_for_mean_speed():
+    adaptive = _adaptive()
+    speed = adaptive.update(2.0, 0, 100, True)
+    adaptive.set_speed(speed, 2.0)
+    assert adaptive.speed == 2.0
+    assert adaptive.mean_speed(4.0) == 1.5
+
+
+def test_speed_limited_to_max_speed():
+    adaptive = _adaptive()
+    adaptive.set_speed(6.0, 0.0)
+    assert adaptive.update(2.0, 0, 100, True) == 8.0
+    adaptive.set_speed(8.0, 2.0)
+    assert adaptive.update(4.0, 0, 100, True) is None
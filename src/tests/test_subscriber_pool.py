@@ -0,0 +1,69 @@
+import time
+import subscriber_pool
+from subscriber_pool import SubscriberPool
+
+
+class _App:
+    """
+    MessageTestApp stand-in of a worker, tests the topic id of its worker number,
+    the first results of worker 0 are late.
+    """
+    def __init__(self, client_id, subscribe_status):
+        self.worker_no = int(client_id.rsplit("_", 1)[1])
+        self.shared_tested = None
+        self.stops = 0
+
+    def add_topic(self, topic, expected_result, expected_rate):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def subscribe_topics(self, worker_no, workers):
+        pass
+
+    def subscription_load(self):
+        return 10 * self.worker_no + 3, self.worker_no + 5
+
+    def reset_test(self, speed):
+        self.shared_tested[self.worker_no] = 1
+
+    def end_test(self):
+        self.stops += 1
+
+    def export_results(self):
+        if self.worker_no == 0 and self.stops == 1:
+            time.sleep(1.0)
+        return {"worker": self.worker_no, "stop": self.stops}
+
+    async def close(self):
+        pass
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_pool_merges_tagged_results_and_shares_counters(monkeypatch):
+    monkeypatch.setattr(subscriber_pool, "RESULT_TIMEOUT", 0.5)
+    topic_specs = [(f"t/{topic_id}", None, 1.0) for topic_id in range(4)]
+    pool = SubscriberPool(_App, "tester", 3, topic_specs)
+    try:
+        assert len(pool.tested_flags) == 4
+        assert _wait_for(lambda: pool.subscription_load() == (3 + 13 + 23, 7))
+
+        pool.start(1.0)
+        assert _wait_for(lambda: pool.tested_count == 3)
+        assert list(pool.tested_flags) == [1, 1, 1, 0]
+        # worker 0 answers after the timeout
+        assert pool.stop() == [{"worker": 1, "stop": 1}, {"worker": 2, "stop": 1}]
+
+        pool.start(1.0)
+        # late results of the first stop are discarded
+        assert pool.stop() == [{"worker": worker_no, "stop": 2} for worker_no in range(3)]
+    finally:
+        pool.close()
+    assert not any(process.is_alive() for process in pool._processes)
@@ -0,0 +1,28 @@
+from topic_index import TopicIndex, TopicTrie
+
+
+def test_topic_index_ids():
+    index = TopicIndex()
+    assert index.add("a/b") == 0
+    assert index.add("a/c") == 1
+    assert index.add("a/b") == 0
+    assert index.get_id("a/c") == 1
+    assert index.get_id("x") is None
+    assert list(index) == ["a/b", "a/c"]
+
+
+def test_wildcard_filters_group_by_depth():
+    trie = TopicTrie(["mqtt/DME/a", "mqtt/DME/b", "mqtt/EGS/c", "other"])
+    assert sorted(trie.wildcard_filters(2, 10)) == ["mqtt/DME/#", "mqtt/EGS/#", "other"]
+
+
+def test_wildcard_filters_reduce_depth_to_fit():
+    trie = TopicTrie(["mqtt/DME/a", "mqtt/EGS/c", "mqtt/KOMBI/d"])
+    assert trie.wildcard_filters(2, 2) == ["mqtt/#"]
+
+
+def test_wildcard_filters_with_empty_levels():
+    trie = TopicTrie(["a//b", "/x", "a/"])
+    # `#` also matches its parent level, `a//#` covers `a/`
+    assert sorted(trie.wildcard_filters(2, 10)) == ["/x/#", "a//#"]
+    assert sorted(trie.wildcard_filters(1, 10)) == ["/#", "a/#"]
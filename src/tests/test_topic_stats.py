@@ -0,0 +1,77 @@
+from topic_stats import SEQUENCE_WINDOW, DeliveryStats, RateStats
+
+
+def _delivery(sequences):
+    stats = DeliveryStats()
+    for sequence in sequences:
+        stats.record(sequence, 10.0)
+    return stats
+
+
+def test_delivery_lost_duplicated_out_of_order():
+    stats = _delivery([1, 2, 5, 3, 3, None])
+    assert stats.received == 6
+    assert stats.unique == 4
+    assert stats.duplicated == 1
+    assert stats.out_of_order == 1
+    assert stats.highest_sequence == 5
+    assert stats.lost == 1
+
+
+def test_delivery_window_is_bounded():
+    stats = _delivery(range(1, 4 * SEQUENCE_WINDOW))
+    assert len(stats._seen) <= SEQUENCE_WINDOW // 8
+    assert stats.unique == 4 * SEQUENCE_WINDOW - 1
+    assert stats.lost == 0
+    # arrival below the window counts as duplicate
+    stats.record(1, None)
+    assert stats.duplicated == 1
+
+
+def test_delivery_merge_counts_overlap_as_duplicates():
+    stats = _delivery([1, 2, 3])
+    stats.merge(_delivery([3, 4, 6]))
+    assert stats.received == 6
+    assert stats.unique == 5
+    assert stats.duplicated == 1
+    assert stats.highest_sequence == 6
+    assert stats.lost == 1
+    assert sum(stats.latency.counts) == 6
+
+
+def test_delivery_merge_aligns_windows():
+    late = _delivery(range(1, 3 * SEQUENCE_WINDOW))
+    early = _delivery(range(1, 100))
+    early.merge(late)
+    assert early.highest_sequence == 3 * SEQUENCE_WINDOW - 1
+    assert len(early._seen) <= SEQUENCE_WINDOW // 8
+    assert early.unique + early.duplicated == early.received
+
+
+def test_rate_stats_gaps_and_status():
+    stats = RateStats([10.0, 0.0])
+    for n in range(11):
+        stats.record(0, n * 100_000_000)
+    assert stats.observed_rate(0) == 10.0
+    assert stats.rate_status(0, 0.1) == 'OK'
+    assert stats.rate_status(1, 0.1) == ''
+    mean, deviation, max_gap = stats.gap_stats(0)
+    assert abs(mean - 0.1) < 1e-9 and deviation < 1e-6 and abs(max_gap - 0.1) < 1e-9
+    assert stats.gap_stats(1) == (None, None, None)
+
+
+def test_rate_stats_merge():
+    stats = RateStats([1.0, 1.0])
+    other = RateStats([1.0, 1.0])
+    stats.record(0, 0)
+    stats.record(0, 1_000_000_000)
+    other.record(0, 2_000_000_000)
+    other.record(0, 5_000_000_000)
+    other.record(1, 7)
+    stats.merge(other)
+    assert list(stats.counts) == [4, 1]
+    assert stats.first_ns[0] == 0 and stats.last_ns[0] == 5_000_000_000
+    assert stats.first_ns[1] == 7
+    assert stats.gaps[0] == 2
+    assert stats.max_gap[0] == 3.0
+    assert stats.observed_rate(0) == 0.6
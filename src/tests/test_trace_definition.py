@@ -0,0 +1,73 @@
+import io
+import json
+import pytest
+from mqtt_common import trace_definition
+from mqtt_common.trace_definition import TraceDefinitionError, read_trace_definition, \
+    strip_generators
+
+
+def _definition(tmp_path, data):
+    file_name = tmp_path / "input_file.json"
+    file_name.write_text(json.dumps(data))
+    return str(file_name)
+
+
+def test_topics_and_trace_fields(tmp_path):
+    file_name = _definition(tmp_path, {
+        "comment": {"nested": [1, 2]},
+        "trace": [{"traceLengthSeconds": 60,
+                   "topics": [{"topic": "a", "count": 60, "result": {"v": 1}},
+                              {"topic": "b", "result": []},
+                              {"topic": "a", "count": 1},
+                              {"count": 3}]},
+                  {"traceLengthSeconds": 1, "topics": [{"topic": "ignored"}]}]})
+    entries = []
+    topic_table, trace_fields = read_trace_definition(
+        file_name, lambda topic_id, topic, entry: entries.append((topic_id, topic, entry)))
+
+    assert list(topic_table) == ["a", "b"]
+    assert list(topic_table.counts) == [60, 0]
+    assert topic_table.get_id("b") == 1
+    assert trace_fields == {"traceLengthSeconds": 60}
+    assert entries[0] == (0, "a", {"topic": "a", "count": 60, "result": {"v": 1}})
+    assert [topic for _, topic, _ in entries] == ["a", "b"]
+
+
+def test_invalid_json(tmp_path):
+    file_name = tmp_path / "input_file.json"
+    file_name.write_text('{"trace": [{"topics": [')
+    with pytest.raises(TraceDefinitionError):
+        read_trace_definition(str(file_name))
+
+
+def test_values_cut_at_chunk_ends(tmp_path, monkeypatch):
+    entries = [{"topic": f"t/{n}", "count": n,
+                "result": [{"v": [True, False, None, -1.5e-3, 12345, "x\u00e9\\\"" * n]}]}
+               for n in range(50)]
+    file_name = _definition(tmp_path, {"trace": [{"traceLengthSeconds": 9, "topics": entries}]})
+    for chunk_size in (1, 7, 64):
+        monkeypatch.setattr(trace_definition, "CHUNK_SIZE", chunk_size)
+        decoded = []
+        topic_table, _ = read_trace_definition(
+            file_name, lambda topic_id, topic, entry: decoded.append(entry))
+        assert decoded == entries
+        assert len(topic_table) == 50
+
+
+def test_syntax_error_does_not_read_rest_of_file(monkeypatch):
+    monkeypatch.setattr(trace_definition, "CHUNK_SIZE", 1024)
+    text = '[{"topic": tru}, ' + '{"topic": "x"}, ' * 100000 + '{}]'
+    text_file = io.StringIO(text)
+    stream = trace_definition._JsonStream(text_file)
+    with pytest.raises(TraceDefinitionError):
+        for _ in stream.items():
+            stream.value()
+    assert text_file.tell() <= 1024
+
+
+def test_strip_generators():
+    payload, generated = strip_generators(
+        {"signals": {"s": {"raw_value": 3, "generator": {"type": "sine"}}}})
+    assert payload == {"signals": {"s": {"raw_value": 3}}}
+    assert generated
+    assert strip_generators({"raw_value": 3}) == ({"raw_value": 3}, False)
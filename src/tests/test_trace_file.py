@@ -0,0 +1,52 @@
+import pytest
+from mqtt_common.trace_file import TraceFormatError, TraceReader, TraceWriter
+
+
+def _write(file_name, messages):
+    with TraceWriter(str(file_name)) as writer:
+        for message in messages:
+            writer.write_message(*message)
+    return writer
+
+
+def test_round_trip(tmp_path):
+    messages = [(0, "a/b", b"{}"), (5, "c", b""), (10, "a/b", b"\x00\xff" * 100)]
+    writer = _write(tmp_path / "trace.bin", messages)
+    assert (writer.messages, writer.topics_amount) == (3, 2)
+
+    with TraceReader(str(tmp_path / "trace.bin")) as reader:
+        assert reader.topics == ["a/b", "c"]
+        assert reader.counts == [2, 1]
+        assert len(reader) == 3
+        assert reader.duration_ns == 10
+        assert reader.first_payload(1) == b""
+        assert [(timestamp, reader.topics[topic_id], bytes(payload))
+                for timestamp, topic_id, payload in reader.messages_iter()] == messages
+        assert [topic_id for _, topic_id, _ in reader.messages_iter(shard_no=1, shards=2)] == [1]
+
+
+def test_interrupted_recording_readable(tmp_path):
+    file_name = tmp_path / "trace.bin"
+    _write(file_name, [(0, "a", b"1"), (1, "a", b"2")])
+    data = file_name.read_bytes()
+    file_name.write_bytes(data[:-1])
+    with TraceReader(str(file_name)) as reader:
+        assert len(reader) == 1
+
+
+def test_not_a_trace_file(tmp_path):
+    file_name = tmp_path / "trace.bin"
+    file_name.write_bytes(b"{}")
+    with pytest.raises(TraceFormatError):
+        TraceReader(str(file_name))
+
+
+def test_undeclared_topic_id(tmp_path):
+    file_name = tmp_path / "trace.bin"
+    _write(file_name, [(0, "a", b"1")])
+    data = bytearray(file_name.read_bytes())
+    # message record at the end: header (5 bytes) | timestamp (8) | topic id (4) | payload (1)
+    data[-1 - 4] = 7
+    file_name.write_bytes(bytes(data))
+    with pytest.raises(TraceFormatError, match="Undeclared topic id 7"):
+        TraceReader(str(file_name))
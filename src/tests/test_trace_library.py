@@ -0,0 +1,97 @@
+import asyncio
+import os
+from trace_library import TraceLibrary
+
+
+class _Loader:
+    """ Load function of the library, returns the file content as payload table """
+    def __init__(self):
+        self.loaded = []
+
+    def __call__(self, file_name):
+        self.loaded.append(os.path.basename(file_name))
+        with open(file_name) as trace_file:
+            content = trace_file.read()
+        if content == "invalid":
+            return None, None, None
+        return content, 1, 10
+
+
+def _library(tmp_path, names, cache_size=2):
+    for name in names:
+        (tmp_path / f"input_file_{name}.json").write_text(name)
+    (tmp_path / "other.json").write_text("")
+    loader = _Loader()
+    return TraceLibrary(str(tmp_path), cache_size, loader), loader
+
+
+def test_index_and_unknown_trace(tmp_path):
+    library, loader = _library(tmp_path, ["b", "a"])
+    assert library.names == ["a", "b"]
+    assert library.get("missing") is None
+    assert loader.loaded == []
+
+
+def test_lru_cache(tmp_path):
+    library, loader = _library(tmp_path, ["a", "b", "c"])
+    assert library.get("a").payload_table == "a"
+    library.get("b")
+    library.get("a")
+    # b is the least recently used trace
+    library.get("c")
+    library.get("a")
+    library.get("b")
+    assert loader.loaded == ["input_file_a.json", "input_file_b.json",
+                             "input_file_c.json", "input_file_b.json"]
+    assert (library.loads, library.hits, library.cached) == (4, 2, 2)
+
+
+def test_changed_file_is_read_again(tmp_path):
+    library, loader = _library(tmp_path, ["a"])
+    library.get("a")
+    file_name = tmp_path / "input_file_a.json"
+    file_name.write_text("new")
+    modified = os.stat(file_name).st_mtime + 1.0
+    os.utime(file_name, (modified, modified))
+    assert library.get("a").payload_table == "new"
+    assert library.loads == 2
+
+
+def test_trace_added_later_and_invalid_trace(tmp_path):
+    library, loader = _library(tmp_path, ["a"])
+    (tmp_path / "input_file_new.json").write_text("new")
+    (tmp_path / "input_file_bad.json").write_text("invalid")
+    assert library.get("new").name == "new"
+    assert library.get("bad") is None
+    assert library.cached == 1
+
+
+class _Pool:
+    def __init__(self):
+        self.commands = []
+
+    def load(self, trace_name):
+        self.commands.append(("load", trace_name))
+
+    def stop(self):
+        self.commands.append(("stop",))
+
+
+def test_player_loads_pool_only_with_valid_trace(tmp_path):
+    from message_player import SignalPlayer
+
+    library, _ = _library(tmp_path, ["a", "b"])
+    library.get("a")
+    (tmp_path / "input_file_bad.json").write_text("invalid")
+    pool = _Pool()
+    player = SignalPlayer(library.get("a").payload_table, 10, publisher_pool=pool,
+                          trace_library=library, trace_name="a")
+
+    assert asyncio.run(player.load_trace("bad")) is False
+    assert asyncio.run(player.load_trace("missing")) is False
+    assert pool.commands == []
+    assert player.trace_name == "a"
+
+    assert asyncio.run(player.load_trace("b")) is True
+    assert pool.commands == [("load", "b")]
+    assert (player.trace_name, player.trace_table) == ("b", "b")